@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+"""
+Matching core: the data sets, indexes, measures and matchers of MatchingBox, over plain coordinate
+arrays and ids. It needs only NumPy, so it runs without QGIS (the Processing algorithms are adapters
+over it); build the sets with their constructors, from arrays, or with fromLayer inside QGIS.
+"""
+
+from .feedback import Feedback
+from .matching.point_set import PointSet
+from .matching.line_set import LineSet, LineSetCache
+from .matching.polygon_set import PolygonSet
+from .matching.grid_index import GridIndex
+from .matching.box_tree import BoxTree
+from .matching.line_graph import LineGraph
+from .matching.candidate_set import CandidateSet
+from .matching.match_pair_manager import MatchPairManager
+from .matching.mutual_nearest import MutualNearestJoin
+from .matching.pair_writer import PairWriter
+from .matching.point_reader import PointReader
+from .matching.point_matcher import PointMatcher
+from .matching.line_matcher import LineMatcher
+from .matching.polygon_matcher import PolygonMatcher
+from .measure.context_measure import ContextMeasure
+from .measure.line_measure import LineMeasure
+from .measure.polygon_measure import PolygonMeasure
+from .measure.descriptor_cache import DescriptorCache
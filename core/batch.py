@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+import os
+import sys
+import csv
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .matching.point_reader import PointReader
+from .matching.point_matcher import PointMatcher
+from .matching.pair_writer import PairWriter
+from .matching.tiled_executor import poolContext
+
+class BatchRunner( object ):
+    """
+    This class runs a manifest of point matching jobs without QGIS, in a pool of processes.
+
+    The manifest is a CSV file, one job per row, with the columns:
+    - reference, test : input files (see PointReader: GeoPackage, Shapefile or CSV)
+    - output          : pair file of the job
+    - method          : number or name of PointMatcher.METHODS (default 0)
+    - threshold       : distance threshold, as in PointMatchingAlgorithm (default 1)
+    - format          : optional, number or name of PairWriter.FORMATS; by default, the extension of the output
+    - landmarks       : optional landmark file of the landmark context methods
+    - name            : optional name of the job; by default, the name of the output
+    Relative paths are taken from the directory of the manifest.
+
+    Each job runs serially in a worker and gives a summary line (see SUMMARY_COLUMNS).
+    """
+
+    SUMMARY_COLUMNS = [ 'name', 'status', 'reference_count', 'test_count', 'pairs', 'seconds', 'output', 'message' ]
+
+    # formats of the pair files, by extension
+    EXTENSIONS = { '.txt' : PairWriter.TEXT, '.csv' : PairWriter.CSV, '.gpkg' : PairWriter.GEOPACKAGE,
+                   '.parquet' : PairWriter.PARQUET }
+
+    def __init__( self, workers = None ):
+        """
+        Constructor
+
+        @param workers: Number of worker processes, by default the number of CPUs. 1 runs the jobs in this process.
+        """
+        self.workers = max( int( workers or os.cpu_count() or 1 ), 1 )
+
+    def readManifest( self, manifest ):
+        """Returns the jobs of the manifest, as dictionaries with the parameters of runJob """
+        folder = os.path.dirname( os.path.abspath( manifest ) )
+        jobs = []
+
+        with open( manifest, newline = '' ) as source:
+            for line, row in enumerate( csv.DictReader( source ), 2 ):
+                row = { key.strip().lower() : ( value or '' ).strip() for key, value in row.items() if key }
+
+                if not row.get( 'reference' ) or not row.get( 'test' ) or not row.get( 'output' ):
+                    raise Exception( "Manifest line {}: reference, test and output are needed.".format( line ),
+                                     "InvalidParameterValue" )
+
+                output = os.path.join( folder, row[ 'output' ] )
+                jobs.append( { 'name'      : row.get( 'name' ) or os.path.splitext( os.path.basename( output ) )[0],
+                               'reference' : self.inputPath( folder, row[ 'reference' ] ),
+                               'test'      : self.inputPath( folder, row[ 'test' ] ),
+                               'landmarks' : self.inputPath( folder, row[ 'landmarks' ] ) if row.get( 'landmarks' ) else None,
+                               'output'    : output,
+                               'method'    : self.option( row.get( 'method' ), PointMatcher.METHODS, 0, line ),
+                               'threshold' : float( row.get( 'threshold' ) or 1. ),
+                               'format'    : self.option( row.get( 'format' ), PairWriter.FORMATS,
+                                                          self.EXTENSIONS.get( os.path.splitext( output )[1].lower(),
+                                                                               PairWriter.TEXT ), line ) } )
+
+        return jobs
+
+    @staticmethod
+    def inputPath( folder, source ):
+        """Path from the directory of the manifest, keeping the "|layername=" of a GeoPackage """
+        path, bar, options = source.partition( '|' )
+        return os.path.join( folder, path ) + bar + options
+
+    @staticmethod
+    def option( value, names, default, line ):
+        """Number of an option, given by number or (case-insensitive) name """
+        if not value:
+            return default
+
+        if value.isdigit() and int( value ) < len( names ):
+            return int( value )
+
+        lowerNames = [ name.lower() for name in names ]
+        if value.lower() in lowerNames:
+            return lowerNames.index( value.lower() )
+
+        raise Exception( "Manifest line {}: invalid option {}.".format( line, value ), "InvalidParameterValue" )
+
+    def run( self, jobs, report = None ):
+        """
+        Runs the jobs, at most workers at a time.
+
+        @param report: called with the summary of each job, as it ends.
+
+        Return: the summaries, in the order of the jobs.
+        """
+        summaries = [ None ] * len( jobs )
+
+        # 1) serial: sem o custo do pool
+        if self.workers == 1 or len( jobs ) == 1:
+            for k, job in enumerate( jobs ):
+                summaries[ k ] = runJob( job )
+                if report is not None:
+                    report( summaries[ k ] )
+
+            return summaries
+
+        # 2) um job por vez em cada worker
+        with ProcessPoolExecutor( max_workers = min( self.workers, len( jobs ) ), mp_context = poolContext() ) as pool:
+            futures = { pool.submit( runJob, job ) : k for k, job in enumerate( jobs ) }
+
+            for future in as_completed( futures ):
+                k = futures[ future ]
+                try:
+                    summaries[ k ] = future.result()
+                except Exception as error:
+                    # o worker morreu: so este job falha
+                    summaries[ k ] = summary( jobs[ k ], 'error', message = str( error ) )
+
+                if report is not None:
+                    report( summaries[ k ] )
+
+        return summaries
+
+
+def summary( job, status, refCount = 0, testCount = 0, pairs = 0, seconds = 0., message = '' ):
+    """Summary line of a job (see BatchRunner.SUMMARY_COLUMNS) """
+    return { 'name' : job[ 'name' ], 'status' : status, 'reference_count' : refCount, 'test_count' : testCount,
+             'pairs' : pairs, 'seconds' : round( seconds, 3 ), 'output' : job[ 'output' ], 'message' : message }
+
+
+def runJob( job ):
+    """
+    Runs a job of the manifest (see BatchRunner.readManifest): reads the files, matches the points and
+    writes the pair file. Top-level, so the pool can send it to the workers.
+
+    Return: the summary of the job; a failed job does not stop the others.
+    """
+    start = time.perf_counter()
+    refCount = testCount = 0
+
+    try:
+        refPoints  = PointReader.read( job[ 'reference' ] )
+        testPoints = PointReader.read( job[ 'test' ] )
+        landmarks  = PointReader.read( job[ 'landmarks' ] ) if job[ 'landmarks' ] else None
+        refCount, testCount = len( refPoints ), len( testPoints )
+
+        if refCount < 1 or testCount < 1:
+            raise Exception( "Empty input file.", "InvalidParameterValue" )
+
+        pairMgr = PointMatcher().run( refPoints, testPoints, job[ 'method' ], job[ 'threshold' ], landmarks = landmarks )
+        PairWriter.create( job[ 'format' ], job[ 'output' ] ).write( pairMgr )
+
+    except Exception as error:
+        # os erros do modulo sao ( mensagem, codigo ); os demais, a mensagem completa
+        message = error.args[0] if error.args and isinstance( error.args[0], str ) else str( error )
+        return summary( job, 'error', refCount, testCount, seconds = time.perf_counter() - start, message = message )
+
+    return summary( job, 'ok', refCount, testCount, pairMgr.pairCount(), time.perf_counter() - start )
+
+
+def main( argv = None ):
+    """
+    Command line: python -m matching_box.core.batch manifest.csv [--workers N] [--summary summary.csv]
+    (with the directory that contains matching_box on PYTHONPATH)
+
+    Prints one summary line per job, as it ends; the exit code is 1 if some job failed.
+    """
+    parser = argparse.ArgumentParser( prog = 'python -m matching_box.core.batch',
+                                      description = "Runs a manifest of point matching jobs (see BatchRunner)." )
+    parser.add_argument( 'manifest', help = "CSV file with the columns reference, test, output, method, threshold" )
+    parser.add_argument( '--workers', type = int, default = None, help = "worker processes (default: number of CPUs)" )
+    parser.add_argument( '--summary', default = None, help = "CSV file of the summary lines" )
+    args = parser.parse_args( argv )
+
+    runner = BatchRunner( args.workers )
+    jobs = runner.readManifest( args.manifest )
+
+    summaryFile = open( args.summary, 'w', newline = '' ) if args.summary else None
+    try:
+        writers = [ csv.DictWriter( sys.stdout, BatchRunner.SUMMARY_COLUMNS ) ]
+        if summaryFile is not None:
+            writers.append( csv.DictWriter( summaryFile, BatchRunner.SUMMARY_COLUMNS ) )
+
+        for writer in writers:
+            writer.writeheader()
+
+        def report( line ):
+            for writer in writers:
+                writer.writerow( line )
+            sys.stdout.flush()
+
+        summaries = runner.run( jobs, report )
+    finally:
+        if summaryFile is not None:
+            summaryFile.close()
+
+    return 0 if all( line[ 'status' ] == 'ok' for line in summaries ) else 1
+
+
+if __name__ == '__main__':
+    sys.exit( main() )
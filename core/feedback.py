@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+class Feedback( object ):
+    """
+    This class is the feedback of a run outside QGIS: it is never canceled and ignores the progress.
+
+    The matchers only call isCanceled, setProgress and pushInfo, so a QgsProcessingFeedback works
+    as well; subclass it to report the progress of a headless run.
+    """
+
+    def isCanceled( self ):
+        return False
+
+    def setProgress( self, progress ):
+        pass
+
+    def pushInfo( self, info ):
+        pass
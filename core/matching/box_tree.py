@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+import math
+import numpy as np
+from .grid_index import expandRanges
+
+class BoxTree( object ):
+    """
+    This class handles a static R-tree over bounding boxes, packed with the Sort-Tile-Recursive (STR) method.
+
+    Unlike GridIndex, it suits objects with an extent (lines, polygons) of any size. The boxes are sorted
+    in STR order and every level of the tree is a set of arrays: the node k of a level holds the nodes
+    [ k*NODE_CAPACITY, (k+1)*NODE_CAPACITY ) of the level below, so the tree is only its levels' boxes.
+    Queries go down all levels at once for a batch of boxes.
+
+    For details see: Leutenegger, S., Lopez, M., and Edgington, J., 1997. STR: A Simple and Efficient Algorithm
+    for R-Tree Packing. Proceedings of the 13th International Conference on Data Engineering, 497-506.
+    """
+
+    # Children per node
+    NODE_CAPACITY = 16
+
+    def __init__( self, xmin, ymin, xmax, ymax, mask = None ):
+        """
+        Constructor
+
+        @param xmin, ymin, xmax, ymax: Box arrays, one box per object.
+        @param mask: Optional boolean array with the objects to index.
+        """
+        boxes = [ np.asarray( values, dtype = np.float64 ) for values in ( xmin, ymin, xmax, ymax ) ]
+
+        positions = np.flatnonzero( mask ) if mask is not None else np.arange( len( boxes[0] ) )
+
+        # 1) ordem STR: faixas verticais pelo centro em x e, na faixa, pelo centro em y
+        capacity = self.NODE_CAPACITY
+        cx = ( boxes[0][ positions ] + boxes[2][ positions ] ) / 2.
+        cy = ( boxes[1][ positions ] + boxes[3][ positions ] ) / 2.
+
+        nstrips = max( int( math.ceil( math.sqrt( math.ceil( len( positions ) / capacity ) ) ) ), 1 )
+        stripSize = nstrips * capacity
+
+        byX = np.argsort( cx, kind = 'stable' )
+        strip = np.empty( len( positions ), dtype = np.int64 )
+        strip[ byX ] = np.arange( len( positions ) ) // stripSize
+
+        order = np.lexsort( ( cy, strip ) )
+        self.positions = positions[ order ]
+
+        # 2) niveis, das folhas ate a raiz
+        self.levels = [ tuple( values[ self.positions ] for values in boxes ) ]
+
+        while len( self.levels[-1][0] ) > 1:
+            starts = np.arange( 0, len( self.levels[-1][0] ), capacity )
+            lxmin, lymin, lxmax, lymax = self.levels[-1]
+
+            self.levels.append( ( np.minimum.reduceat( lxmin, starts ), np.minimum.reduceat( lymin, starts ),
+                                  np.maximum.reduceat( lxmax, starts ), np.maximum.reduceat( lymax, starts ) ) )
+
+    def __len__( self ):
+        return len( self.positions )
+
+    def queryPairs( self, xmin, ymin, xmax, ymax ):
+        """
+        Objects whose box intersects each query box (borders included).
+
+        The query limits are arrays, one box per element.
+
+        Return: (box, position) arrays, one element for each object found for each box.
+        """
+        xmin, ymin = np.asarray( xmin, dtype = np.float64 ), np.asarray( ymin, dtype = np.float64 )
+        xmax, ymax = np.asarray( xmax, dtype = np.float64 ), np.asarray( ymax, dtype = np.float64 )
+
+        if len( self.positions ) == 0:
+            return np.zeros( 0, dtype = np.int64 ), np.zeros( 0, dtype = np.int64 )
+
+        # 1) comeca na raiz
+        box = np.arange( len( xmin ) )
+        node = np.zeros( len( xmin ), dtype = np.int64 )
+
+        for level in range( len( self.levels ) - 1, -1, -1 ):
+            lxmin, lymin, lxmax, lymax = self.levels[ level ]
+
+            # 2) filhos do nivel de cima - a raiz nao tem pai
+            if level < len( self.levels ) - 1:
+                start = node * self.NODE_CAPACITY
+                end = np.minimum( start + self.NODE_CAPACITY, len( lxmin ) )
+
+                box = np.repeat( box, end - start )
+                node = expandRanges( start, end )
+
+            # 3) soh os que cruzam o box
+            hit = ( lxmin[ node ] <= xmax[ box ] ) & ( lxmax[ node ] >= xmin[ box ] ) & \
+                  ( lymin[ node ] <= ymax[ box ] ) & ( lymax[ node ] >= ymin[ box ] )
+            box, node = box[ hit ], node[ hit ]
+
+        return box, self.positions[ node ]
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+from array import array
+import numpy as np
+
+class CandidateSet( object ):
+    """
+    This class handles a sparse set of candidate pairs between a reference and a test dataset.
+
+    It replaces the dense distance matrix: only the pairs found inside the search box are kept,
+    as COO triplets (reference position, test position, value). Positions index the refIds and
+    testIds lists, which play the role of the first row and first column of the matrix. Any pair
+    not stored is "no candidate", so memory scales with the number of candidates.
+    """
+
+    def __init__( self, refIds = None, testIds = None ):
+        """Constructor"""
+        self.refIds  = refIds  if refIds  is not None else list() # column -> reference id
+        self.testIds = testIds if testIds is not None else list() # row -> test id
+
+        self.refIndex  = array( 'q' )
+        self.testIndex = array( 'q' )
+        self.values    = array( 'd' )
+
+    def __len__( self ):
+        return len( self.values )
+
+    def __iter__( self ):
+        """Iterates over the triplets (refIndex, testIndex, value) """
+        return zip( self.refIndex, self.testIndex, self.values )
+
+    def add( self, refIndex, testIndex, value ):
+        """Inserts a candidate pair by position in refIds/testIds """
+        self.refIndex.append( refIndex )
+        self.testIndex.append( testIndex )
+        self.values.append( value )
+
+    def extend( self, refIndex, testIndex, values ):
+        """Inserts a block of candidate pairs given as NumPy arrays (same length) """
+        self.refIndex.frombytes( np.ascontiguousarray( refIndex, dtype = np.int64 ).tobytes() )
+        self.testIndex.frombytes( np.ascontiguousarray( testIndex, dtype = np.int64 ).tobytes() )
+        self.values.frombytes( np.ascontiguousarray( values, dtype = np.float64 ).tobytes() )
+
+    def toMatrix( self, defaultValue ):
+        """
+        Expands the set to the dense two-dimensional list used by MatchPairManager.buildFromMatrix.
+
+        Only meant for debugging small datasets: it allocates (test+1) x (reference+1) cells.
+        """
+        matrix = [[ defaultValue for x in range( len( self.refIds )+1 ) ] for y in range( len( self.testIds )+1 ) ]
+
+        for j, refId in enumerate( self.refIds ):
+            matrix[0][j+1] = refId
+        for i, testId in enumerate( self.testIds ):
+            matrix[i+1][0] = testId
+
+        for j, i, value in self:
+            matrix[i+1][j+1] = value
+
+        return matrix
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+import math
+import numpy as np
+from .candidate_set import CandidateSet
+from .grid_index import GridIndex
+
+class BlockDistanceEngine( object ):
+    """
+    This class computes Euclidean distances between two point sets in blocks of bounded size.
+
+    The reference points are grouped into compact tiles of at most blockSize points (vertical strips,
+    sorted by y inside each strip). For each tile, the test points around it are taken from a grid index
+    and processed in chunks of at most blockSize points, so a ref-tile x test-tile distance block never
+    has more than blockSize**2 cells, whatever the layer size. Only the pairs under the threshold survive.
+    """
+
+    def __init__( self, blockSize = 1024 ):
+        """
+        Constructor
+
+        @param blockSize: Maximum number of points per tile side. Peak memory is a few float64 arrays of blockSize**2 cells.
+        """
+        if blockSize < 1:
+            raise Exception( "Invalid block size.", "InvalidParameterValue" )
+
+        self.blockSize = int( blockSize )
+
+    def run( self, refPoints, testPoints, threshold, feedback = None ) -> CandidateSet:
+        """
+        Computes the candidate pairs whose distance is not greater than the threshold.
+
+        refPoints, testPoints : PointSet of the reference and test layers.
+        feedback : optional QgsProcessingFeedback, for progress and cancel.
+
+        Return: the CandidateSet (positions of refPoints x positions of testPoints).
+        """
+
+        candidates = CandidateSet( refPoints.ids.tolist(), testPoints.ids.tolist() )
+
+        refPos = refPoints.validPositions()
+        if len( refPos ) == 0 or not testPoints.valid.any():
+            return candidates
+
+        # 1) Tamanho do tile: um quadrado com ~blockSize pontos de ref
+        xmin, ymin, xmax, ymax = refPoints.extent()
+        area = max( ( xmax - xmin ) * ( ymax - ymin ), 1e-12 )
+        tileSize = math.sqrt( area * self.blockSize / len( refPos ) )
+        tileSize = max( tileSize, threshold, 1e-12 )
+
+        testIndex = GridIndex( testPoints.x, testPoints.y, tileSize, testPoints.valid )
+
+        # 2) Ordena ref em faixas verticais e, dentro da faixa, por y
+        refX, refY = refPoints.x[ refPos ], refPoints.y[ refPos ]
+        strip = np.floor( ( refX - xmin ) / tileSize ).astype( np.int64 )
+        order = np.lexsort( ( refY, strip ) )
+
+        refPos, refX, refY, strip = refPos[ order ], refX[ order ], refY[ order ], strip[ order ]
+
+        # quebra em tiles: blockSize pontos, sem cruzar faixas
+        stripStart = np.flatnonzero( np.r_[ True, strip[1:] != strip[:-1] ] )
+        stripEnd   = np.r_[ stripStart[1:], len( refPos ) ]
+
+        tiles = [ ( start, min( start + self.blockSize, end ) )
+                  for s, end in zip( stripStart.tolist(), stripEnd.tolist() )
+                  for start in range( s, end, self.blockSize ) ]
+
+        # 3) Bloco a bloco
+        for k, ( start, end ) in enumerate( tiles ):
+            if feedback is not None:
+                if feedback.isCanceled():
+                    break
+                feedback.setProgress( int( 100. * k / len( tiles ) ) )
+
+            rx, ry = refX[ start:end ], refY[ start:end ]
+
+            testPos = testIndex.query( rx.min() - threshold, ry.min() - threshold,
+                                       rx.max() + threshold, ry.max() + threshold )
+
+            for chunk in range( 0, len( testPos ), self.blockSize ):
+                tpos = testPos[ chunk:chunk + self.blockSize ]
+
+                dx = testPoints.x[ tpos ][ np.newaxis, : ] - rx[ :, np.newaxis ]
+                dy = testPoints.y[ tpos ][ np.newaxis, : ] - ry[ :, np.newaxis ]
+                dist = np.sqrt( dx*dx + dy*dy )
+
+                # mascara do threshold - soh os sobreviventes saem
+                r, t = np.nonzero( dist <= threshold )
+
+                candidates.extend( refPos[ start + r ], tpos[ t ], dist[ r, t ] )
+
+        return candidates
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+import numpy as np
+
+class GridIndex( object ):
+    """
+    This class handles a uniform grid (spatial hash) over a set of points.
+
+    The index is built once over coordinate arrays and answers box queries by visiting only the
+    cells that intersect the box, so a query costs the number of points around it instead of the
+    number of points in the layer. Points are referred to by their position in the arrays.
+
+    Internally the cells are numbered column by column (key = column * rows + row) and the point
+    positions are sorted by key, so each column of cells crossed by a box is one contiguous slice.
+    """
+
+    # Maximum number of cells along an axis, so the cell keys fit in int64
+    MAX_CELLS = 2**28
+
+    def __init__( self, x, y, cellSize, mask = None ):
+        """
+        Constructor
+
+        @param x, y: Coordinate arrays.
+        @param cellSize: Side of each grid cell. The search distance is a good value.
+        @param mask: Optional boolean array with the points to index (e.g. PointSet.valid).
+        """
+        if cellSize <= 0.:
+            raise Exception( "Invalid cell size.", "InvalidParameterValue" )
+
+        self.x = np.asarray( x, dtype = np.float64 )
+        self.y = np.asarray( y, dtype = np.float64 )
+
+        positions = np.flatnonzero( mask ) if mask is not None else np.arange( len( self.x ) )
+
+        # 1) limites - garante que as chaves cabem em int64
+        if len( positions ) > 0:
+            xmin, xmax = self.x[ positions ].min(), self.x[ positions ].max()
+            ymin, ymax = self.y[ positions ].min(), self.y[ positions ].max()
+        else:
+            xmin = xmax = ymin = ymax = 0.
+
+        cellSize = max( float( cellSize ), ( xmax - xmin ) / self.MAX_CELLS, ( ymax - ymin ) / self.MAX_CELLS )
+
+        self.cellSize = cellSize
+        self.col0 = int( np.floor( xmin / cellSize ) )
+        self.row0 = int( np.floor( ymin / cellSize ) )
+        self.ncols = int( np.floor( xmax / cellSize ) ) - self.col0 + 1
+        self.nrows = int( np.floor( ymax / cellSize ) ) - self.row0 + 1
+
+        # 2) chave de cada ponto, ordenada
+        cols = np.floor( self.x[ positions ] / cellSize ).astype( np.int64 ) - self.col0
+        rows = np.floor( self.y[ positions ] / cellSize ).astype( np.int64 ) - self.row0
+        keys = cols * self.nrows + rows
+
+        order = np.argsort( keys, kind = 'stable' )
+
+        self.keys = keys[ order ]
+        self.positions = positions[ order ]
+
+    def __len__( self ):
+        return len( self.positions )
+
+    def cellRanges( self, xmin, ymin, xmax, ymax ):
+        """
+        Returns the (start, end) slices of self.positions for the cells crossed by the boxes.
+
+        The box limits can be scalars or arrays (one box per element); in the latter case the result
+        also carries, for each slice, the index of the box it belongs to: (box, start, end).
+        """
+        xmin, ymin = np.atleast_1d( xmin ), np.atleast_1d( ymin )
+        xmax, ymax = np.atleast_1d( xmax ), np.atleast_1d( ymax )
+
+        # 1) celulas cobertas, recortadas na grade
+        cmin = np.maximum( np.floor( xmin / self.cellSize ).astype( np.int64 ) - self.col0, 0 )
+        cmax = np.minimum( np.floor( xmax / self.cellSize ).astype( np.int64 ) - self.col0, self.ncols - 1 )
+        rmin = np.maximum( np.floor( ymin / self.cellSize ).astype( np.int64 ) - self.row0, 0 )
+        rmax = np.minimum( np.floor( ymax / self.cellSize ).astype( np.int64 ) - self.row0, self.nrows - 1 )
+
+        # 2) uma fatia por coluna de celulas: [col*nrows + rmin, col*nrows + rmax]
+        ncolsBox = np.where( ( cmax >= cmin ) & ( rmax >= rmin ), cmax - cmin + 1, 0 )
+        box = np.repeat( np.arange( len( ncolsBox ) ), ncolsBox )
+        col = np.arange( len( box ) ) - np.repeat( np.cumsum( ncolsBox ) - ncolsBox, ncolsBox ) + cmin[ box ]
+
+        start = np.searchsorted( self.keys, col * self.nrows + rmin[ box ], side = 'left' )
+        end   = np.searchsorted( self.keys, col * self.nrows + rmax[ box ], side = 'right' )
+
+        return box, start, end
+
+    def query( self, xmin, ymin, xmax, ymax ):
+        """
+        Returns the positions of the points inside the box (borders included).
+        """
+        box, start, end = self.cellRanges( xmin, ymin, xmax, ymax )
+
+        found = self.positions[ expandRanges( start, end ) ]
+
+        # a borda da celula nao eh a borda do box - checa os pontos
+        px, py = self.x[ found ], self.y[ found ]
+        return found[ ( px >= xmin ) & ( px <= xmax ) & ( py >= ymin ) & ( py <= ymax ) ]
+
+    def queryRadius( self, x, y, radius ):
+        """Returns the positions inside the square box of half side radius around (x, y) """
+        return self.query( x-radius, y-radius, x+radius, y+radius )
+
+    def queryPairs( self, xmin, ymin, xmax, ymax ):
+        """
+        Batch version of query: one box per element of the limit arrays.
+
+        Return: (box, position) arrays, one element for each point inside each box (borders included).
+        """
+        xmin, ymin = np.asarray( xmin, dtype = np.float64 ), np.asarray( ymin, dtype = np.float64 )
+        xmax, ymax = np.asarray( xmax, dtype = np.float64 ), np.asarray( ymax, dtype = np.float64 )
+
+        box, start, end = self.cellRanges( xmin, ymin, xmax, ymax )
+
+        owner = np.repeat( box, np.maximum( end - start, 0 ) )
+        found = self.positions[ expandRanges( start, end ) ]
+
+        # a borda da celula nao eh a borda do box - checa os pontos
+        px, py = self.x[ found ], self.y[ found ]
+        inside = ( px >= xmin[ owner ] ) & ( px <= xmax[ owner ] ) & ( py >= ymin[ owner ] ) & ( py <= ymax[ owner ] )
+
+        return owner[ inside ], found[ inside ]
+
+
+def expandRanges( start, end ):
+    """Concatenates the integer ranges [start[k], end[k]) into a single array """
+    counts = np.maximum( end - start, 0 )
+    total = int( counts.sum() )
+
+    if total == 0:
+        return np.zeros( 0, dtype = np.int64 )
+
+    offsets = np.repeat( start - ( np.cumsum( counts ) - counts ), counts )
+    return offsets + np.arange( total, dtype = np.int64 )
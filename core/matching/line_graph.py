@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+import numpy as np
+from .grid_index import expandRanges
+from .point_set import PointSet
+
+class LineGraph( object ):
+    """
+    This class handles the node/edge graph of a line dataset: the edges are the lines and the nodes are
+    their end points, merged when the coordinates are the same.
+
+    - x, y       : coordinates of the nodes
+    - start, end : nodes of each line (-1 for the lines with less than 2 vertices)
+    - degree     : number of line ends at each node
+    - incidence  : the lines at node n are lines[ incidence[n]:incidence[n+1] ] (CSR)
+
+    Nodes of degree 2 only split a line in two; the others (junctions and dead ends) shape the network.
+    """
+
+    def __init__( self, lineSet ):
+        """
+        Constructor
+
+        @param lineSet: LineSet of the layer.
+        """
+        positions = lineSet.validPositions()
+
+        # 1) pontas das linhas: primeiro vertice da primeira parte, ultimo da ultima
+        ends = np.r_[ lineSet.offsets[ positions ], lineSet.offsets[ positions + 1 ] - 1 ]
+
+        # 2) mesmas coordenadas, mesmo no: vizinhas na ordem ( x, y )
+        x, y = lineSet.x[ ends ], lineSet.y[ ends ]
+        order = np.lexsort( ( y, x ) )
+
+        new = np.ones( len( ends ), dtype = bool )
+        new[1:] = ( np.diff( x[ order ] ) != 0 ) | ( np.diff( y[ order ] ) != 0 )
+
+        node = np.empty( len( ends ), dtype = np.int64 )
+        node[ order ] = np.cumsum( new ) - 1
+
+        self.x, self.y = x[ order ][ new ], y[ order ][ new ]
+
+        self.start = np.full( len( lineSet ), -1, dtype = np.int64 )
+        self.end   = np.full( len( lineSet ), -1, dtype = np.int64 )
+        self.start[ positions ] = node[ :len( positions ) ]
+        self.end[ positions ]   = node[ len( positions ): ]
+
+        # 3) incidencia: uma entrada por ponta (um laco aparece duas vezes)
+        owner = np.r_[ positions, positions ]
+        order = np.argsort( node, kind = 'stable' )
+
+        self.degree = np.bincount( node, minlength = len( self.x ) )
+        self.incidence = np.r_[ 0, np.cumsum( self.degree ) ]
+        self.lines = owner[ order ]
+
+        # pares de nos ligados, calculados na primeira consulta
+        self.links = None
+
+    def __len__( self ):
+        return len( self.x )
+
+    def nodeSet( self, mask = None ):
+        """Returns the nodes as a PointSet (ids are node positions), only the ones in mask as valid """
+        return PointSet( np.arange( len( self.x ) ), self.x, self.y, mask )
+
+    def junctions( self ):
+        """Returns a mask of the nodes that are not a simple split of a line (degree other than 2) """
+        return self.degree != 2
+
+    def incidentLines( self, nodes ):
+        """
+        Lines at each node of an array.
+
+        Return: (element of nodes, line) arrays.
+        """
+        counts = self.degree[ nodes ]
+        return np.repeat( np.arange( len( nodes ) ), counts ), self.lines[ expandRanges( self.incidence[ nodes ], self.incidence[ nodes + 1 ] ) ]
+
+    def otherEnd( self, lines, nodes ):
+        """Returns the other end of each line, from one of its end nodes """
+        return np.where( self.start[ lines ] == nodes, self.end[ lines ], self.start[ lines ] )
+
+    def adjacent( self, nodesA, nodesB ):
+        """Returns a mask of the pairs of nodes ( nodesA[k], nodesB[k] ) linked by a line """
+        if self.links is None:
+            positions = np.flatnonzero( self.start >= 0 )
+            start, end = self.start[ positions ], self.end[ positions ]
+            self.links = np.unique( np.r_[ start * len( self ) + end, end * len( self ) + start ] )
+
+        if len( self.links ) == 0:
+            return np.zeros( len( nodesA ), dtype = bool )
+
+        keys = nodesA * len( self ) + nodesB
+        found = np.minimum( np.searchsorted( self.links, keys ), len( self.links ) - 1 )
+
+        return ( nodesA >= 0 ) & ( nodesB >= 0 ) & ( self.links[ found ] == keys )
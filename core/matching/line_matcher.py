@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+import numpy as np
+from .match_pair_manager import MatchPairManager
+from .candidate_set import CandidateSet
+from .line_graph import LineGraph
+from .mutual_nearest import MutualNearestJoin
+from .box_tree import BoxTree
+from ..measure.line_measure import LineMeasure
+from ..feedback import Feedback
+
+class LineMatcher( object ):
+    """
+    This class runs the matching between two line sets, with no QGIS types (see LineMatchingAlgorithm).
+
+    Similarity distances:
+    - Hausdorff distance (discrete, over the vertices; see class LineMeasure)
+    - Frechet distance (discrete, over the vertices)
+    - Segment overlap: partial matching of the segments within a buffer (m:n)
+    
+    Criteria:
+    - Closer criteria: m:n matching case
+    - Both nearest: 1:1 matching case 
+    """
+
+    # methods, by number: similarity measure + case of correspondence
+    METHODS = [ "Hausdorff - closer", "Hausdorff - both nearest", "Frechet - closer", "Frechet - both nearest",
+                "Segment overlap - partial (m:n)" ]
+    
+    # Reference lines per batch of the candidate search
+    BATCH_SIZE = 4096
+    
+    # Segments reaching a segment of the other layer, per batch of the segment overlap
+    SEGMENT_BATCH_SIZE = 65536
+    
+    # Largest angle between two segments that overlap, in degrees
+    MAX_SEGMENT_ANGLE = 45.
+
+    def run( self, refLines, testLines, method, threshold, topology = False, minOverlap = 0.5, feedback = None ) -> MatchPairManager:
+        """
+        Matches the lines with one of the METHODS.
+        
+        refLines, testLines : LineSet of the reference and test layers, preprocessed or not.
+        topology : topology-guided candidates of the distance methods (see topologyPairs).
+        minOverlap : minimum matched length fraction of the segment overlap.
+        feedback : optional, as a QgsProcessingFeedback (see Feedback).
+        
+        Return: the MatchPairManager
+        """
+        if feedback is None:
+            feedback = Feedback()
+        
+        if 0 <= method <= 3:
+            return self.runLineDistance( feedback, refLines, testLines, method, threshold, topology )
+        
+        if method == 4:
+            return self.runSegmentOverlap( feedback, refLines, testLines, threshold, minOverlap )
+        
+        raise Exception( "Invalid match method.", "InvalidParameterValue" )
+    
+    def runLineDistance( self, feedback, refLines, testLines, method, threshold, topology = False ) -> MatchPairManager:
+        """
+        Processing the matching using the discrete Hausdorff (methods 0, 1) or Frechet (methods 2, 3) distance.
+        
+        refLines, testLines : LineSet of the reference and test layers.
+        topology : candidates guided by the matched junctions (see topologyPairs).
+        
+        Return: the MatchPairManager
+        """
+        
+        measure = LineMeasure()
+        
+        if method < 2:
+            distance = measure.hausdorffPairs
+        else:
+            # Frechet abandona os pares acima do threshold
+            distance = lambda *pairs: measure.frechetPairs( *pairs, maxDistance = threshold )
+        
+        candidates = self.searchCandidates( feedback, refLines, testLines, threshold, distance, topology )
+        
+        # OK, tenho tudo, faltam os pares
+        pairMgr = MatchPairManager()
+        
+        # check o criteria 
+        criteria = pairMgr.CriteriaType.ISMINIMUM if method % 2 == 0 else pairMgr.CriteriaType.BOTHMIN
+        
+        pairMgr.buildFromCandidates( candidates, criteria, threshold )
+        
+        return pairMgr
+        
+    def runSegmentOverlap( self, feedback, refLines, testLines, threshold, minOverlap ) -> MatchPairManager:
+        """
+        Processing the partial matching of the segments of the lines.
+        
+        The test segments are indexed in an R-tree; each pair of nearly parallel segments within threshold gives
+        the part of each one inside the buffer of the other (LineMeasure.bufferInterval). The parts of a segment
+        matched by the segments of the same line of the other layer are merged (LineMeasure.coveredLength), and
+        summed by pair of lines: the matched length of each line of the pair.
+        
+        refLines, testLines : LineSet of the reference and test layers.
+        minOverlap : minimum matched fraction of the length of one of the lines.
+        
+        Return: the MatchPairManager
+        """
+        measure = LineMeasure()
+        t = threshold
+        
+        refSeg, testSeg = self.segmentArrays( refLines ), self.segmentArrays( testLines )
+        nref, ntest = len( refLines ), len( testLines )
+        
+        # 1) Indice dos segmentos de test
+        tree = BoxTree( np.minimum( testSeg[0], testSeg[0] + testSeg[2] ), np.minimum( testSeg[1], testSeg[1] + testSeg[3] ),
+                        np.maximum( testSeg[0], testSeg[0] + testSeg[2] ), np.maximum( testSeg[1], testSeg[1] + testSeg[3] ) )
+        
+        cosMax = np.cos( np.radians( self.MAX_SEGMENT_ANGLE ) )
+        
+        # ( ref line * ntest + test line, length matched ) e ( test segment * nref + ref line, lo, hi ), por lote
+        refMatched = [ [ np.zeros( 0, dtype = np.int64 ) ], [ np.zeros( 0 ) ] ]
+        testParts = [ [ np.zeros( 0, dtype = np.int64 ) ], [ np.zeros( 0 ) ], [ np.zeros( 0 ) ] ]
+        
+        # 2) Em lotes de segmentos de ref
+        for start in range( 0, len( refSeg[4] ), self.SEGMENT_BATCH_SIZE ):
+            # running chks
+            if feedback.isCanceled():
+                break
+            
+            px, py, dx, dy, line, length = [ values[ start:start + self.SEGMENT_BATCH_SIZE ] for values in refSeg ]
+            
+            a, b = tree.queryPairs( np.minimum( px, px + dx ) - t, np.minimum( py, py + dy ) - t,
+                                    np.maximum( px, px + dx ) + t, np.maximum( py, py + dy ) + t )
+            
+            qx, qy, ex, ey, testLine, testLength = [ values[ b ] for values in testSeg ]
+            
+            # 2.1) quase paralelos
+            parallel = np.abs( dx[ a ]*ex + dy[ a ]*ey ) >= cosMax * length[ a ] * testLength
+            a, b = a[ parallel ], b[ parallel ]
+            qx, qy, ex, ey, testLine = qx[ parallel ], qy[ parallel ], ex[ parallel ], ey[ parallel ], testLine[ parallel ]
+            
+            # 2.2) parte de cada um no buffer do outro
+            lo, hi = measure.bufferInterval( px[ a ], py[ a ], dx[ a ], dy[ a ], qx, qy, ex, ey, t )
+            group, covered = measure.coveredLength( a * ntest + testLine, lo, hi )
+            refMatched[0].append( line[ group // ntest ] * ntest + group % ntest )
+            refMatched[1].append( covered * length[ group // ntest ] )
+            
+            lo, hi = measure.bufferInterval( qx, qy, ex, ey, px[ a ], py[ a ], dx[ a ], dy[ a ], t )
+            testParts[0].append( b * nref + line[ a ] )
+            testParts[1].append( lo )
+            testParts[2].append( hi )
+            
+            feedback.setProgress( int( 100. * min( start + self.SEGMENT_BATCH_SIZE, len( refSeg[4] ) ) / max( len( refSeg[4] ), 1 ) ) )
+        
+        # 3) as partes dos segmentos de test, juntas de todos os lotes
+        group, covered = measure.coveredLength( *[ np.concatenate( values ) for values in testParts ] )
+        segment = group // nref
+        
+        pairTest = ( group % nref ) * ntest + testSeg[4][ segment ]
+        lengthTest = covered * testSeg[5][ segment ]
+        
+        pairRef, lengthRef = [ np.concatenate( values ) for values in refMatched ]
+        
+        # 4) o comprimento casado de cada linha, por par de linhas
+        pairs, inverse = np.unique( np.r_[ pairRef, pairTest ], return_inverse = True )
+        matchedRef = np.bincount( inverse[ :len( pairRef ) ], weights = lengthRef, minlength = len( pairs ) )
+        matchedTest = np.bincount( inverse[ len( pairRef ): ], weights = lengthTest, minlength = len( pairs ) )
+        
+        # 5) fracoes e pares
+        j, i = pairs // ntest, pairs % ntest
+        
+        refLength = np.bincount( refSeg[4], weights = refSeg[5], minlength = nref )
+        testLength = np.bincount( testSeg[4], weights = testSeg[5], minlength = ntest )
+        
+        fractionRef = np.minimum( matchedRef / refLength[ j ], 1. )
+        fractionTest = np.minimum( matchedTest / testLength[ i ], 1. )
+        
+        keep = np.maximum( fractionRef, fractionTest ) >= minOverlap
+        
+        pairMgr = MatchPairManager()
+        refIds, testIds = refLines.ids.tolist(), testLines.ids.tolist()
+        
+        for j, i, fr, ft in zip( j[ keep ].tolist(), i[ keep ].tolist(), fractionRef[ keep ].tolist(), fractionTest[ keep ].tolist() ):
+            pairMgr.insertPair( refIds[j], testIds[i], 1. - max( fr, ft ), ( fr, ft ) )
+        
+        return pairMgr
+    
+    def segmentArrays( self, lines ):
+        """
+        Segments of a LineSet with length, as arrays: start point, direction, line and length of each segment.
+        
+        Return: [ px, py, dx, dy, line, length ]
+        """
+        first, line = lines.segments()
+        
+        px, py = lines.x[ first ], lines.y[ first ]
+        dx, dy = lines.x[ first + 1 ] - px, lines.y[ first + 1 ] - py
+        length = np.hypot( dx, dy )
+        
+        keep = length > 0
+        
+        return [ px[ keep ], py[ keep ], dx[ keep ], dy[ keep ], line[ keep ], length[ keep ] ]
+    
+    def searchCandidates( self, feedback, refLines, testLines, threshold, distance, topology = False ) -> CandidateSet:
+        """
+        Distances of the pairs of lines that can be under the threshold, using an R-tree over the test lines -
+        or, with topology, the pairs of topologyPairs, and the R-tree only for the reference lines with no
+        pair kept by the measure.
+        
+        distance : measure of a batch of pairs, as LineMeasure.hausdorffPairs.
+        
+        Return: the CandidateSet
+        """
+        
+        candidates = CandidateSet( refLines.ids.tolist(), testLines.ids.tolist() )
+        
+        refPos = refLines.validPositions()
+        
+        # 1) Pares pela rede; as linhas sem par medido sob o threshold ficam para a busca por posicao
+        if topology:
+            j, i = self.topologyPairs( feedback, refLines, testLines, threshold )
+            kept = self.measurePairs( candidates, refLines, testLines, j, i, threshold, distance )
+            refPos = np.setdiff1d( refPos, kept )
+            
+            feedback.pushInfo( "Topology: {} lines searched by position.".format( len( refPos ) ) )
+        
+        # 2) Indice das linhas de test
+        tree = BoxTree( testLines.xmin, testLines.ymin, testLines.xmax, testLines.ymax, testLines.valid )
+        t = threshold
+        
+        # 3) Em lotes de linhas de ref
+        for start in range( 0, len( refPos ), self.BATCH_SIZE ):
+            # running chks
+            if feedback.isCanceled():
+                break
+            
+            batch = refPos[ start:start + self.BATCH_SIZE ]
+            
+            owner, i = tree.queryPairs( refLines.xmin[ batch ] - t, refLines.ymin[ batch ] - t,
+                                        refLines.xmax[ batch ] + t, refLines.ymax[ batch ] + t )
+            
+            self.measurePairs( candidates, refLines, testLines, batch[ owner ], i, threshold, distance )
+            
+            feedback.setProgress( int( 100. * ( start + len( batch ) ) / len( refPos ) ) )
+        
+        return candidates
+    
+    def measurePairs( self, candidates, refLines, testLines, j, i, threshold, distance ):
+        """
+        Measures the pairs ( refLines[ j[k] ], testLines[ i[k] ] ) and adds the ones under the threshold to candidates.
+        
+        Return: the reference positions of the pairs added.
+        
+        A Hausdorff (or Frechet) distance under the threshold puts every vertex of a line within threshold of the
+        other line, so each bounding box must be inside the other one grown by the threshold: only those pairs
+        are measured. The Frechet distance is not smaller than the Hausdorff one, so the same test holds.
+        """
+        t = threshold
+        
+        # 1) um box dentro do outro, com o threshold
+        inside = ( testLines.xmin[ i ] >= refLines.xmin[ j ] - t ) & ( testLines.xmax[ i ] <= refLines.xmax[ j ] + t ) & \
+                 ( testLines.ymin[ i ] >= refLines.ymin[ j ] - t ) & ( testLines.ymax[ i ] <= refLines.ymax[ j ] + t ) & \
+                 ( refLines.xmin[ j ] >= testLines.xmin[ i ] - t ) & ( refLines.xmax[ j ] <= testLines.xmax[ i ] + t ) & \
+                 ( refLines.ymin[ j ] >= testLines.ymin[ i ] - t ) & ( refLines.ymax[ j ] <= testLines.ymax[ i ] + t )
+        j, i = j[ inside ], i[ inside ]
+        
+        # 2) agora sim, a distancia
+        values = distance( refLines, testLines, j, i )
+        keep = values <= threshold
+        
+        candidates.extend( j[ keep ], i[ keep ], values[ keep ] )
+        
+        return j[ keep ]
+    
+    def topologyPairs( self, feedback, refLines, testLines, threshold ):
+        """
+        Pairs of lines guided by the networks of both layers (see LineGraph).
+        
+        The junctions (nodes not of degree 2) are matched first, as mutual nearest points under the threshold
+        (MutualNearestJoin). A reference line is then paired with the test lines at the match of one of its ends
+        whose other end is the match of its other end, or adjacent to it (a test line split by a node of
+        degree 2), or any, when its other end has no match. The reference lines with no pair measured
+        under the threshold go to the search by position (see searchCandidates).
+        
+        Return: (reference positions, test positions) arrays.
+        """
+        refGraph, testGraph = LineGraph( refLines ), LineGraph( testLines )
+        
+        # 1) juncoes primeiro
+        refNodes, testNodes, _ = MutualNearestJoin( threshold ).pairs( refGraph.nodeSet( refGraph.junctions() ),
+                                                                       testGraph.nodeSet( testGraph.junctions() ) )
+        
+        matchOf = np.full( len( refGraph ), -1, dtype = np.int64 )
+        matchOf[ refNodes ] = testNodes
+        
+        # 2) cada ponta casada das linhas de ref, com a outra ponta
+        refPos = refLines.validPositions()
+        line = np.r_[ refPos, refPos ]
+        near = np.r_[ refGraph.start[ refPos ], refGraph.end[ refPos ] ]
+        far  = np.r_[ refGraph.end[ refPos ],   refGraph.start[ refPos ] ]
+        
+        atMatch = matchOf[ near ] >= 0
+        line, near, far = line[ atMatch ], matchOf[ near[ atMatch ] ], matchOf[ far[ atMatch ] ]
+        
+        # 3) as linhas de test no no casado, que chegam ao par da outra ponta ou a um vizinho dele
+        owner, i = testGraph.incidentLines( near )
+        other, target = testGraph.otherEnd( i, near[ owner ] ), far[ owner ]
+        
+        accept = ( target < 0 ) | ( other == target ) | testGraph.adjacent( other, target )
+        
+        pair = np.unique( line[ owner[ accept ] ] * len( testLines ) + i[ accept ] )
+        j, i = pair // len( testLines ), pair % len( testLines )
+        
+        feedback.pushInfo( "Topology: {} junctions matched, {} pairs of lines.".format( len( refNodes ), len( j ) ) )
+        
+        return j, i
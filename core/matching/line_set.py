@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+from array import array
+from collections import OrderedDict
+import numpy as np
+from .grid_index import expandRanges
+from ..measure.descriptor_cache import DescriptorCache
+
+class LineSet( object ):
+    """
+    This class handles the vertices of a line dataset as contiguous arrays.
+
+    A layer is read exactly once and the algorithms work on the arrays:
+    - ids       : feature ids (int64)
+    - offsets   : the vertices of line k are x[ offsets[k]:offsets[k+1] ] (n+1 int64)
+    - x, y      : coordinates of all vertices (float64)
+    - partStart : True at the first vertex of each part; there is no segment ending on such a vertex
+    - valid     : False for lines with less than 2 vertices
+    - xmin, ymin, xmax, ymax : bounding box of each line (NaN for the empty ones)
+
+    Position k in the arrays is the k-th feature returned by the layer. The parts of a MultiLineString
+    follow each other in its vertices.
+    """
+
+    def __init__( self, ids, offsets, x, y, partStart = None, source = None ):
+        """Constructor"""
+        self.ids = np.asarray( ids, dtype = np.int64 )
+        self.offsets = np.asarray( offsets, dtype = np.int64 )
+        self.x = np.asarray( x, dtype = np.float64 )
+        self.y = np.asarray( y, dtype = np.float64 )
+        self.source = source
+
+        # sem partes: cada linha eh uma parte
+        if partStart is None:
+            partStart = np.zeros( len( self.x ), dtype = bool )
+            partStart[ self.offsets[:-1][ self.counts() > 0 ] ] = True
+
+        self.partStart = np.asarray( partStart, dtype = bool )
+        self.valid = self.counts() >= 2
+
+        # bbox de cada linha
+        self.xmin, self.ymin, self.xmax, self.ymax = [ np.full( len( self.ids ), np.nan ) for k in range( 4 ) ]
+
+        nonEmpty = self.counts() > 0
+        starts = self.offsets[:-1][ nonEmpty ]
+
+        if len( starts ) > 0:
+            self.xmin[ nonEmpty ] = np.minimum.reduceat( self.x, starts )
+            self.ymin[ nonEmpty ] = np.minimum.reduceat( self.y, starts )
+            self.xmax[ nonEmpty ] = np.maximum.reduceat( self.x, starts )
+            self.ymax[ nonEmpty ] = np.maximum.reduceat( self.y, starts )
+
+    def __len__( self ):
+        return len( self.ids )
+
+    def counts( self ):
+        """Returns the number of vertices of each line """
+        return np.diff( self.offsets )
+
+    @staticmethod
+    def fromLayer( lineLayer ):
+        """
+        Reads a line layer into a LineSet.
+        """
+
+        ids = array( 'q' )
+        offsets = array( 'q', [ 0 ] )
+        xs = array( 'd' )
+        ys = array( 'd' )
+        starts = array( 'q' )
+
+        for feat in lineLayer.getFeatures():
+            ids.append( feat.id() )
+
+            geom = feat.geometry()
+
+            # Chks habituais
+            if not geom.isEmpty():
+                parts = geom.asMultiPolyline() if geom.isMultipart() else [ geom.asPolyline() ]
+
+                for part in parts:
+                    if len( part ) == 0:
+                        continue
+
+                    starts.append( len( xs ) )
+                    for point in part:
+                        xs.append( point.x() )
+                        ys.append( point.y() )
+
+            offsets.append( len( xs ) )
+
+        partStart = np.zeros( len( xs ), dtype = bool )
+        partStart[ np.frombuffer( starts, dtype = np.int64 ) ] = True
+
+        return LineSet( np.frombuffer( ids, dtype = np.int64 ),
+                        np.frombuffer( offsets, dtype = np.int64 ),
+                        np.frombuffer( xs, dtype = np.float64 ),
+                        np.frombuffer( ys, dtype = np.float64 ),
+                        partStart,
+                        source = lineLayer.source() )
+
+    def validPositions( self ):
+        """Returns the positions of the lines with 2 vertices or more """
+        return np.flatnonzero( self.valid )
+
+    def segments( self ):
+        """
+        Returns the segments of all lines, as the positions of their first vertex in x/y (the second is the next one).
+
+        Return: (first vertex, line) arrays.
+        """
+        line = np.repeat( np.arange( len( self.ids ) ), self.counts() )
+
+        # o ultimo vertice de cada linha e o anterior ao inicio de cada parte nao abrem segmento
+        opens = np.ones( len( self.x ), dtype = bool )
+        opens[ self.offsets[1:][ self.counts() > 0 ] - 1 ] = False
+        opens[ :-1 ] &= ~self.partStart[ 1: ]
+
+        first = np.flatnonzero( opens )
+        return first, line[ first ]
+
+    def parts( self ):
+        """
+        Returns the parts of all lines, as the positions of their first and last vertices in x/y.
+
+        Return: (first vertex, last vertex) arrays.
+        """
+        first = np.flatnonzero( self.partStart )
+        last = np.r_[ first[1:], len( self.x ) ] - 1
+
+        return first, last
+
+    def simplify( self, tolerance ):
+        """
+        Douglas-Peucker simplification of all parts at once: every step splits all the spans
+        whose farthest inner vertex is over tolerance from the segment joining the span ends.
+
+        Return: the simplified LineSet. The Hausdorff distance to the original lines is at most tolerance.
+        """
+        keep = np.zeros( len( self.x ), dtype = bool )
+
+        first, last = self.parts()
+        keep[ first ] = True
+        keep[ last ] = True
+
+        start, end = first, last
+
+        while True:
+            # 1) so os spans com vertices internos
+            inner = end - start >= 2
+            start, end = start[ inner ], end[ inner ]
+
+            if len( start ) == 0:
+                break
+
+            sizes = end - start - 1
+            span = np.repeat( np.arange( len( start ) ), sizes )
+            vertex = expandRanges( start + 1, end )
+
+            # 2) distancia de cada vertice interno ao segmento das pontas do span
+            ax, ay = self.x[ start ][ span ], self.y[ start ][ span ]
+            dx, dy = self.x[ end ][ span ] - ax, self.y[ end ][ span ] - ay
+            px, py = self.x[ vertex ] - ax, self.y[ vertex ] - ay
+
+            length2 = dx*dx + dy*dy
+            along = np.clip( ( px*dx + py*dy ) / np.where( length2 > 0, length2, 1. ), 0., 1. )
+            dist2 = ( px - along*dx )**2 + ( py - along*dy )**2
+
+            # 3) o primeiro vertice mais distante dos spans que passam da tolerancia
+            farthest = np.maximum.reduceat( dist2, np.cumsum( sizes ) - sizes )
+            split = farthest > tolerance * tolerance
+
+            candidate = np.flatnonzero( split[ span ] & ( dist2 == farthest[ span ] ) )
+            candidate = candidate[ np.r_[ True, span[ candidate[1:] ] != span[ candidate[:-1] ] ] ] if len( candidate ) else candidate
+
+            middle = vertex[ candidate ]
+            keep[ middle ] = True
+
+            start, end = np.r_[ start[ split ], middle ], np.r_[ middle, end[ split ] ]
+
+        kept = np.r_[ 0, np.cumsum( keep ) ]
+        return LineSet( self.ids, kept[ self.offsets ], self.x[ keep ], self.y[ keep ], self.partStart[ keep ], self.source )
+
+    def densify( self, spacing ):
+        """
+        Splits the segments longer than spacing in equal pieces. All vertices are kept.
+
+        Return: the densified LineSet.
+        """
+        # 1) pedacos do segmento que termina em cada vertice; inicio de parte eh soh o vertice
+        step = np.zeros( len( self.x ) )
+        step[1:] = np.hypot( np.diff( self.x ), np.diff( self.y ) )
+        step[ self.partStart ] = 0.
+
+        pieces = np.maximum( np.ceil( step / spacing ), 1 ).astype( np.int64 )
+
+        # 2) pontos em ( k+1 )/pedacos do segmento, o ultimo eh o proprio vertice
+        vertex = np.repeat( np.arange( len( self.x ) ), pieces )
+        k = np.arange( len( vertex ) ) - np.repeat( np.cumsum( pieces ) - pieces, pieces )
+        ratio = ( k + 1. ) / pieces[ vertex ]
+
+        previous = np.maximum( vertex - 1, 0 )
+        x = self.x[ vertex ] - ( 1. - ratio ) * ( self.x[ vertex ] - self.x[ previous ] )
+        y = self.y[ vertex ] - ( 1. - ratio ) * ( self.y[ vertex ] - self.y[ previous ] )
+
+        added = np.r_[ 0, np.cumsum( pieces ) ]
+        partStart = np.zeros( len( vertex ), dtype = bool )
+        partStart[ added[1:][ self.partStart ] - 1 ] = True
+
+        return LineSet( self.ids, added[ self.offsets ], x, y, partStart, self.source )
+
+    def resample( self, spacing ):
+        """
+        Resamples all parts with equally spaced vertices, at most spacing apart along the part.
+        The ends of each part are kept.
+
+        Return: the resampled LineSet.
+        """
+        first, last = self.parts()
+
+        # 1) comprimento acumulado; os inicios de parte nao tem segmento antes
+        step = np.zeros( len( self.x ) )
+        step[1:] = np.hypot( np.diff( self.x ), np.diff( self.y ) )
+        step[ first ] = 0.
+        along = np.cumsum( step )
+
+        length = along[ last ] - along[ first ]
+
+        # 2) amostras de cada parte: as pontas e o necessario entre elas
+        samples = np.where( last > first, np.maximum( np.ceil( length / spacing ), 1 ).astype( np.int64 ) + 1, 1 )
+        part = np.repeat( np.arange( len( first ) ), samples )
+        k = np.arange( len( part ) ) - np.repeat( np.cumsum( samples ) - samples, samples )
+
+        target = along[ first ][ part ] + length[ part ] * k / np.maximum( samples[ part ] - 1, 1 )
+
+        # 3) interpolacao no segmento da parte que contem cada amostra
+        segment = np.clip( np.searchsorted( along, target, side = 'right' ) - 1, first[ part ], np.maximum( last[ part ] - 1, first[ part ] ) )
+        following = np.minimum( segment + 1, last[ part ] )
+
+        size = along[ following ] - along[ segment ]
+        ratio = np.clip( ( target - along[ segment ] ) / np.where( size > 0, size, 1. ), 0., 1. )
+
+        x = self.x[ segment ] + ratio * ( self.x[ following ] - self.x[ segment ] )
+        y = self.y[ segment ] + ratio * ( self.y[ following ] - self.y[ segment ] )
+
+        # 4) as pontas exatas
+        ends = np.cumsum( samples ) - 1
+        x[ ends ], y[ ends ] = self.x[ last ], self.y[ last ]
+
+        partStart = np.zeros( len( part ), dtype = bool )
+        partStart[ np.cumsum( samples ) - samples ] = True
+
+        # 5) numero de vertices de cada linha
+        line = np.repeat( np.arange( len( self.ids ) ), self.counts() )[ first ]
+        perLine = np.bincount( line, weights = samples, minlength = len( self.ids ) ).astype( np.int64 )
+
+        return LineSet( self.ids, np.r_[ 0, np.cumsum( perLine ) ], x, y, partStart, self.source )
+
+
+class LineSetCache( object ):
+    """
+    This class handles an in-memory cache of LineSets, read and preprocessed (simplified or resampled) per layer.
+
+    Reading a layer with thousands of vertices per feature and reducing it costs more than most matchings,
+    so the reduced arrays are kept for the next runs and measures over the same layer. An entry is valid while
+    the file behind the layer keeps its modification stamp (see DescriptorCache.sourceStamp): layers without a
+    source file, or with edits not saved, are always read again.
+    """
+
+    # preprocessing modes
+    NONE = 0
+    SIMPLIFY = 1
+    RESAMPLE = 2
+
+    def __init__( self, maxEntries = 8 ):
+        """
+        Constructor
+
+        @param maxEntries: Number of LineSets kept; the least recently used is dropped.
+        """
+        self.maxEntries = maxEntries
+        self.entries = OrderedDict()
+
+    def get( self, lineLayer, mode = NONE, value = 0. ):
+        """
+        LineSet of a layer, preprocessed.
+
+        @param mode: NONE, SIMPLIFY (value is the tolerance; the long segments left are split at twice the tolerance,
+                     for the discrete measures) or RESAMPLE (value is the spacing).
+        @returns The LineSet; do not change its arrays, they are shared.
+        """
+        stamp = DescriptorCache.sourceStamp( lineLayer.source() )
+
+        if stamp is None or lineLayer.isModified():
+            return self.preprocess( LineSet.fromLayer( lineLayer ), mode, value )
+
+        key = ( lineLayer.source(), stamp, lineLayer.featureCount(), mode, float( value ) if mode != self.NONE else 0. )
+
+        if key in self.entries:
+            self.entries.move_to_end( key )
+            return self.entries[ key ]
+
+        # a leitura sem preprocessamento tambem fica, para outros modos
+        rawKey = key[ :3 ] + ( self.NONE, 0. )
+
+        if rawKey in self.entries:
+            lines = self.entries[ rawKey ]
+        else:
+            lines = LineSet.fromLayer( lineLayer )
+            self.put( rawKey, lines )
+
+        lines = self.preprocess( lines, mode, value )
+        self.put( key, lines )
+
+        return lines
+
+    def put( self, key, lines ):
+        """Stores an entry, dropping the least recently used ones """
+        self.entries[ key ] = lines
+        self.entries.move_to_end( key )
+
+        while len( self.entries ) > self.maxEntries:
+            self.entries.popitem( last = False )
+
+    def preprocess( self, lines, mode, value ):
+        """Applies a preprocessing mode to a LineSet """
+        # as medidas sao discretas, nos vertices: a linha simplificada volta a ter vertices a cada 2*tolerancia
+        if mode == self.SIMPLIFY and value > 0:
+            return lines.simplify( value ).densify( 2. * value )
+        if mode == self.RESAMPLE and value > 0:
+            return lines.resample( value )
+
+        return lines
@@ -0,0 +1,582 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+from enum import Enum
+import numpy as np
+
+class MatchPairManager( object ):
+    """
+    This class handles with matching pairs.
+    
+    The pairs are kept in a disjoint-set (union-find) structure, with path compression and union by size:
+    each A id and each B id is a node, and inserting a pair joins the groups of its two nodes. So m:n
+    groups stay correct when pairs chain together, and each insertion costs almost constant time.
+    The groups are listed in the order of their first node.
+    """
+    
+    class CriteriaType( Enum ):
+        ISMAXIMUM = 0 # Only the maximum value in a column/row will be used (if > threshold).
+        ISMINIMUM = 1 # Only the minimum value in a column/row will be used (if < threshold).
+        ISABOVE   = 2 # Any value above the threshold will be used.
+        ISUNDER   = 3 # Any value under the threshold will be used.
+        BOTHMAX   = 4 # If maximum value is the same: A->B and B->A. Only 1:1 matches.
+        BOTHMIN   = 5 # If minimum value is the same: A->B and B->A. Only 1:1 matches.        
+    
+    def __init__( self ):
+        """Constructor"""
+        self.aNode = dict() # A id -> node
+        self.bNode = dict() # B id -> node
+        
+        # nodes
+        self.nodeId = list()   # node -> A or B id
+        self.nodeIsA = list()  # node -> True if it is an A id
+        self.parent = list()   # node -> parent node
+        self.size = list()     # root node -> size of the group
+        
+        # pairs inserted, each one once, with its score (None if unknown)
+        self.pairIndex = dict()  # (node A, node B) -> pair
+        self.pairA = list()
+        self.pairB = list()
+        self.pairScore = list()
+        self.pairFractions = None # (fraction of A, fraction of B) of each pair, when measured - see insertPair
+        
+        # groups, built on demand
+        self.groupCache = None
+    
+    
+    def hasMatchesOfA( self, alfaId ):
+        """Checks whether the A object exists in the manager """
+        return alfaId in self.aNode
+    
+    def hasMatchesOfB( self, betaId ):
+        """Checks whether the A object exists in the manager """
+        return betaId in self.bNode
+    
+    def getMatchesOfA( self, alfaId ):
+        """Returns a list of B ids which match with the alfaId """
+        
+        node = self.aNode.get( alfaId )
+        
+        if node is None:
+            return []
+        
+        groups, groupOf = self.groupList()
+        return list( groups[ groupOf[ self.find( node ) ] ][1] )
+    
+    def getMatchesOfB( self, betaId ):
+        """Returns a list of A ids which match with the betaId """
+        
+        node = self.bNode.get( betaId )
+        
+        if node is None:
+            return []
+        
+        groups, groupOf = self.groupList()
+        return list( groups[ groupOf[ self.find( node ) ] ][0] )
+    
+    def groups( self ):
+        """Returns the list of groups, each one a pair (list of A ids, list of B ids) """
+        return self.groupList()[0]
+    
+    def pairCount( self ):
+        """Returns the number of distinct pairs inserted """
+        return len( self.pairA )
+    
+    def hasFractions( self ):
+        """Checks whether the pairs have matched fractions (see insertPair) """
+        return self.pairFractions is not None
+    
+    def iterPairs( self ):
+        """
+        Iterates over the inserted pairs, group by group: (A id, B id, group index, score), plus
+        (fraction of A, fraction of B) when the pairs have fractions.
+        
+        The group index is the position of the group in groups().
+        """
+        groups, groupOf = self.groupList()
+        
+        pairGroup = np.array( [ groupOf[ self.find( node ) ] for node in self.pairA ], dtype = np.int64 )
+        
+        for k in np.argsort( pairGroup, kind = 'stable' ).tolist():
+            if self.pairFractions is None:
+                yield self.nodeId[ self.pairA[k] ], self.nodeId[ self.pairB[k] ], int( pairGroup[k] ), self.pairScore[k]
+            else:
+                yield ( self.nodeId[ self.pairA[k] ], self.nodeId[ self.pairB[k] ], int( pairGroup[k] ), self.pairScore[k] ) + self.pairFractions[k]
+    
+    def iterLines( self, asOneToOne = False ):
+        """Iterates over the lines of toString, one by one """
+        
+        # 1) Se 1:1 eh linha a linha
+        if( asOneToOne ):
+            # para cada alfa
+            for alfa, beta in self.groups():
+                # para cada B que corresponde ao A
+                for alfaId in alfa:
+                    for betaId in beta:
+                        yield str( alfaId ) + ':' + str( betaId ) + '\n'
+            
+        # 2) Nao eh 1:1, mantem o padrao "a1,a2:b1,b2"    
+        else:
+            for alfa, beta in self.groups():
+                if len( alfa ) < 1: # chk seguranca
+                    continue
+                
+                # imprime As, depois Bs
+                yield ','.join( str(a) for a in alfa ) + ':' + ','.join( str(b) for b in beta ) + '\n'
+    
+    def groupList( self ):
+        """Builds (and caches) the groups and the map root node -> group index """
+        
+        if self.groupCache is None:
+            groups = []
+            groupOf = dict()
+            
+            # na ordem dos nos: o grupo entra na lista pelo seu primeiro no
+            for node in range( len( self.parent ) ):
+                root = self.find( node )
+                k = groupOf.get( root )
+                
+                if k is None:
+                    k = len( groups )
+                    groupOf[ root ] = k
+                    groups.append( ( [], [] ) )
+                
+                groups[k][ 0 if self.nodeIsA[ node ] else 1 ].append( self.nodeId[ node ] )
+            
+            self.groupCache = ( groups, groupOf )
+        
+        return self.groupCache
+        
+    def toString( self, asOneToOne = False ):
+        """Serializes the pairs to string using ':' as separator. See PairWriter to stream them to a file. """
+        return ''.join( self.iterLines( asOneToOne ) )
+    # end_toString
+    
+    def newNode( self, objId, isA ):
+        """Creates a node (a group of its own) and returns it """
+        node = len( self.parent )
+        
+        self.nodeId.append( objId )
+        self.nodeIsA.append( isA )
+        self.parent.append( node )
+        self.size.append( 1 )
+        
+        if isA:
+            self.aNode[ objId ] = node
+        else:
+            self.bNode[ objId ] = node
+        
+        return node
+    
+    def find( self, node ):
+        """Returns the root node of the group (with path compression) """
+        parent = self.parent
+        
+        root = node
+        while parent[ root ] != root:
+            root = parent[ root ]
+        
+        # comprime o caminho
+        while parent[ node ] != root:
+            parent[ node ], node = root, parent[ node ]
+        
+        return root
+
+    def insertPair( self, alfaId, betaId, score = None, fractions = None ):
+        """
+        Insert a pair: a, b - and the value (distance, similarity) which matched them.
+        
+        fractions : (fraction of a, fraction of b) matched in the pair, for partial matchings (e.g. of lines).
+        """
+        # First, checks for a and b - creating them, if new
+        nodeA = self.aNode.get( alfaId )
+        if nodeA is None:
+            nodeA = self.newNode( alfaId, True )
+        
+        nodeB = self.bNode.get( betaId )
+        if nodeB is None:
+            nodeB = self.newNode( betaId, False )
+        
+        # guarda o par, uma vez soh
+        k = self.pairIndex.get( ( nodeA, nodeB ) )
+        if k is None:
+            self.pairIndex[ ( nodeA, nodeB ) ] = len( self.pairA )
+            self.pairA.append( nodeA )
+            self.pairB.append( nodeB )
+            self.pairScore.append( score )
+            
+            if fractions is not None and self.pairFractions is None:
+                self.pairFractions = [ ( None, None ) ] * ( len( self.pairA ) - 1 )
+            if self.pairFractions is not None:
+                self.pairFractions.append( tuple( fractions ) if fractions is not None else ( None, None ) )
+        else:
+            if self.pairScore[k] is None:
+                self.pairScore[k] = score
+            if fractions is not None:
+                if self.pairFractions is None:
+                    self.pairFractions = [ ( None, None ) ] * len( self.pairA )
+                self.pairFractions[k] = tuple( fractions )
+        
+        # ok, both exists. So merge them, if unmerged
+        self.merge( nodeA, nodeB )
+    
+    # end_insertPair
+    
+    def insertPairs( self, refIds, testIds, refIndex, testIndex, scores ):
+        """Insert the pairs (refIds[refIndex[k]], testIds[testIndex[k]]) with scores[k], in order """
+        for j, i, score in zip( refIndex.tolist(), testIndex.tolist(), scores.tolist() ):
+            self.insertPair( refIds[j], testIds[i], score )
+    
+    def merge( self, node1, node2 ):
+        """Merges the groups of two nodes (union by size)"""
+
+        # 1) Initial chk
+        root1, root2 = self.find( node1 ), self.find( node2 )
+        
+        self.groupCache = None
+        
+        if root1 == root2:
+            return
+        
+        # 2) O menor grupo vai para baixo do maior
+        if self.size[ root1 ] < self.size[ root2 ]:
+            root1, root2 = root2, root1
+        
+        self.parent[ root2 ] = root1
+        self.size[ root1 ] += self.size[ root2 ]
+    
+    # end_merge
+    
+    def buildFromMatrix( self, matrix, criteriaType, threshold ):
+        """
+        A complete method to build match pairs from a matrix of distances between objects.
+        
+        matrix : two-dimensional list which contains the distances and object IDs (first column, firstrow).
+                 A NumPy array with the same layout is handled by buildFromArray.
+        criteriaType : which criteria should used to establishes the matching. See CriteriaType for detais.
+        threshold : minimum or maximum value, depending on the criteria, to establishes a similarity.
+        """
+        
+        # 0) NumPy: caminho vetorizado
+        if isinstance( matrix, np.ndarray ):
+            if matrix.ndim != 2 or matrix.shape[0] < 2 or matrix.shape[1] < 2:
+                return # throw
+            
+            refIds, testIds = matrix[ 0, 1: ], matrix[ 1:, 0 ]
+            
+            # ids inteiros guardados como float voltam a ser inteiros
+            if np.all( np.floor( refIds ) == refIds ) and np.all( np.floor( testIds ) == testIds ):
+                refIds, testIds = refIds.astype( np.int64 ), testIds.astype( np.int64 )
+            
+            self.buildFromArray( refIds.tolist(), testIds.tolist(), matrix[ 1:, 1: ], criteriaType, threshold )
+            return
+        
+        # 1) Check parameters
+        # at least 2 rows x 2 cols
+        if len( matrix ) < 2 :
+            return # throw
+        if len( matrix[0] ) < 2:
+            return # throw
+        
+        nrows, ncols = len( matrix ), len( matrix[0] )
+        
+        # 2) Criteria ISMAXIMUM
+        if criteriaType == self.CriteriaType.ISMAXIMUM:
+            # 2.1) ismax - cols
+            for j in range( 1, ncols ):
+                imax = 0
+                maxValue = float('-inf')
+                
+                for i in range( 1, nrows ):
+                    if matrix[i][j] > maxValue:
+                        imax = i
+                        maxValue = matrix[i][j]
+                        
+                # por fim, insere o par ref/test, se dist < threshold
+                if maxValue > threshold:
+                    self.insertPair( matrix[0][j], matrix[imax][0], maxValue )
+                    
+            # 2.2) ismax - rows
+            for i in range( 1, nrows ):
+                jmax = 0
+                maxValue = float('-inf')
+                
+                for j in range( 1, ncols ):
+                    if matrix[i][j] > maxValue:
+                        jmax = j
+                        maxValue = matrix[i][j]
+                        
+                # por fim, insere o par ref/test, se dist > threshold
+                if maxValue > threshold:
+                    self.insertPair( matrix[0][jmax], matrix[i][0], maxValue )
+                    
+        # 3) ISMINIMUM
+        elif criteriaType == self.CriteriaType.ISMINIMUM:
+            # 3.1) ismin - cols
+            for j in range( 1, ncols ):
+                imin = 0
+                minValue = float('inf')
+                
+                for i in range( 1, nrows ):
+                    if matrix[i][j] < minValue:
+                        imin = i
+                        minValue = matrix[i][j]
+                        
+                # por fim, insere o par ref/test, se dist < threshold
+                if minValue < threshold:
+                    self.insertPair( matrix[0][j], matrix[imin][0], minValue )
+                    
+            # 3.2) ismin - rows
+            for i in range( 1, nrows ):
+                jmin = 0
+                minValue = float('inf')
+                
+                for j in range( 1, ncols ):
+                    if matrix[i][j] < minValue:
+                        jmin = j
+                        minValue = matrix[i][j]
+                        
+                # por fim, insere o par ref/test, se dist < threshold
+                if minValue < threshold:
+                    self.insertPair( matrix[0][jmin], matrix[i][0], minValue )
+                    
+        # 4) ISABOVE
+        elif criteriaType == self.CriteriaType.ISABOVE:
+            # 4.1) Isabove = cols + rows
+            for j in range( 1, ncols ):
+                for i in range( 1, nrows ):
+                    # qq coisa maior que o threshold eh par 
+                    if matrix[i][j] > threshold:
+                        self.insertPair( matrix[0][j], matrix[i][0], matrix[i][j] )
+                    
+        # 5) ISUNDER
+        elif criteriaType == self.CriteriaType.ISUNDER:
+            # 5.1) Isunder = cols + rows
+            for j in range( 1, ncols ):
+                for i in range( 1, nrows ):
+                    # qq coisa menor que o threshold eh par 
+                    if matrix[i][j] < threshold:
+                        self.insertPair( matrix[0][j], matrix[i][0], matrix[i][j] )
+        
+        # 6) BOTHMAX
+        elif criteriaType == self.CriteriaType.BOTHMAX:
+            maxCol_Lin = dict()
+            
+            # 6.1) ismax - cols
+            for j in range( 1, ncols ):
+                imax = 0
+                maxValue = float('-inf')
+                
+                for i in range( 1, nrows ):
+                    if matrix[i][j] > maxValue:
+                        imax = i
+                        maxValue = matrix[i][j]
+                        
+                # por fim, insere o par ref/test, se dist < threshold, no temp
+                if maxValue > threshold:
+                    maxCol_Lin[ matrix[0][j] ] = matrix[imax][0]
+                    
+            # 6.2) ismax - rows
+            for i in range( 1, nrows ):
+                jmax = 0
+                maxValue = float('-inf')
+                
+                for j in range( 1, ncols ):
+                    if matrix[i][j] > maxValue:
+                        jmax = j
+                        maxValue = matrix[i][j]
+                        
+                # por fim, insere o par ref/test, se dist > threshold e na lista temp
+                if maxValue > threshold:
+                    it = maxCol_Lin.get( matrix[0][jmax] )
+                    
+                    if it == matrix[i][0]:
+                        self.insertPair( matrix[0][jmax], matrix[i][0], maxValue )
+                    
+        # 7) BOTHMIN
+        elif criteriaType == self.CriteriaType.BOTHMIN:
+            minCol_Lin = dict()
+            
+            # 7.1) ismin - cols
+            for j in range( 1, ncols ):
+                imin = 0
+                minValue = float('inf')
+                
+                for i in range( 1, nrows ):
+                    if matrix[i][j] < minValue:
+                        imin = i
+                        minValue = matrix[i][j]
+                        
+                # por fim, insere o par ref/test, se dist < threshold, numa lista temp
+                if minValue < threshold:
+                    minCol_Lin[ matrix[0][j] ] = matrix[imin][0]
+                    
+            # 7.2) ismin - rows
+            for i in range( 1, nrows ):
+                jmin = 0
+                minValue = float('inf')
+                
+                for j in range( 1, ncols ):
+                    if matrix[i][j] < minValue:
+                        jmin = j
+                        minValue = matrix[i][j]
+                        
+                # por fim, insere o par ref/test, se dist < threshold e na lista_temp
+                if minValue < threshold:
+                    it = minCol_Lin.get( matrix[0][jmin] ) 
+                    
+                    if it == matrix[i][0]:
+                        self.insertPair( matrix[0][jmin], matrix[i][0], minValue )
+        else:
+            raise Exception("Invalid criteria.", "InvalidParameterValue")
+        
+        # end_buildFromMatrix
+        
+    def buildFromArray( self, refIds, testIds, values, criteriaType, threshold ):
+        """
+        Vectorized version of buildFromMatrix: same pairs, same insertion order.
+        
+        refIds : ids of the reference (A) objects, one per column.
+        testIds : ids of the test (B) objects, one per row.
+        values : two-dimensional NumPy array (len(testIds) x len(refIds)) of distances.
+        criteriaType : which criteria should used to establishes the matching. See CriteriaType for detais.
+        threshold : minimum or maximum value, depending on the criteria, to establishes a similarity.
+        """
+        
+        values = np.asarray( values, dtype = np.float64 )
+        
+        # 1) Check parameters
+        if values.ndim != 2 or values.shape[0] < 1 or values.shape[1] < 1:
+            return # throw
+        
+        # 2) ISABOVE / ISUNDER - qq valor alem do threshold, coluna a coluna
+        if criteriaType == self.CriteriaType.ISABOVE or criteriaType == self.CriteriaType.ISUNDER:
+            mask = values > threshold if criteriaType == self.CriteriaType.ISABOVE else values < threshold
+            
+            j, i = np.nonzero( mask.T )
+            self.insertPairs( refIds, testIds, j, i, values[ i, j ] )
+            return
+        
+        if criteriaType == self.CriteriaType.ISMAXIMUM or criteriaType == self.CriteriaType.BOTHMAX:
+            # max vira min trocando o sinal; NaN nunca ganha
+            keys = np.where( np.isnan( values ), np.inf, -values )
+            limit = -threshold
+        elif criteriaType == self.CriteriaType.ISMINIMUM or criteriaType == self.CriteriaType.BOTHMIN:
+            keys = np.where( np.isnan( values ), np.inf, values )
+            limit = threshold
+        else:
+            raise Exception("Invalid criteria.", "InvalidParameterValue")
+        
+        # 3) argmin por coluna e por linha - o primeiro em caso de empate
+        cols = np.arange( keys.shape[1] )
+        rows = np.arange( keys.shape[0] )
+        
+        colArg = np.argmin( keys, axis = 0 )
+        colOk  = keys[ colArg, cols ] < limit
+        rowArg = np.argmin( keys, axis = 1 )
+        rowOk  = keys[ rows, rowArg ] < limit
+        
+        # 4) ISMAXIMUM / ISMINIMUM - cols, then rows
+        if criteriaType == self.CriteriaType.ISMAXIMUM or criteriaType == self.CriteriaType.ISMINIMUM:
+            self.insertPairs( refIds, testIds, cols[ colOk ], colArg[ colOk ], values[ colArg[ colOk ], cols[ colOk ] ] )
+            self.insertPairs( refIds, testIds, rowArg[ rowOk ], rows[ rowOk ], values[ rows[ rowOk ], rowArg[ rowOk ] ] )
+        
+        # 5) BOTHMAX / BOTHMIN - o melhor da linha eh o melhor da sua coluna
+        else:
+            both = rowOk & colOk[ rowArg ] & ( colArg[ rowArg ] == rows )
+            self.insertPairs( refIds, testIds, rowArg[ both ], rows[ both ], values[ rows[ both ], rowArg[ both ] ] )
+        
+        # end_buildFromArray
+        
+    def buildFromCandidates( self, candidates, criteriaType, threshold ):
+        """
+        Builds match pairs from a sparse set of candidates (see CandidateSet).
+        
+        Same criteria as buildFromMatrix, but a pair which is not in the set is not a candidate at all,
+        instead of a cell holding a placeholder value. Ties are broken by the lowest position, and pairs
+        are inserted in the same order as buildFromMatrix does.
+        
+        candidates : CandidateSet with the values between reference (A) and test (B) objects.
+        criteriaType : which criteria should used to establishes the matching. See CriteriaType for detais.
+        threshold : minimum or maximum value, depending on the criteria, to establishes a similarity.
+        """
+        
+        refIds, testIds = candidates.refIds, candidates.testIds
+        
+        j = np.frombuffer( candidates.refIndex,  dtype = np.int64 )
+        i = np.frombuffer( candidates.testIndex, dtype = np.int64 )
+        values = np.frombuffer( candidates.values, dtype = np.float64 )
+        
+        # 1) Criteria ISABOVE / ISUNDER - any candidate, in column order
+        if criteriaType == self.CriteriaType.ISABOVE or criteriaType == self.CriteriaType.ISUNDER:
+            mask = values > threshold if criteriaType == self.CriteriaType.ISABOVE else values < threshold
+            
+            order = np.lexsort( ( i[ mask ], j[ mask ] ) )
+            self.insertPairs( refIds, testIds, j[ mask ][ order ], i[ mask ][ order ], values[ mask ][ order ] )
+            return
+        
+        if criteriaType == self.CriteriaType.ISMAXIMUM or criteriaType == self.CriteriaType.BOTHMAX:
+            # max vira min trocando o sinal; NaN nunca ganha
+            keys = np.where( np.isnan( values ), np.inf, -values )
+            limit = -threshold
+        elif criteriaType == self.CriteriaType.ISMINIMUM or criteriaType == self.CriteriaType.BOTHMIN:
+            keys = np.where( np.isnan( values ), np.inf, values )
+            limit = threshold
+        else:
+            raise Exception("Invalid criteria.", "InvalidParameterValue")
+        
+        # 2) Best candidate of each column (reference) and row (test): sort and take the first
+        order = np.lexsort( ( i, keys, j ) )
+        first = order[ np.r_[ True, j[ order ][1:] != j[ order ][:-1] ] ] if len( order ) > 0 else order
+        colJ, colI, colV, colOk = j[ first ], i[ first ], values[ first ], keys[ first ] < limit
+        
+        order = np.lexsort( ( j, keys, i ) )
+        first = order[ np.r_[ True, i[ order ][1:] != i[ order ][:-1] ] ] if len( order ) > 0 else order
+        rowI, rowJ, rowV, rowOk = i[ first ], j[ first ], values[ first ], keys[ first ] < limit
+        
+        # 3) ISMAXIMUM / ISMINIMUM - cols, then rows
+        if criteriaType == self.CriteriaType.ISMAXIMUM or criteriaType == self.CriteriaType.ISMINIMUM:
+            self.insertPairs( refIds, testIds, colJ[ colOk ], colI[ colOk ], colV[ colOk ] )
+            self.insertPairs( refIds, testIds, rowJ[ rowOk ], rowI[ rowOk ], rowV[ rowOk ] )
+        
+        # 4) BOTHMAX / BOTHMIN - the best of the row must be the best of its column
+        else:
+            bestOfCol = np.full( len( refIds ), -1, dtype = np.int64 )
+            bestOfCol[ colJ[ colOk ] ] = colI[ colOk ]
+            
+            both = rowOk & ( bestOfCol[ rowJ ] == rowI )
+            self.insertPairs( refIds, testIds, rowJ[ both ], rowI[ both ], rowV[ both ] )
+        
+        # end_buildFromCandidates
+        
+    
+    
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+import numpy as np
+from .grid_index import GridIndex
+from .match_pair_manager import MatchPairManager
+
+class MutualNearestJoin( object ):
+    """
+    This class handles the mutual (reciprocal) nearest neighbour join between two point sets.
+
+    It runs k=1 nearest neighbour queries in both directions, each one against a grid index of the
+    other set, and keeps the pairs A->B and B->A under the threshold. This is the "both nearest"
+    (BOTHMIN) criteria without any distance matrix: the pairs are the same as
+    MatchPairManager.buildFromCandidates( ..., BOTHMIN, threshold ) over the Euclidean candidates,
+    ties included (the lowest position wins).
+    """
+
+    # Number of queries per batch, to bound the memory of the candidate arrays
+    BATCH_SIZE = 65536
+
+    def __init__( self, threshold ):
+        """Constructor"""
+        self.threshold = float( threshold )
+
+    def nearest( self, index, qx, qy ):
+        """
+        Nearest indexed point of each query point, if closer than the threshold.
+
+        index : GridIndex of the searched points.
+        qx, qy : coordinates of the query points.
+
+        Return: (positions, distances) arrays, -1 / inf where there is no neighbour under the threshold.
+        """
+        nearestPos  = np.full( len( qx ), -1, dtype = np.int64 )
+        nearestDist = np.full( len( qx ), np.inf )
+
+        t = self.threshold
+
+        for start in range( 0, len( qx ), self.BATCH_SIZE ):
+            x, y = qx[ start:start + self.BATCH_SIZE ], qy[ start:start + self.BATCH_SIZE ]
+
+            # 1) candidatos no box do threshold
+            q, p = index.queryPairs( x - t, y - t, x + t, y + t )
+
+            dx, dy = index.x[ p ] - x[ q ], index.y[ p ] - y[ q ]
+            dist = np.sqrt( dx*dx + dy*dy )
+
+            keep = dist < t
+            q, p, dist = q[ keep ], p[ keep ], dist[ keep ]
+
+            # 2) o menor de cada query - empate fica com a menor posicao
+            order = np.lexsort( ( p, dist, q ) )
+            q, p, dist = q[ order ], p[ order ], dist[ order ]
+
+            first = np.r_[ True, q[1:] != q[:-1] ] if len( q ) > 0 else np.zeros( 0, dtype = bool )
+
+            nearestPos[ start + q[ first ] ]  = p[ first ]
+            nearestDist[ start + q[ first ] ] = dist[ first ]
+
+        return nearestPos, nearestDist
+
+    def pairs( self, refPoints, testPoints ):
+        """
+        Mutual nearest pairs of the reference and test points.
+
+        refPoints, testPoints : PointSet of the reference and test layers.
+
+        Return: (reference positions, test positions, distances) arrays, in the order of the test points.
+        """
+        cellSize = self.threshold if self.threshold > 0. else 1.
+
+        refPos  = refPoints.validPositions()
+        testPos = testPoints.validPositions()
+
+        if len( refPos ) == 0 or len( testPos ) == 0:
+            empty = np.zeros( 0, dtype = np.int64 )
+            return empty, empty, np.zeros( 0 )
+
+        # 1) k=1 nos dois sentidos, cada um contra o indice do outro
+        refIndex  = GridIndex( refPoints.x,  refPoints.y,  cellSize, refPoints.valid )
+        testIndex = GridIndex( testPoints.x, testPoints.y, cellSize, testPoints.valid )
+
+        refNearest, _         = self.nearest( testIndex, refPoints.x[ refPos ], refPoints.y[ refPos ] )
+        testNearest, testDist = self.nearest( refIndex, testPoints.x[ testPos ], testPoints.y[ testPos ] )
+
+        # 2) reciprocos: test -> ref -> o mesmo test
+        refOf = np.full( len( refPoints ), -1, dtype = np.int64 )
+        refOf[ refPos ] = refNearest
+
+        hasNearest = testNearest >= 0
+        i, j, dist = testPos[ hasNearest ], testNearest[ hasNearest ], testDist[ hasNearest ]
+        mutual = refOf[ j ] == i
+
+        return j[ mutual ], i[ mutual ], dist[ mutual ]
+
+    def run( self, refPoints, testPoints, pairMgr = None ) -> MatchPairManager:
+        """
+        Joins the reference and test points.
+
+        refPoints, testPoints : PointSet of the reference and test layers.
+        pairMgr : MatchPairManager to fill. A new one is created if None.
+
+        Return: the MatchPairManager
+        """
+        if pairMgr is None:
+            pairMgr = MatchPairManager()
+
+        j, i, dist = self.pairs( refPoints, testPoints )
+
+        # 3) pares, na ordem do test (como no buildFromCandidates)
+        refIds, testIds = refPoints.ids.tolist(), testPoints.ids.tolist()
+
+        pairMgr.insertPairs( refIds, testIds, j, i, dist )
+
+        return pairMgr
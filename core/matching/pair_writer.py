@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+import os
+import csv
+import math
+import sqlite3
+from itertools import islice
+from abc import ABC, abstractmethod
+
+class PairWriter( ABC ):
+    """
+    This class streams the pairs of a MatchPairManager to a file, while iterating over them.
+
+    Formats:
+    - TEXT       : the "a1,a2:b1,b2" format of MatchPairManager.toString, one group per line
+    - CSV        : one pair per row: ref_id, test_id, group_id, score - plus ref_fraction, test_fraction
+                   when the pairs have matched fractions (see MatchPairManager.insertPair)
+    - GEOPACKAGE : the CSV rows as an attribute table (no geometry) named "pairs"
+    - PARQUET    : the CSV rows as a Parquet file (requires pyarrow)
+    """
+
+    TEXT = 0
+    CSV = 1
+    GEOPACKAGE = 2
+    PARQUET = 3
+
+    # names, in the order of the constants above
+    FORMATS = [ "Text (a1,a2:b1,b2)", "CSV", "GeoPackage", "Parquet" ]
+    EXTENSIONS = [ '.txt', '.csv', '.gpkg', '.parquet' ]
+
+    COLUMNS = [ 'ref_id', 'test_id', 'group_id', 'score' ]
+    FRACTION_COLUMNS = [ 'ref_fraction', 'test_fraction' ]
+
+    # rows per batch, for the GeoPackage and Parquet formats
+    BATCH_SIZE = 65536
+
+    def __init__( self, path ):
+        """Constructor"""
+        self.path = path
+
+    @staticmethod
+    def create( outputFormat, path ):
+        """Returns the writer of the format (see FORMATS) """
+        writers = { PairWriter.TEXT       : TextPairWriter,
+                    PairWriter.CSV        : CsvPairWriter,
+                    PairWriter.GEOPACKAGE : GeoPackagePairWriter,
+                    PairWriter.PARQUET    : ParquetPairWriter }
+
+        if outputFormat not in writers:
+            raise Exception( "Invalid output format.", "InvalidParameterValue" )
+
+        return writers[ outputFormat ]( path )
+
+    @staticmethod
+    def columns( pairMgr ):
+        """Columns of the rows of the manager """
+        return PairWriter.COLUMNS + ( PairWriter.FRACTION_COLUMNS if pairMgr.hasFractions() else [] )
+
+    @staticmethod
+    def rows( pairMgr ):
+        """Iterates over the pairs as rows (ref_id, test_id, group_id, score[, ref_fraction, test_fraction]); a missing value is None """
+        for row in pairMgr.iterPairs():
+            yield row[ :3 ] + tuple( None if value is not None and math.isnan( value ) else value for value in row[ 3: ] )
+
+    @abstractmethod
+    def write( self, pairMgr ):
+        """
+        Writes the pairs of the manager.
+
+        Return: number of records written.
+        """
+
+
+class TextPairWriter( PairWriter ):
+    """Streams the groups in the "a1,a2:b1,b2" text format """
+
+    def write( self, pairMgr ):
+        count = 0
+
+        with open( self.path, 'w' ) as output:
+            output.write( "# Pair manager\n" )
+
+            for line in pairMgr.iterLines():
+                output.write( line )
+                count += 1
+
+        return count
+
+
+class CsvPairWriter( PairWriter ):
+    """Streams the pairs as CSV rows """
+
+    def write( self, pairMgr ):
+        count = 0
+
+        with open( self.path, 'w', newline = '' ) as output:
+            writer = csv.writer( output )
+            writer.writerow( self.columns( pairMgr ) )
+
+            for row in self.rows( pairMgr ):
+                writer.writerow( [ '' if value is None else value for value in row ] )
+                count += 1
+
+        return count
+
+
+class GeoPackagePairWriter( PairWriter ):
+    """
+    Streams the pairs to an attribute table (data_type 'attributes') of a new GeoPackage.
+
+    The file is written with sqlite3, with the minimal GeoPackage metadata tables.
+    """
+
+    TABLE = 'pairs'
+
+    WGS84 = ( 'GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563,AUTHORITY["EPSG","7030"]],'
+              'AUTHORITY["EPSG","6326"]],PRIMEM["Greenwich",0,AUTHORITY["EPSG","8901"]],'
+              'UNIT["degree",0.0174532925199433,AUTHORITY["EPSG","9122"]],AUTHORITY["EPSG","4326"]]' )
+
+    def write( self, pairMgr ):
+        if os.path.exists( self.path ):
+            os.remove( self.path )
+
+        rows = self.rows( pairMgr )
+        columns = self.columns( pairMgr )
+
+        # tipo das colunas de id pelo primeiro par
+        first = list( islice( rows, 1 ) )
+        idType = 'INTEGER' if not first or isinstance( first[0][0], int ) else 'TEXT'
+        types = [ idType, idType, 'INTEGER' ] + [ 'DOUBLE' ] * ( len( columns ) - 3 )
+
+        count = 0
+        db = sqlite3.connect( self.path )
+
+        try:
+            # 1) metadados do GeoPackage
+            db.execute( "PRAGMA application_id = 1196444487" ) # 'GPKG'
+            db.execute( "PRAGMA user_version = 10200" )
+
+            db.execute( "CREATE TABLE gpkg_spatial_ref_sys ( srs_name TEXT NOT NULL, srs_id INTEGER NOT NULL PRIMARY KEY, "
+                        "organization TEXT NOT NULL, organization_coordsys_id INTEGER NOT NULL, "
+                        "definition TEXT NOT NULL, description TEXT )" )
+            db.executemany( "INSERT INTO gpkg_spatial_ref_sys VALUES ( ?, ?, ?, ?, ?, ? )",
+                            [ ( 'Undefined cartesian SRS',  -1, 'NONE', -1, 'undefined', None ),
+                              ( 'Undefined geographic SRS',  0, 'NONE',  0, 'undefined', None ),
+                              ( 'WGS 84 geodetic', 4326, 'EPSG', 4326, self.WGS84, None ) ] )
+
+            db.execute( "CREATE TABLE gpkg_contents ( table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, "
+                        "identifier TEXT UNIQUE, description TEXT DEFAULT '', "
+                        "last_change DATETIME NOT NULL DEFAULT ( strftime( '%Y-%m-%dT%H:%M:%fZ', 'now' ) ), "
+                        "min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER, "
+                        "CONSTRAINT fk_gc_r_srs_id FOREIGN KEY ( srs_id ) REFERENCES gpkg_spatial_ref_sys( srs_id ) )" )
+
+            # 2) a tabela dos pares
+            db.execute( "CREATE TABLE %s ( fid INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, %s )" %
+                        ( self.TABLE, ', '.join( '%s %s' % column for column in zip( columns, types ) ) ) )
+            db.execute( "INSERT INTO gpkg_contents ( table_name, data_type, identifier ) VALUES ( ?, 'attributes', ? )",
+                        ( self.TABLE, self.TABLE ) )
+
+            # 3) em lotes
+            insert = "INSERT INTO %s ( %s ) VALUES ( %s )" % ( self.TABLE, ', '.join( columns ), ', '.join( '?' * len( columns ) ) )
+            db.executemany( insert, first )
+            count += len( first )
+
+            while True:
+                batch = list( islice( rows, self.BATCH_SIZE ) )
+                if not batch:
+                    break
+                db.executemany( insert, batch )
+                count += len( batch )
+
+            db.commit()
+        finally:
+            db.close()
+
+        return count
+
+
+class ParquetPairWriter( PairWriter ):
+    """Streams the pairs to a Parquet file, one row group per batch """
+
+    def write( self, pairMgr ):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise Exception( "The Parquet format requires the pyarrow package.", "InvalidParameterValue" )
+
+        rows = self.rows( pairMgr )
+
+        # tipo das colunas de id pelo primeiro par
+        batch = list( islice( rows, self.BATCH_SIZE ) )
+        idType = pa.int64() if not batch or isinstance( batch[0][0], int ) else pa.string()
+
+        types = [ idType, idType, pa.int64() ] + [ pa.float64() ] * ( len( self.columns( pairMgr ) ) - 3 )
+        schema = pa.schema( list( zip( self.columns( pairMgr ), types ) ) )
+
+        count = 0
+
+        with pq.ParquetWriter( self.path, schema ) as writer:
+            while batch:
+                columns = list( zip( *batch ) )
+                table = pa.Table.from_arrays( [ pa.array( columns[k], type = schema.field( k ).type ) for k in range( len( schema ) ) ],
+                                              schema = schema )
+                writer.write_table( table )
+                count += len( batch )
+
+                batch = list( islice( rows, self.BATCH_SIZE ) )
+
+        return count
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+import math
+import numpy as np
+from .match_pair_manager import MatchPairManager
+from .grid_index import GridIndex
+from .candidate_set import CandidateSet
+from .point_set import PointSet
+from .distance_engine import BlockDistanceEngine
+from .tiled_executor import TiledExecutor
+from .mutual_nearest import MutualNearestJoin
+from ..measure.context_measure import ContextMeasure
+from ..feedback import Feedback
+
+class PointMatcher( object ):
+    """
+    This class runs the matching between two point sets, with no QGIS types (see PointMatchingAlgorithm).
+
+    Similarity distances:
+    - Euclidean distance
+    - Shape context (Belongie et al.)
+    - Landmark context (Samal et al.)
+    
+    Criteria:
+    - Closer criteria: m:n matching case
+    - Both nearest: 1:1 matching case 
+    """
+
+    # methods, by number: similarity measure + case of correspondence
+    METHODS = [ "Euclidean - closer", "Euclidean - both nearest", "Context - closer", "Context - both nearest",
+                "Landmark context - closer", "Landmark context - both nearest" ]
+
+    def run( self, refPoints, testPoints, method, threshold, engine = 0, blockSize = 1024, workers = 1, descriptors = 0,
+             cache = None, landmarks = None, landmarkCount = 16, rotation = False, feedback = None ) -> MatchPairManager:
+        """
+        Matches the points with one of the METHODS.
+        
+        refPoints, testPoints : PointSet of the reference and test layers.
+        landmarks : PointSet of the landmarks of the landmark methods; if None, landmarkCount landmarks are sampled
+                    over the reference points (see ContextMeasure.selectLandmarks).
+        rotation : rotation-invariant context; it always uses dense descriptors.
+        feedback : optional, as a QgsProcessingFeedback (see Feedback).
+        
+        See runEuclideanDistance and runContextMeasure for the other parameters.
+        
+        Return: the MatchPairManager
+        """
+        if feedback is None:
+            feedback = Feedback()
+        
+        # Cache dos descritores - soh para os arrays, que a rotacao exige
+        if rotation:
+            descriptors = 1
+        
+        if descriptors != 1:
+            cache = None
+        
+        if method == 0 or method == 1:
+            return self.runEuclideanDistance( feedback, refPoints, testPoints, method, threshold, engine, blockSize, workers )
+        
+        if method == 2 or method == 3:
+            return self.runContextMeasure( feedback, refPoints, testPoints, method, threshold, workers, descriptors, cache,
+                                           rotation = rotation )
+        
+        if method == 4 or method == 5:
+            # landmarks: os dados, ou uma amostra estratificada do reference
+            if landmarks is not None:
+                landmarkX = landmarks.x[ landmarks.valid ]
+                landmarkY = landmarks.y[ landmarks.valid ]
+            else:
+                landmarkX, landmarkY = ContextMeasure().selectLandmarks( refPoints, landmarkCount )
+            
+            if len( landmarkX ) < 3:
+                raise Exception( "At least 3 landmarks are needed.", "InvalidParameterValue" )
+            
+            return self.runContextMeasure( feedback, refPoints, testPoints, method, threshold, workers,
+                                           landmarks = ( landmarkX, landmarkY ) )
+        
+        raise Exception( "Invalid match method.", "InvalidParameterValue" )
+    
+    def runEuclideanDistance( self, feedback, refPoints, testPoints, method, threshold, engine = 0, blockSize = 1024, workers = 1 ) -> MatchPairManager:
+        """
+        Processing the matching using Euclidean distance.
+        
+        refPoints, testPoints : PointSet of the reference and test layers.
+        engine : 0 for the grid index, 1 for the vectorized blocks (see BlockDistanceEngine).
+        blockSize : points per tile side of the vectorized engine.
+        workers : more than 1 splits the work in tiles over a process pool (see TiledExecutor).
+        
+        Return: the MatchPairManager
+        """
+      
+        # 2) test parameters
+        xmin, ymin, xmax, ymax = testPoints.extent()
+        maxDistance = max( xmax - xmin, ymax - ymin )
+        
+        if maxDistance < 2. * threshold:
+            raise Exception( "Test data with a small bounding box. It should be at least twice the threshold.", "InvalidParameterValue" )
+        
+        # 3) Both nearest: join dos vizinhos mais proximos reciprocos, sem matriz
+        if method % 2 == 1:
+            return MutualNearestJoin( threshold ).run( refPoints, testPoints )
+        
+        # 3) Run the processing - soh os pares dentro do box de busca sao guardados
+        if workers > 1:
+            candidates = TiledExecutor( workers, threshold ).run( refPoints, testPoints, TiledExecutor.EUCLIDEAN, threshold,
+                                                                  feedback, blockSize = blockSize )
+        elif engine == 1:
+            candidates = BlockDistanceEngine( blockSize ).run( refPoints, testPoints, threshold, feedback )
+        else:
+            candidates = self.searchCandidates( feedback, refPoints, testPoints, threshold, maxDistance )
+    
+        # debug
+        
+        # 4) OK, tenho tudo, faltam os pares
+        pairMgr = MatchPairManager()
+        
+        # check o criteria 
+        criteria = pairMgr.CriteriaType.ISMINIMUM if method % 2 == 0 else pairMgr.CriteriaType.BOTHMIN
+        
+        pairMgr.buildFromCandidates( candidates, criteria, threshold )
+        
+        return pairMgr
+        
+    def searchCandidates( self, feedback, refPoints, testPoints, threshold, maxDistance ) -> CandidateSet:
+        """
+        Euclidean distances of the pairs inside the search box, using a grid index over the test points.
+        
+        Return: the CandidateSet
+        """
+        
+        ncols = len( refPoints )
+        nrows = len( testPoints )
+        
+        candidates = CandidateSet( refPoints.ids.tolist(), testPoints.ids.tolist() )
+
+        # 3.1) Monta o indice espacial do test - celula do tamanho do threshold
+        cellSize = threshold if threshold > 0. else maxDistance / math.sqrt( nrows )
+        testIndex = GridIndex( testPoints.x, testPoints.y, cellSize if cellSize > 0. else 1., testPoints.valid )
+        
+        refX,  refY  = refPoints.x.tolist(),  refPoints.y.tolist()
+        testX, testY = testPoints.x.tolist(), testPoints.y.tolist()
+
+        # 3.2) Compute the number of steps to display within the progress bar
+        total = 100.0 / ncols
+        
+        # 3.3) Itera sobre os ref e procura o equivalente em test - soh os candidatos do indice
+        for j in refPoints.validPositions().tolist():
+            # running chks
+            if feedback.isCanceled():
+                break
+            
+            for i in testIndex.queryRadius( refX[j], refY[j], threshold ).tolist():
+                # agora sim, o que a gente veio fazer aqui: distance
+                dx, dy = testX[i] - refX[j], testY[i] - refY[j]
+                candidates.add( j, i, math.sqrt( dx*dx + dy*dy ) )
+        
+            feedback.setProgress( int(j * total) )
+        
+        return candidates
+        
+    
+    
+    def runContextMeasure( self, feedback, refPoints, testPoints, method, threshold, workers = 1, descriptors = 0, cache = None,
+                           landmarks = None, rotation = False ) -> MatchPairManager:
+        """
+        Processing the matching using Context measure.
+        
+        refPoints, testPoints : PointSet of the reference and test layers.
+        workers : more than 1 splits the work in tiles over a process pool (see TiledExecutor), and builds the dense
+                  descriptors of both layers in the pool (see ContextMeasure.calculateShapeContextArrays).
+        descriptors : 0 for histogram dictionaries, 1 for dense arrays (see ContextMeasure.calculateShapeContextArray).
+        cache : optional DescriptorCache of the dense arrays.
+        landmarks : optional (x, y) arrays of landmarks; if given, the descriptors are landmark contexts (see ContextMeasure.calculateLandmarkContext).
+        rotation : compares dense shape contexts under their best rotation (see ContextMeasure.distanceContextRotationBatch).
+        
+        Return: the MatchPairManager
+        """
+        
+        # 1) Initial calculus
+        # 1.1) Descobrir quem eh menor, que serve de param 
+        # SearchLength = Diagonal / PointCount * 20  -> distance for 20 points in Diagonal
+        xminA, yminA, xmaxA, ymaxA = refPoints.extent()
+        xminB, yminB, xmaxB, ymaxB = testPoints.extent()
+        
+        searchLengthA = math.sqrt( (xmaxA-xminA)**2 + (ymaxA-yminA)**2 ) / len( refPoints ) * 20.
+        searchLengthB = math.sqrt( (xmaxB-xminB)**2 + (ymaxB-yminB)**2 ) / len( testPoints ) * 20.
+        
+        # parameters for context
+        cttSearchLength = searchLengthA if searchLengthA > searchLengthB else searchLengthB
+        cttDistanceStep = cttSearchLength / 20.
+        cttAngleStep = math.pi/6.
+        
+        # 2) Calculate the context
+        context = ContextMeasure()
+        
+        if landmarks is not None:
+            shapeContextA, refHasHist = context.calculateLandmarkContext( refPoints, *landmarks )
+            feedback.setProgress( 10 )
+            
+            shapeContextB, testHasHist = context.calculateLandmarkContext( testPoints, *landmarks )
+            feedback.setProgress( 20 )
+        elif descriptors == 1 and workers > 1:
+            # os dois layers juntos, no pool
+            ( shapeContextA, refHasHist ), ( shapeContextB, testHasHist ) = context.calculateShapeContextArrays(
+                [ refPoints, testPoints ], cttSearchLength, cttAngleStep, cttDistanceStep, cache = cache, workers = workers, feedback = feedback )
+        elif descriptors == 1:
+            shapeContextA, refHasHist = context.calculateShapeContextArray( refPoints, cttSearchLength, cttAngleStep, cttDistanceStep, cache = cache )
+            feedback.setProgress( 10 )
+            
+            shapeContextB, testHasHist = context.calculateShapeContextArray( testPoints, cttSearchLength, cttAngleStep, cttDistanceStep, cache = cache )
+            feedback.setProgress( 20 )
+        else:
+            shapeContextA = context.calculateShapeContext( refPoints, cttSearchLength, cttAngleStep, cttDistanceStep )
+            feedback.setProgress( 10 )
+            
+            shapeContextB = context.calculateShapeContext( testPoints, cttSearchLength, cttAngleStep, cttDistanceStep )
+            feedback.setProgress( 20 )
+            
+            # soh os que tem contexto
+            refHasHist  = np.array( [ fid in shapeContextA for fid in refPoints.ids.tolist() ],  dtype = bool )
+            testHasHist = np.array( [ fid in shapeContextB for fid in testPoints.ids.tolist() ], dtype = bool )
+
+        # 3) Run the processing - soh os pares dentro do box de busca sao guardados
+        # arrays: prefiltro pelos aneis/setores, do shape context ou do contexto dos landmarks
+        if landmarks is not None:
+            poolWidth = context.landmarkLayout( *landmarks )[0]
+        else:
+            poolWidth = context.binLayout( cttSearchLength, cttAngleStep, cttDistanceStep )[0]
+        
+        # a distancia invariante gira os setores - nada a fazer nos landmarks
+        angleSlices = poolWidth if rotation and landmarks is None and descriptors == 1 else None
+        
+        if workers > 1:
+            candidates = TiledExecutor( workers, cttSearchLength ).run( refPoints, testPoints, TiledExecutor.CONTEXT, threshold, feedback,
+                                                                        refHasHist, testHasHist, shapeContextA, shapeContextB,
+                                                                        poolWidth = poolWidth, angleSlices = angleSlices )
+        else:
+            candidates = self.searchContextCandidates( feedback, refPoints, testPoints, context, shapeContextA, shapeContextB,
+                                                       refHasHist, testHasHist, cttSearchLength, threshold, poolWidth, angleSlices )
+        
+        # debug
+
+        
+        # 4) OK, tenho tudo, faltam os pares
+        pairMgr = MatchPairManager()
+        
+        # check o criteria 
+        criteria = pairMgr.CriteriaType.ISMINIMUM if method % 2 == 0 else pairMgr.CriteriaType.BOTHMIN
+        
+        pairMgr.buildFromCandidates( candidates, criteria, threshold )
+        
+        return pairMgr
+        
+    def searchContextCandidates( self, feedback, refPoints, testPoints, context, shapeContextA, shapeContextB,
+                                 refHasHist, testHasHist, cttSearchLength, threshold = None, poolWidth = None, angleSlices = None ) -> CandidateSet:
+        """
+        Context distances of the pairs inside the search box, using a grid index over the test points.
+        
+        shapeContextA, shapeContextB : histograms by id (calculateShapeContext) or descriptor arrays by position (calculateShapeContextArray).
+        threshold, poolWidth : with descriptor arrays, the pairs which can not cost less than threshold are rejected by
+                               ContextMeasure.prefilterPairs over descriptors pooled by poolWidth, and are not stored.
+        angleSlices : with descriptor arrays, the costs are rotation-invariant over these sectors (the prefilter then only
+                      uses the rings, whose pooling does not change with a rotation).
+        
+        Return: the CandidateSet
+        """
+        
+        ncols = len( refPoints )
+        
+        candidates = CandidateSet( refPoints.ids.tolist(), testPoints.ids.tolist() )
+        refIds, testIds = candidates.refIds, candidates.testIds
+        
+        # dicts por id ou arrays por posicao
+        dense = isinstance( shapeContextA, np.ndarray )
+        
+        # 3.1) Indice espacial do test - soh os que tem contexto
+        testIndex = GridIndex( testPoints.x, testPoints.y,
+                               cttSearchLength if cttSearchLength > 0. else 1., testPoints.valid & testHasHist )
+
+        # 3.2) Compute the number of steps to display within the progress bar
+        total = 80.0 / ncols
+        
+        refPos = np.flatnonzero( refPoints.valid & refHasHist )
+        
+        # 3.3) Arrays: os pares de um lote de refs, com o custo de todos numa chamada
+        if dense:
+            prefilter = threshold is not None and poolWidth is not None
+            if prefilter:
+                pooledA = context.poolDescriptors( shapeContextA, poolWidth )
+                pooledB = context.poolDescriptors( shapeContextB, poolWidth )
+                
+                if angleSlices is not None:
+                    pooledA, pooledB = pooledA[:1], pooledB[:1]
+            
+            for start in range( 0, len( refPos ), context.BATCH_SIZE ):
+                # running chks
+                if feedback.isCanceled():
+                    break
+                
+                batch = refPos[ start:start + context.BATCH_SIZE ]
+                bx, by = refPoints.x[ batch ], refPoints.y[ batch ]
+                
+                owner, i = testIndex.queryPairs( bx-cttSearchLength, by-cttSearchLength, bx+cttSearchLength, by+cttSearchLength )
+                j = batch[ owner ]
+                
+                # soh os que podem ficar abaixo do threshold
+                if prefilter:
+                    keep = context.prefilterPairs( pooledA, pooledB, j, i, threshold )
+                    j, i = j[ keep ], i[ keep ]
+                
+                candidates.extend( j, i, context.distanceContextPairs( shapeContextA, shapeContextB, j, i, angleSlices ) )
+                
+                feedback.setProgress( 20 + int( batch[-1] * total ) )
+            
+            return candidates
+        
+        # 3.4) Dicts: itera sobre os ref e procura o equivalente em test
+        for j in refPos.tolist():
+            # running chks
+            if feedback.isCanceled():
+                break
+            
+            refHist = shapeContextA[ refIds[j] ]
+            
+            # busca baseada no cttSearchLength
+            for i in testIndex.queryRadius( refPoints.x[j], refPoints.y[j], cttSearchLength ).tolist():
+                # agora sim, o que a gente veio fazer aqui: distance
+                testHist = shapeContextB[ testIds[i] ]
+                candidates.add( j, i, context.distanceContext( refHist, testHist ) )
+        
+            feedback.setProgress( 20 + int(j * total) )
+        # fim for_feat
+        
+        return candidates
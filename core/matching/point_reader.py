@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+import os
+import csv
+import math
+import struct
+import sqlite3
+import numpy as np
+from array import array
+from abc import ABC, abstractmethod
+from .point_set import PointSet
+
+class PointReader( ABC ):
+    """
+    This class reads a point file into a PointSet, with no QGIS (see PointSet.fromLayer).
+
+    Formats, by the extension of the path:
+    - .gpkg : GeoPackage; the first feature table, or the one of "path|layername=name"
+    - .shp  : Shapefile; the ids are the record numbers from 0, as in QGIS
+    - .csv  : CSV with the x and y columns (or lon/lat, longitude/latitude, or a WKT column); the
+              ids come from an id or fid column, or are the row numbers from 1, as in QGIS
+
+    As in fromLayer, MultiPoints are taken as a single point (the first) and empty geometries get NaN.
+    """
+
+    def __init__( self, path, layerName = None ):
+        """Constructor"""
+        self.path = path
+        self.layerName = layerName
+
+    @staticmethod
+    def create( source ):
+        """Returns the reader of the file, by its extension; the source may carry a "|layername=" """
+        path, _, options = source.partition( '|' )
+        layerName = options.split( '=', 1 )[1] if options.startswith( 'layername=' ) else None
+
+        readers = { '.gpkg' : GeoPackagePointReader,
+                    '.shp'  : ShapefilePointReader,
+                    '.csv'  : CsvPointReader }
+
+        extension = os.path.splitext( path )[1].lower()
+        if extension not in readers:
+            raise Exception( "Invalid input format: {}.".format( source ), "InvalidParameterValue" )
+
+        return readers[ extension ]( path, layerName )
+
+    @staticmethod
+    def read( source ):
+        """Reads the file into a PointSet (see create) """
+        return PointReader.create( source ).points()
+
+    @abstractmethod
+    def points( self ):
+        """
+        Reads the points.
+
+        Return: the PointSet
+        """
+
+    def pointSet( self, ids, xs, ys ):
+        return PointSet( np.frombuffer( ids, dtype = np.int64 ),
+                         np.frombuffer( xs,  dtype = np.float64 ),
+                         np.frombuffer( ys,  dtype = np.float64 ),
+                         source = self.path )
+
+
+class GeoPackagePointReader( PointReader ):
+    """Reads the geometry blobs of a GeoPackage table (header + WKB) """
+
+    # bytes of the envelope, by the indicator of the flags
+    ENVELOPE_SIZE = { 0 : 0, 1 : 32, 2 : 48, 3 : 48, 4 : 64 }
+
+    def points( self ):
+        ids = array( 'q' )
+        xs  = array( 'd' )
+        ys  = array( 'd' )
+
+        db = sqlite3.connect( 'file:{}?mode=ro'.format( self.path ), uri = True )
+        try:
+            # 1) a tabela e a coluna da geometria
+            query = "SELECT c.table_name, g.column_name FROM gpkg_contents c JOIN gpkg_geometry_columns g " \
+                    "ON c.table_name = g.table_name WHERE c.data_type = 'features'"
+            tables = db.execute( query ).fetchall()
+            if self.layerName is not None:
+                tables = [ t for t in tables if t[0] == self.layerName ]
+            if not tables:
+                raise Exception( "No feature table in {}.".format( self.path ), "InvalidParameterValue" )
+
+            table, column = tables[0]
+            key = [ c[1] for c in db.execute( 'PRAGMA table_info("{}")'.format( table ) ) if c[5] ]
+            key = key[0] if key else 'rowid'
+
+            # 2) os pontos, na ordem da chave (a de leitura do QGIS)
+            for fid, blob in db.execute( 'SELECT "{0}", "{1}" FROM "{2}" ORDER BY "{0}"'.format( key, column, table ) ):
+                x, y = self.decode( blob )
+                ids.append( fid )
+                xs.append( x )
+                ys.append( y )
+        finally:
+            db.close()
+
+        return self.pointSet( ids, xs, ys )
+
+    def decode( self, blob ):
+        """First point (x, y) of a GeoPackage geometry blob; NaN for empty or NULL geometries """
+        if blob is None or len( blob ) < 8 or blob[ 0:2 ] != b'GP':
+            return math.nan, math.nan
+
+        flags = blob[3]
+
+        # Chks habituais: vazia
+        if flags & 0x10:
+            return math.nan, math.nan
+
+        offset = 8 + self.ENVELOPE_SIZE.get( ( flags >> 1 ) & 0x07, 0 )
+        return wkbFirstPoint( blob, offset )
+
+
+class ShapefilePointReader( PointReader ):
+    """Reads the records of a point or multipoint .shp (the .dbf is not needed) """
+
+    # shape types
+    NULL = 0
+    POINT_TYPES = ( 1, 11, 21 )
+    MULTIPOINT_TYPES = ( 8, 18, 28 )
+
+    def points( self ):
+        with open( self.path, 'rb' ) as shp:
+            data = shp.read()
+
+        if len( data ) < 100 or struct.unpack_from( '>i', data, 0 )[0] != 9994:
+            raise Exception( "Invalid shapefile: {}.".format( self.path ), "InvalidParameterValue" )
+
+        shapeType = struct.unpack_from( '<i', data, 32 )[0]
+        if shapeType not in self.POINT_TYPES and shapeType not in self.MULTIPOINT_TYPES:
+            raise Exception( "Not a point shapefile: {}.".format( self.path ), "InvalidParameterValue" )
+
+        # 1) caminho rapido: so pontos 2D, registros de tamanho fixo
+        if shapeType == 1 and ( len( data ) - 100 ) % 28 == 0:
+            records = np.frombuffer( data, dtype = [ ( 'number', '>i4' ), ( 'length', '>i4' ), ( 'type', '<i4' ),
+                                                     ( 'x', '<f8' ), ( 'y', '<f8' ) ], offset = 100 )
+            if ( records[ 'length' ] == 10 ).all() and ( records[ 'type' ] == 1 ).all():
+                return PointSet( np.arange( len( records ), dtype = np.int64 ), records[ 'x' ], records[ 'y' ],
+                                 source = self.path )
+
+        # 2) registro a registro
+        ids = array( 'q' )
+        xs  = array( 'd' )
+        ys  = array( 'd' )
+
+        offset = 100
+        while offset + 12 <= len( data ):
+            length = struct.unpack_from( '>i', data, offset + 4 )[0] * 2
+            recordType = struct.unpack_from( '<i', data, offset + 8 )[0]
+            x, y = math.nan, math.nan
+
+            if recordType in self.POINT_TYPES:
+                x, y = struct.unpack_from( '<2d', data, offset + 12 )
+            elif recordType in self.MULTIPOINT_TYPES and struct.unpack_from( '<i', data, offset + 44 )[0] > 0:
+                x, y = struct.unpack_from( '<2d', data, offset + 48 )
+
+            ids.append( len( ids ) )
+            xs.append( x )
+            ys.append( y )
+            offset += 8 + length
+
+        return self.pointSet( ids, xs, ys )
+
+
+class CsvPointReader( PointReader ):
+    """Reads the coordinates (or the WKT) of the rows of a CSV file """
+
+    # column names, in the order of preference
+    X_COLUMNS   = [ 'x', 'lon', 'longitude' ]
+    Y_COLUMNS   = [ 'y', 'lat', 'latitude' ]
+    WKT_COLUMNS = [ 'wkt', 'geometry', 'geom' ]
+    ID_COLUMNS  = [ 'id', 'fid' ]
+
+    def points( self ):
+        ids = array( 'q' )
+        xs  = array( 'd' )
+        ys  = array( 'd' )
+
+        with open( self.path, newline = '' ) as source:
+            sample = source.read( 65536 )
+            source.seek( 0 )
+            try:
+                dialect = csv.Sniffer().sniff( sample, delimiters = ',;\t|' )
+            except csv.Error:
+                dialect = csv.excel
+
+            reader = csv.reader( source, dialect )
+            header = [ name.strip().lower() for name in next( reader, [] ) ]
+
+            # 1) as colunas
+            xColumn   = self.column( header, self.X_COLUMNS )
+            yColumn   = self.column( header, self.Y_COLUMNS )
+            wktColumn = self.column( header, self.WKT_COLUMNS )
+            idColumn  = self.column( header, self.ID_COLUMNS )
+
+            if ( xColumn is None or yColumn is None ) and wktColumn is None:
+                raise Exception( "No x/y or WKT columns in {}.".format( self.path ), "InvalidParameterValue" )
+
+            # 2) as linhas
+            for row, values in enumerate( reader, 1 ):
+                if not values:
+                    continue
+
+                ids.append( int( values[ idColumn ] ) if idColumn is not None else row )
+
+                if xColumn is not None and yColumn is not None:
+                    x, y = self.number( values[ xColumn ] ), self.number( values[ yColumn ] )
+                else:
+                    x, y = self.wktFirstPoint( values[ wktColumn ] )
+
+                xs.append( x )
+                ys.append( y )
+
+        return self.pointSet( ids, xs, ys )
+
+    @staticmethod
+    def column( header, names ):
+        for name in names:
+            if name in header:
+                return header.index( name )
+        return None
+
+    @staticmethod
+    def number( value ):
+        value = value.strip()
+        return float( value ) if value else math.nan
+
+    @staticmethod
+    def wktFirstPoint( wkt ):
+        """First point of a POINT or MULTIPOINT WKT; NaN if empty """
+        start = wkt.find( '(' )
+        if start < 0:
+            return math.nan, math.nan
+
+        coords = wkt[ start: ].replace( '(', ' ' ).replace( ')', ' ' ).replace( ',', ' ' ).split()
+        if len( coords ) < 2:
+            return math.nan, math.nan
+
+        return float( coords[0] ), float( coords[1] )
+
+
+def wkbFirstPoint( blob, offset = 0 ):
+    """
+    First point (x, y) of a Point or MultiPoint WKB (ISO or extended Z/M); NaN for the
+    empty geometries and the other types.
+    """
+    order = '<' if blob[ offset ] == 1 else '>'
+    geomType = struct.unpack_from( order + 'I', blob, offset + 1 )[0]
+
+    # tipos EWKB (flags nos bits altos, SRID opcional) e ISO (Z = 1000, M = 2000, ZM = 3000)
+    baseType = ( geomType & 0x0FFFFFFF ) % 1000
+    start = offset + ( 9 if geomType & 0x20000000 else 5 )
+
+    if baseType == 1:
+        return struct.unpack_from( order + '2d', blob, start )
+
+    if baseType == 4:
+        count = struct.unpack_from( order + 'I', blob, start )[0]
+        if count > 0:
+            return wkbFirstPoint( blob, start + 4 )
+
+    return math.nan, math.nan
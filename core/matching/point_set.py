@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+from array import array
+import numpy as np
+
+class PointSet( object ):
+    """
+    This class handles the coordinates of a point dataset as contiguous arrays.
+
+    A layer is read exactly once and the algorithms work on the arrays:
+    - ids   : feature ids (int64)
+    - x, y  : coordinates (float64), NaN for empty geometries
+    - valid : False for empty geometries
+    - source : source of the layer read, if any (see DescriptorCache)
+
+    Position k in the arrays is the k-th feature returned by the layer.
+    """
+
+    def __init__( self, ids, x, y, valid = None, source = None ):
+        """Constructor"""
+        self.ids = np.asarray( ids, dtype = np.int64 )
+        self.x   = np.asarray( x,   dtype = np.float64 )
+        self.y   = np.asarray( y,   dtype = np.float64 )
+        self.valid = np.asarray( valid, dtype = bool ) if valid is not None else ~( np.isnan( self.x ) | np.isnan( self.y ) )
+        self.source = source
+
+    def __len__( self ):
+        return len( self.ids )
+
+    @staticmethod
+    def fromLayer( pointLayer ):
+        """
+        Reads a point layer into a PointSet.
+
+        NOTE: MultiPoints will be treated as a single point (the first).
+        """
+
+        ids = array( 'q' )
+        xs  = array( 'd' )
+        ys  = array( 'd' )
+
+        for feat in pointLayer.getFeatures():
+            ids.append( feat.id() )
+
+            geom = feat.geometry()
+
+            # Chks habituais
+            if geom.isEmpty():
+                xs.append( float('nan') )
+                ys.append( float('nan') )
+                continue
+
+            # o primeiro vertice serve para Point e MultiPoint
+            point = geom.vertexAt( 0 )
+
+            xs.append( point.x() )
+            ys.append( point.y() )
+
+        return PointSet( np.frombuffer( ids, dtype = np.int64 ),
+                         np.frombuffer( xs,  dtype = np.float64 ),
+                         np.frombuffer( ys,  dtype = np.float64 ),
+                         source = pointLayer.source() )
+
+    def validPositions( self ):
+        """Returns the positions of the non-empty points """
+        return np.flatnonzero( self.valid )
+
+    def extent( self ):
+        """Returns the (xmin, ymin, xmax, ymax) of the non-empty points """
+        if not self.valid.any():
+            return ( 0., 0., 0., 0. )
+
+        x, y = self.x[ self.valid ], self.y[ self.valid ]
+        return ( float( x.min() ), float( y.min() ), float( x.max() ), float( y.max() ) )
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+import numpy as np
+from .match_pair_manager import MatchPairManager
+from .candidate_set import CandidateSet
+from .box_tree import BoxTree
+from ..measure.polygon_measure import PolygonMeasure
+from ..feedback import Feedback
+
+class PolygonMatcher( object ):
+    """
+    This class runs the matching between two polygon sets, with no QGIS types (see PolygonMatchingAlgorithm).
+
+    The exact measure depends on the geometries of the PolygonSet, so it is given by the caller:
+    iouDistance( polygonsA, polygonsB, positionsA, positionsB ) returns the 1 - IoU of each pair,
+    as a float64 array (see PolygonMatchingAlgorithm.iouDistancePairs, with the QGIS geometry engine).
+
+    Similarity distances:
+    - Intersection over union: the distance is 1 - IoU
+    
+    Criteria:
+    - Closer criteria: m:n matching case
+    - Both nearest: 1:1 matching case 
+    """
+
+    # methods, by number: similarity measure + case of correspondence
+    METHODS = [ "Intersection over union - closer", "Intersection over union - both nearest" ]
+    
+    # Reference polygons per batch of the candidate search
+    BATCH_SIZE = 4096
+
+    def __init__( self, iouDistance ):
+        self.iouDistance = iouDistance
+
+    def run( self, refPolygons, testPolygons, method, threshold, compactness = 0., feedback = None ) -> MatchPairManager:
+        """
+        Matches the polygons with one of the METHODS.
+        
+        refPolygons, testPolygons : PolygonSet of the reference and test layers.
+        compactness : maximum difference of compactness of the pairs (0 = no test).
+        feedback : optional, as a QgsProcessingFeedback (see Feedback).
+        
+        Return: the MatchPairManager
+        """
+        if feedback is None:
+            feedback = Feedback()
+        
+        if method == 0 or method == 1:
+            return self.runIntersectionOverUnion( feedback, refPolygons, testPolygons, method, threshold, compactness )
+        
+        raise Exception( "Invalid match method.", "InvalidParameterValue" )
+    
+    def runIntersectionOverUnion( self, feedback, refPolygons, testPolygons, method, threshold, compactness = 0. ) -> MatchPairManager:
+        """
+        Processing the matching using the intersection over union.
+        
+        refPolygons, testPolygons : PolygonSet of the reference and test layers.
+        
+        Return: the MatchPairManager
+        """
+        
+        candidates = self.searchCandidates( feedback, refPolygons, testPolygons, threshold, compactness )
+        
+        # OK, tenho tudo, faltam os pares
+        pairMgr = MatchPairManager()
+        
+        # check o criteria 
+        criteria = pairMgr.CriteriaType.ISMINIMUM if method % 2 == 0 else pairMgr.CriteriaType.BOTHMIN
+        
+        pairMgr.buildFromCandidates( candidates, criteria, threshold )
+        
+        return pairMgr
+        
+    def searchCandidates( self, feedback, refPolygons, testPolygons, threshold, compactness = 0. ) -> CandidateSet:
+        """
+        Distances of the pairs of polygons under the threshold: an R-tree of the test bounding boxes gives the
+        pairs that intersect, the IoU bounds of PolygonMeasure.prefilterPairs discard the ones that can not be
+        under the threshold, and the rest gets the exact measure.
+        
+        Return: the CandidateSet
+        """
+        
+        candidates = CandidateSet( refPolygons.ids.tolist(), testPolygons.ids.tolist() )
+        measure = PolygonMeasure()
+        
+        # 1) Indice dos poligonos de test
+        tree = BoxTree( testPolygons.xmin, testPolygons.ymin, testPolygons.xmax, testPolygons.ymax, testPolygons.valid )
+        
+        refPos = refPolygons.validPositions()
+        
+        # 2) Em lotes de poligonos de ref
+        for start in range( 0, len( refPos ), self.BATCH_SIZE ):
+            # running chks
+            if feedback.isCanceled():
+                break
+            
+            batch = refPos[ start:start + self.BATCH_SIZE ]
+            
+            owner, i = tree.queryPairs( refPolygons.xmin[ batch ], refPolygons.ymin[ batch ],
+                                        refPolygons.xmax[ batch ], refPolygons.ymax[ batch ] )
+            j = batch[ owner ]
+            
+            # 2.1) as cotas do IoU
+            keep = measure.prefilterPairs( refPolygons, testPolygons, j, i, 1. - threshold, compactness )
+            j, i = j[ keep ], i[ keep ]
+            
+            # 2.2) agora sim, o IoU - os pares vem agrupados por poligono de ref
+            values = self.iouDistance( refPolygons, testPolygons, j, i )
+            keep = values < threshold
+            
+            candidates.extend( j[ keep ], i[ keep ], values[ keep ] )
+            
+            feedback.setProgress( int( 100. * ( start + len( batch ) ) / len( refPos ) ) )
+        
+        return candidates
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+from array import array
+import math
+import numpy as np
+
+class PolygonSet( object ):
+    """
+    This class handles a polygon dataset: its geometries and, as contiguous arrays, the cheap
+    features used to prefilter the pairs before any exact measure.
+
+    A layer is read exactly once:
+    - ids        : feature ids (int64)
+    - geometries : the QgsGeometry of each feature, for the exact measures
+    - xmin, ymin, xmax, ymax : bounding box (float64), NaN for empty geometries
+    - cx, cy     : centroid (float64)
+    - area, perimeter : (float64)
+    - valid      : False for empty geometries and polygons without area
+
+    Position k in the arrays is the k-th feature returned by the layer.
+    """
+
+    def __init__( self, ids, geometries, xmin, ymin, xmax, ymax, cx, cy, area, perimeter, source = None ):
+        """Constructor"""
+        self.ids = np.asarray( ids, dtype = np.int64 )
+        self.geometries = geometries
+        self.xmin, self.ymin, self.xmax, self.ymax = [ np.asarray( values, dtype = np.float64 ) for values in ( xmin, ymin, xmax, ymax ) ]
+        self.cx = np.asarray( cx, dtype = np.float64 )
+        self.cy = np.asarray( cy, dtype = np.float64 )
+        self.area = np.asarray( area, dtype = np.float64 )
+        self.perimeter = np.asarray( perimeter, dtype = np.float64 )
+        self.valid = self.area > 0
+        self.source = source
+
+    def __len__( self ):
+        return len( self.ids )
+
+    def validPositions( self ):
+        """Returns the positions of the polygons with area """
+        return np.flatnonzero( self.valid )
+
+    def compactness( self ):
+        """Returns the compactness 4*pi*area/perimeter^2 of each polygon (1 for a circle) """
+        return 4. * math.pi * self.area / np.where( self.perimeter > 0, self.perimeter**2, np.inf )
+
+    @staticmethod
+    def fromLayer( polygonLayer ):
+        """
+        Reads a polygon layer into a PolygonSet.
+
+        NOTE: the parts of a MultiPolygon are taken together, as one polygon.
+        """
+        nan = float( 'nan' )
+
+        ids = array( 'q' )
+        geometries = []
+        values = [ array( 'd' ) for k in range( 8 ) ] # xmin, ymin, xmax, ymax, cx, cy, area, perimeter
+
+        for feat in polygonLayer.getFeatures():
+            ids.append( feat.id() )
+
+            geom = feat.geometry()
+            geometries.append( geom )
+
+            # Chks habituais
+            if geom.isEmpty():
+                row = ( nan, nan, nan, nan, nan, nan, 0., 0. )
+            else:
+                box = geom.boundingBox()
+                centroid = geom.centroid().asPoint()
+                row = ( box.xMinimum(), box.yMinimum(), box.xMaximum(), box.yMaximum(),
+                        centroid.x(), centroid.y(), geom.area(), geom.length() )
+
+            for column, value in zip( values, row ):
+                column.append( value )
+
+        values = [ np.frombuffer( column, dtype = np.float64 ) for column in values ]
+
+        return PolygonSet( np.frombuffer( ids, dtype = np.int64 ), geometries, *values, source = polygonLayer.source() )
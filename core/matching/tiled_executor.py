@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+import os
+import sys
+import math
+import threading
+import multiprocessing
+import multiprocessing.spawn
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from .candidate_set import CandidateSet
+from .grid_index import GridIndex
+from .point_set import PointSet
+from .distance_engine import BlockDistanceEngine
+from ..measure.context_measure import ContextMeasure
+
+class TiledExecutor( object ):
+    """
+    This class runs the candidate search of the point matching over tiles, in a process pool.
+
+    The reference points are split into tiles holding about the same number of points (strips on x,
+    then cells on y inside each strip). Each reference point belongs to exactly one tile, and each tile
+    receives the test points inside the box of its reference points grown by the halo (the search
+    distance). So every candidate pair is found by exactly one tile, and the merged CandidateSet is the
+    one a serial run would build: the pairs built from it are identical.
+    """
+
+    EUCLIDEAN = 0
+    CONTEXT = 1
+
+    # Tiles per worker, to balance the load between the processes
+    TILES_PER_WORKER = 4
+
+    def __init__( self, workers, halo ):
+        """
+        Constructor
+
+        @param workers: Number of worker processes. 1 runs the tiles in this process.
+        @param halo: Width of the border shared with the neighbour tiles, the search distance (threshold or context search length).
+        """
+        self.workers = max( int( workers ), 1 )
+        self.halo = float( halo )
+
+    def splitTiles( self, x, y, ntiles ):
+        """
+        Splits the points into about ntiles tiles with the same number of points.
+
+        Return: array with the tile of each point.
+        """
+        nstrips = max( int( math.ceil( math.sqrt( ntiles ) ) ), 1 )
+        ncells  = max( int( math.ceil( ntiles / nstrips ) ), 1 )
+
+        # 1) faixas em x, pelos quantis
+        xbounds = np.quantile( x, np.linspace( 0., 1., nstrips+1 )[1:-1] ) if len( x ) > 0 else np.zeros( 0 )
+        strip = np.searchsorted( xbounds, x, side = 'right' )
+
+        # 2) celulas em y dentro de cada faixa
+        tile = np.zeros( len( x ), dtype = np.int64 )
+
+        for s in range( nstrips ):
+            inStrip = np.flatnonzero( strip == s )
+            if len( inStrip ) == 0:
+                continue
+
+            ybounds = np.quantile( y[ inStrip ], np.linspace( 0., 1., ncells+1 )[1:-1] )
+            tile[ inStrip ] = s * ncells + np.searchsorted( ybounds, y[ inStrip ], side = 'right' )
+
+        return tile
+
+    def run( self, refPoints, testPoints, mode, threshold, feedback = None,
+             refMask = None, testMask = None, refHists = None, testHists = None, blockSize = 1024, poolWidth = None,
+             angleSlices = None ) -> CandidateSet:
+        """
+        Builds the candidate set tile by tile.
+
+        refPoints, testPoints : PointSet of the reference and test layers.
+        mode : EUCLIDEAN or CONTEXT.
+        threshold : distance threshold, for the EUCLIDEAN mode.
+        feedback : optional QgsProcessingFeedback, for progress and cancel.
+        refMask, testMask : optional masks of the points to consider (besides the empty ones).
+        refHists, testHists : shape contexts, for the CONTEXT mode: dicts (id -> histogram) or descriptor arrays (one row per position).
+        blockSize : block size of the BlockDistanceEngine used by the EUCLIDEAN mode.
+        poolWidth : with descriptor arrays in the CONTEXT mode, prefilters the pairs against the threshold
+                    (see ContextMeasure.prefilterPairs).
+        angleSlices : with descriptor arrays in the CONTEXT mode, rotation-invariant costs over these sectors
+                      (see ContextMeasure.distanceContextRotationBatch).
+
+        Return: the merged CandidateSet (positions of refPoints x positions of testPoints).
+        """
+
+        candidates = CandidateSet( refPoints.ids.tolist(), testPoints.ids.tolist() )
+
+        refValid  = refPoints.valid  if refMask  is None else refPoints.valid  & refMask
+        testValid = testPoints.valid if testMask is None else testPoints.valid & testMask
+
+        refPos = np.flatnonzero( refValid )
+        if len( refPos ) == 0 or not testValid.any():
+            return candidates
+
+        # 1) Tiles
+        tileOf = self.splitTiles( refPoints.x[ refPos ], refPoints.y[ refPos ], self.workers * self.TILES_PER_WORKER )
+        order = np.argsort( tileOf, kind = 'stable' )
+        bounds = np.flatnonzero( np.r_[ True, tileOf[ order ][1:] != tileOf[ order ][:-1], True ] )
+
+        testIndex = GridIndex( testPoints.x, testPoints.y, max( self.halo, 1e-12 ), testValid )
+
+        # 2) Uma tarefa por tile: seus refs + os tests dentro do box com halo
+        tasks = []
+
+        for start, end in zip( bounds[:-1].tolist(), bounds[1:].tolist() ):
+            tileRef = refPos[ order[ start:end ] ]
+            rx, ry = refPoints.x[ tileRef ], refPoints.y[ tileRef ]
+
+            tileTest = testIndex.query( rx.min() - self.halo, ry.min() - self.halo,
+                                        rx.max() + self.halo, ry.max() + self.halo )
+            if len( tileTest ) == 0:
+                continue
+
+            task = { 'mode' : mode, 'threshold' : threshold, 'halo' : self.halo, 'blockSize' : blockSize, 'poolWidth' : poolWidth, 'angleSlices' : angleSlices,
+                     'refPos' : tileRef, 'refX' : rx, 'refY' : ry,
+                     'testPos' : tileTest, 'testX' : testPoints.x[ tileTest ], 'testY' : testPoints.y[ tileTest ] }
+
+            if mode == self.CONTEXT and isinstance( refHists, np.ndarray ):
+                task[ 'refHists' ], task[ 'testHists' ] = refHists[ tileRef ], testHists[ tileTest ]
+            elif mode == self.CONTEXT:
+                task[ 'refHists' ]  = [ refHists[ fid ]  for fid in refPoints.ids[ tileRef ].tolist() ]
+                task[ 'testHists' ] = [ testHists[ fid ] for fid in testPoints.ids[ tileTest ].tolist() ]
+
+            tasks.append( task )
+
+        # 3) Executa - em processo, ou no pool
+        results = [ None ] * len( tasks )
+
+        if self.workers == 1 or len( tasks ) == 1:
+            for k, task in enumerate( tasks ):
+                if feedback is not None and feedback.isCanceled():
+                    break
+                results[ k ] = matchTile( task )
+                if feedback is not None:
+                    feedback.setProgress( int( 100. * ( k+1 ) / len( tasks ) ) )
+        else:
+            with ProcessPoolExecutor( max_workers = self.workers, mp_context = poolContext() ) as pool:
+                futures = [ pool.submit( matchTile, task ) for task in tasks ]
+
+                for k, future in enumerate( futures ):
+                    if feedback is not None and feedback.isCanceled():
+                        for f in futures:
+                            f.cancel()
+                        break
+                    results[ k ] = future.result()
+                    if feedback is not None:
+                        feedback.setProgress( int( 100. * ( k+1 ) / len( tasks ) ) )
+
+        # 4) Merge, na ordem dos tiles
+        for result in results:
+            if result is not None:
+                candidates.extend( *result )
+
+        return candidates
+
+
+def matchTile( task ):
+    """
+    Worker of TiledExecutor: candidate pairs of one tile.
+
+    Return: (reference positions, test positions, values) in the positions of the whole layers.
+    """
+    refPos, testPos = task[ 'refPos' ], task[ 'testPos' ]
+
+    # 1) Euclidean - o engine vetorizado sobre os pontos do tile
+    if task[ 'mode' ] == TiledExecutor.EUCLIDEAN:
+        refPoints  = PointSet( refPos,  task[ 'refX' ],  task[ 'refY' ] )
+        testPoints = PointSet( testPos, task[ 'testX' ], task[ 'testY' ] )
+
+        local = BlockDistanceEngine( task[ 'blockSize' ] ).run( refPoints, testPoints, task[ 'threshold' ] )
+
+        j = np.frombuffer( local.refIndex, dtype = np.int64 )
+        i = np.frombuffer( local.testIndex, dtype = np.int64 )
+        return refPos[ j ], testPos[ i ], np.frombuffer( local.values, dtype = np.float64 ).copy()
+
+    # 2) Context - distancia entre histogramas dos pares no box de busca
+    halo = task[ 'halo' ]
+    context = ContextMeasure()
+    refHists, testHists = task[ 'refHists' ], task[ 'testHists' ]
+
+    testIndex = GridIndex( task[ 'testX' ], task[ 'testY' ], max( halo, 1e-12 ) )
+
+    # arrays: todos os pares do tile numa chamada
+    if isinstance( refHists, np.ndarray ):
+        rx, ry = task[ 'refX' ], task[ 'refY' ]
+        j, i = testIndex.queryPairs( rx - halo, ry - halo, rx + halo, ry + halo )
+
+        if task[ 'poolWidth' ] is not None:
+            # com rotacao, soh os aneis
+            views = 1 if task[ 'angleSlices' ] is not None else 2
+            keep = context.prefilterPairs( context.poolDescriptors( refHists, task[ 'poolWidth' ] )[ :views ],
+                                           context.poolDescriptors( testHists, task[ 'poolWidth' ] )[ :views ], j, i, task[ 'threshold' ] )
+            j, i = j[ keep ], i[ keep ]
+        return refPos[ j ], testPos[ i ], context.distanceContextPairs( refHists, testHists, j, i, task[ 'angleSlices' ] )
+
+    pairs = []
+
+    for j, ( x, y ) in enumerate( zip( task[ 'refX' ].tolist(), task[ 'refY' ].tolist() ) ):
+        for i in testIndex.queryRadius( x, y, halo ).tolist():
+            pairs.append( ( j, i, context.distanceContext( refHists[j], testHists[i] ) ) )
+
+    j = np.array( [ p[0] for p in pairs ], dtype = np.int64 )
+    i = np.array( [ p[1] for p in pairs ], dtype = np.int64 )
+    return refPos[ j ], testPos[ i ], np.array( [ p[2] for p in pairs ], dtype = np.float64 )
+
+
+# Guards the swap of the spawn executable by PoolProcess, between threads
+SPAWN_LOCK = threading.Lock()
+
+
+def poolContext():
+    """
+    Multiprocessing context for the pool: a private spawn context, so the process-wide default of
+    multiprocessing is never touched.
+
+    Inside QGIS, sys.executable is the QGIS binary, not Python: the spawned workers must use the
+    interpreter shipped with it (see PoolContext).
+    """
+    name = 'python.exe' if sys.platform == 'win32' else 'python3'
+    python = os.path.join( sys.exec_prefix, name )
+
+    if not os.path.basename( sys.executable ).lower().startswith( 'python' ) and os.path.exists( python ):
+        return PoolContext( python )
+
+    return multiprocessing.get_context( 'spawn' )
+
+
+class PoolContext( multiprocessing.context.SpawnContext ):
+    """
+    Spawn context whose workers run another Python executable.
+
+    set_executable of multiprocessing is global (the spawn module keeps a single executable), so the
+    processes of this context swap it only while they start, and put the previous one back. QGIS runs
+    the algorithms in background threads: the swap holds SPAWN_LOCK, so concurrent runs start their
+    workers one at a time.
+    """
+
+    def __init__( self, executable ):
+        """Constructor"""
+        super().__init__()
+        self.executable = executable
+
+    def Process( self, *args, **kwargs ):
+        process = PoolProcess( *args, **kwargs )
+        process.executable = self.executable
+        return process
+
+
+class PoolProcess( multiprocessing.context.SpawnProcess ):
+    """Process of a PoolContext: started with the executable of the context """
+
+    @staticmethod
+    def _Popen( process ):
+        with SPAWN_LOCK:
+            previous = multiprocessing.spawn.get_executable()
+            multiprocessing.spawn.set_executable( process.executable )
+            try:
+                return multiprocessing.context.SpawnProcess._Popen( process )
+            finally:
+                multiprocessing.spawn.set_executable( previous )
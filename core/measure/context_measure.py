@@ -0,0 +1,783 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+from ..matching.point_set import PointSet
+from ..matching.grid_index import GridIndex
+from .descriptor_cache import DescriptorCache
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import math 
+
+class ContextMeasure( object ):
+    """
+    This class handles geographic context measures.
+    
+    For Samal et al. [2004], "geographic context refers to the spatial relationships between objects in an area",
+    mainly the relationships between an object and a limited set of landmarks. For more information see:
+    Samal, A., Seth, S., and Cueto, K., 2004. A feature-based approach to conflation of geospatial sources.
+    International Journal of Geographical Information Science, 18 (5), 459–489.
+    Available at: http://dx.doi.org/10.1080/13658810410001658076
+    
+    """
+    
+    # Number of points per batch of neighbourhood queries, to bound the memory of the candidate arrays
+    BATCH_SIZE = 65536
+    
+    # Tasks per worker of calculateShapeContextArrays, to balance the load between the processes
+    TASKS_PER_WORKER = 4
+    
+    # Relative and absolute slack of the lower bound of prefilterPairs, above the float32 rounding errors
+    PREFILTER_TOLERANCE = 1e-5
+    
+    # Log-polar bins of the landmark context: angular sectors, and rings of distance doubling up to the landmarks' diagonal
+    LANDMARK_SECTORS = 12
+    LANDMARK_RINGS = 5
+        
+    def __init__( self ):
+        """Constructor"""
+            
+    
+    def binLayout( self, searchLength, angleStep, distanceStep ):
+        """
+        Bins of the shape context: angleSlices sectors times the distance rings.
+        
+        The ring limits start at distanceStep and grow by angleStep of their value, up to searchLength.
+        
+        @returns (angleSlices, distStepMap, bins): the sectors, the ring limits (the last one is searchLength)
+                 and the number of bins of a dense descriptor (see calculateShapeContextArray).
+        """
+        angleSlices = int( round( 2.*math.pi / angleStep ) )
+        
+        # fill distance distance map
+        distStepMap = []
+        currDist = distanceStep
+            
+        while currDist < searchLength:
+            distStepMap.append( currDist )
+            
+            # atlz valores
+            currDist += currDist * angleStep
+            
+        # ultimo slice - para todos
+        distStepMap.append( searchLength )
+        
+        # o bin eh angleSlices * distQuad + angQuad, com angQuad em [1, 1 + floor(2pi/angleStep)]
+        bins = angleSlices * ( len( distStepMap ) - 1 ) + 1 + int( math.floor( 2.*math.pi / angleStep ) )
+        
+        return angleSlices, distStepMap, bins
+    
+    def calculateShapeContext( self,
+                              pointLayer,
+                              searchLength,
+                              angleStep,
+                              distanceStep,
+                              normalize = True ):
+        """
+        Calculate the shape context for a set of points using the Shape Context method developed by Belongie et al.
+        
+        For details see: Belongie, S., Malik, J., and Puzicha, J., 2002. Shape Matching and Object Recognition Using
+        Shape Contexts. IEEE Transactions on Pattern Analysis and Machine Intelligence, 24 (4), 509–522.
+        Available at: http://ieeexplore.ieee.org/document/993558/?arnumber=993558
+        
+        @param pointLayer: Input point layer, or its PointSet (see PointSet.fromLayer).
+        @param searchLength: Maximum search lenght to consider as a neighbourhood. 4 cm at data scale is a good value.
+        @param angleStep: The radial size of each bin. A value of pi/6 is a good choice. pi/6 is a good value.
+        @param distanceStep: The initial distance step for the bins. It will grow by its value plus radial size. 1 mm at data scale is a good value.
+        @param normalize: Normalizes the histogram count to [0, 1]. Defaults to yes.
+        @returns Histogram (bin, count) for the point set.
+        """
+        
+        # 1) initial vars - O contexto eh um histograma
+        # 1.1) Le o layer para pontos - uma unica vez, em arrays
+        points = pointLayer if isinstance( pointLayer, PointSet ) else PointSet.fromLayer( pointLayer )
+        
+        valid = points.validPositions()
+        ids = points.ids[ valid ].tolist()
+        xs  = points.x[ valid ].tolist()
+        ys  = points.y[ valid ].tolist()
+        
+        # o indice devolve posicoes no layer todo
+        allIds, allXs, allYs = points.ids.tolist(), points.x.tolist(), points.y.tolist()
+        
+        # 1.2) Abordagem radial
+        angleSlices, distStepMap, bins = self.binLayout( searchLength, angleStep, distanceStep )
+        
+        # 2) Varre todos os pontos - jah tenho os limites, preciso acertar qm faz o q
+        # saida eh um dict de histogramas
+        retval = dict()
+        
+        if len( valid ) == 0:
+            return retval
+        
+        # 2.1) Indice espacial - cada ponto soh visita as celulas vizinhas
+        index = GridIndex( points.x, points.y, searchLength if searchLength > 0. else 1., points.valid )
+        
+        for start in range( 0, len( valid ), self.BATCH_SIZE ):
+            batch = valid[ start:start + self.BATCH_SIZE ]
+            bx, by = points.x[ batch ], points.y[ batch ]
+            
+            # vizinhos no box de busca, na ordem do layer
+            owner, found = index.queryPairs( bx-searchLength, by-searchLength, bx+searchLength, by+searchLength )
+            order = np.lexsort( ( found, owner ) )
+            owner, found = owner[ order ], found[ order ]
+            bounds = np.searchsorted( owner, np.arange( len( batch )+1 ) ).tolist()
+            found = found.tolist()
+            
+            for k in range( len( batch ) ):
+                a = start + k
+                idA = ids[a]
+                xA, yA = xs[a], ys[a]
+                
+                neighCount = 0            
+                histog = dict() # resultado para esse ponto
+                
+                # checa sua relacao com os vizinhos
+                for b in found[ bounds[k]:bounds[k+1] ]:
+                    idB = allIds[b]
+                    
+                    # ignora o mesmo
+                    if idA == idB:
+                        continue
+
+                    xB, yB = allXs[b], allYs[b]
+                    
+                    # Ok, estah na area de busca, qual o valor do ang e distancia?
+                    distance = math.sqrt( (xB-xA)**2 + (yB-yA)**2 )
+                    
+                    # distance aqui eh radial - mudanca em relacao aos demais
+                    if distance > searchLength:
+                        continue
+                    
+                    angle = math.atan2( yB - yA, xB - xA )
+                    
+                    # angulo negativo, corrija
+                    if angle < 0. :
+                        angle += 2.*math.pi
+                        
+                    # 3) agora coloca no histograma
+                    # 3.1) angulo
+                    angQuad = 1. + math.floor( angle / angleStep );
+
+                    # 3.2) distancia - usando o map - um lower_bound resolveria...
+                    distQuad = 0
+                    
+                    for q, dist in enumerate( distStepMap ):
+                        if distance < dist:
+                            distQuad = q
+                            break
+                    
+                    # 3.3) colocando no histograma
+                    idx = int( angleSlices * distQuad + angQuad )
+                    if histog.get(idx) == None:
+                        histog[ idx ] = 1
+                    else:
+                        histog[ idx ] += 1
+                    
+                    neighCount += 1
+                
+                    # fim for points(search)
+                    
+                # seguindo o padrao anterior, soh considero os 3 vizinhos
+                if neighCount >= 3:
+                    retval[ idA ] = histog
+                
+            # fim for points(search)
+            
+        # 4) normalizar - uma vez, depois de todos os histogramas
+        if normalize:
+            for histog in retval.values():
+                sum = 0
+                
+                for val in histog.values():
+                    sum += val
+                    
+                # OK, agora divida - garantindo div0
+                if sum > 0:
+                    for key, val in histog.items():
+                        histog[key] = val/sum
+                        
+        
+        return retval
+        
+        
+    def calculateShapeContextArray( self,
+                                   pointLayer,
+                                   searchLength,
+                                   angleStep,
+                                   distanceStep,
+                                   normalize = True,
+                                   cache = None ):
+        """
+        Dense version of calculateShapeContext: the histograms of all points in one float32 array.
+        
+        Row k is the histogram of the k-th point of the PointSet and column b - 1 the count of bin b of
+        calculateShapeContext, so both versions hold the same histograms. The bins are found with a vectorized
+        atan2 and a binary search over the ring limits, and the rows are normalized once at the end.
+        
+        @param pointLayer: Input point layer, or its PointSet (see PointSet.fromLayer).
+        @param searchLength, angleStep, distanceStep, normalize: see calculateShapeContext.
+        @param cache: Optional DescriptorCache. The descriptors of a layer read from a file are loaded from it when
+                      cached, or stored in it after the computation.
+        @returns (descriptors, hasContext): the (points x bins) float32 array and the boolean mask of the points
+                 with a context (3 neighbours or more). The rows without context are zero.
+        """
+        
+        # 1) initial vars
+        points = pointLayer if isinstance( pointLayer, PointSet ) else PointSet.fromLayer( pointLayer )
+        
+        # 1.1) jah calculado?
+        key = self.cacheKey( cache, points, searchLength, angleStep, distanceStep, normalize )
+        cached = cache.load( key, points.ids ) if key is not None else None
+        
+        if cached is not None:
+            return cached
+        
+        # 2) contagem de todos os pontos
+        angleSlices, distStepMap, bins = self.binLayout( searchLength, angleStep, distanceStep )
+        descriptors = np.zeros( ( len( points ), bins ), dtype = np.float32 )
+        
+        valid = points.validPositions()
+        
+        if len( valid ) > 0:
+            index = GridIndex( points.x, points.y, searchLength if searchLength > 0. else 1., points.valid )
+            self.countShapeContext( points, index, valid, descriptors, searchLength, angleStep, distanceStep )
+        
+        # 3) filtro e normalizacao
+        hasContext = self.finishShapeContext( descriptors, normalize )
+        
+        if key is not None:
+            cache.store( key, descriptors, hasContext, points.ids )
+        
+        return descriptors, hasContext
+        
+    def calculateShapeContextArrays( self,
+                                    pointLayers,
+                                    searchLength,
+                                    angleStep,
+                                    distanceStep,
+                                    normalize = True,
+                                    cache = None,
+                                    workers = 1,
+                                    feedback = None ):
+        """
+        calculateShapeContextArray for several layers at once, in a process pool.
+        
+        The coordinates of all layers and the output arrays live in shared memory. Each worker counts the rows of
+        a range of points of one layer, with the same code as the serial build, and the rows are filtered and
+        normalized once all counts are in: the result is bit-identical to calculateShapeContextArray.
+        
+        @param pointLayers: List of point layers or PointSets.
+        @param searchLength, angleStep, distanceStep, normalize, cache: see calculateShapeContextArray.
+        @param workers: Number of worker processes. 1 builds the layers one after the other, in this process.
+        @param feedback: Optional QgsProcessingFeedback, for progress and cancel.
+        @returns List of (descriptors, hasContext), one per layer. If canceled, the layers not built have
+                 hasContext all False, and nothing goes to the cache.
+        """
+        pointSets = [ p if isinstance( p, PointSet ) else PointSet.fromLayer( p ) for p in pointLayers ]
+        
+        if workers <= 1:
+            return [ self.calculateShapeContextArray( points, searchLength, angleStep, distanceStep, normalize, cache )
+                     for points in pointSets ]
+        
+        # o import aqui evita o ciclo com o matching
+        from ..matching.tiled_executor import poolContext
+        
+        results = [ None ] * len( pointSets )
+        keys    = [ None ] * len( pointSets )
+        
+        # 1) os que jah estao no cache
+        for k, points in enumerate( pointSets ):
+            keys[k] = self.cacheKey( cache, points, searchLength, angleStep, distanceStep, normalize )
+            if keys[k] is not None:
+                results[k] = cache.load( keys[k], points.ids )
+        
+        pending = [ k for k in range( len( pointSets ) ) if results[k] is None ]
+        
+        # 2) os demais: arrays compartilhados e tarefas por faixa de pontos validos, de todos os layers
+        _, _, bins = self.binLayout( searchLength, angleStep, distanceStep )
+        
+        blocks = []
+        tasks = []
+        outputs = dict()
+        
+        try:
+            for k in pending:
+                points = pointSets[k]
+                
+                layer = dict()
+                for name, values in ( ( 'ids', points.ids ), ( 'x', points.x ), ( 'y', points.y ), ( 'valid', points.valid ),
+                                      ( 'descriptors', np.zeros( ( len( points ), bins ), dtype = np.float32 ) ) ):
+                    block, layer[ name ] = sharedArray( values )
+                    blocks.append( block )
+                
+                outputs[k] = np.ndarray( ( len( points ), bins ), dtype = np.float32, buffer = blocks[-1].buf )
+                
+                nvalid = int( points.valid.sum() )
+                step = max( int( math.ceil( nvalid / ( workers * self.TASKS_PER_WORKER ) ) ), 1 )
+                
+                for start in range( 0, nvalid, step ):
+                    tasks.append( { 'layer' : layer, 'start' : start, 'end' : min( start + step, nvalid ),
+                                    'searchLength' : searchLength, 'angleStep' : angleStep, 'distanceStep' : distanceStep } )
+            
+            # 3) executa
+            canceled = False
+            if tasks:
+                with ProcessPoolExecutor( max_workers = workers, mp_context = poolContext() ) as pool:
+                    futures = [ pool.submit( countShapeContextTask, task ) for task in tasks ]
+                    
+                    for done, future in enumerate( futures ):
+                        if feedback is not None and feedback.isCanceled():
+                            for f in futures:
+                                f.cancel()
+                            canceled = True
+                            break
+                        future.result()
+                        if feedback is not None:
+                            feedback.setProgress( int( 20. * ( done+1 ) / len( futures ) ) )
+            
+            # 4) filtro e normalizacao, como no serial - fora da memoria compartilhada
+            for k in pending:
+                descriptors = np.array( outputs[k] )
+                
+                # cancelado: contagens incompletas, que nunca vao para o cache
+                if canceled:
+                    results[k] = ( descriptors, np.zeros( len( descriptors ), dtype = bool ) )
+                    continue
+                
+                hasContext = self.finishShapeContext( descriptors, normalize )
+                
+                if keys[k] is not None:
+                    cache.store( keys[k], descriptors, hasContext, pointSets[k].ids )
+                
+                results[k] = ( descriptors, hasContext )
+        finally:
+            outputs.clear()
+            for block in blocks:
+                block.close()
+                block.unlink()
+        
+        return results
+        
+    def cacheKey( self, cache, points, searchLength, angleStep, distanceStep, normalize ):
+        """Key of the descriptors of points in the DescriptorCache, or None if they can not be cached """
+        stamp = DescriptorCache.sourceStamp( points.source ) if cache is not None else None
+        
+        if stamp is None:
+            return None
+        
+        return cache.key( points.source, len( points ), stamp, searchLength, angleStep, distanceStep, normalize )
+        
+    def countShapeContext( self, points, index, positions, descriptors, searchLength, angleStep, distanceStep ):
+        """
+        Fills the rows of descriptors at positions with the neighbour counts of their bins.
+        
+        @param points: PointSet of the layer.
+        @param index: GridIndex of the valid points of the layer (cells of searchLength).
+        @param positions: Positions of the (valid) points to count.
+        @param descriptors: (points x bins) array, see calculateShapeContextArray.
+        """
+        angleSlices, distStepMap, bins = self.binLayout( searchLength, angleStep, distanceStep )
+        distStepMap = np.array( distStepMap )
+        
+        # Em lotes de pontos
+        for start in range( 0, len( positions ), self.BATCH_SIZE ):
+            batch = positions[ start:start + self.BATCH_SIZE ]
+            bx, by = points.x[ batch ], points.y[ batch ]
+            
+            owner, b = index.queryPairs( bx-searchLength, by-searchLength, bx+searchLength, by+searchLength )
+            a = batch[ owner ]
+            
+            # 1) ignora o mesmo e os fora do raio
+            dx, dy = points.x[ b ] - points.x[ a ], points.y[ b ] - points.y[ a ]
+            distance = np.sqrt( dx*dx + dy*dy )
+            
+            keep = ( points.ids[ a ] != points.ids[ b ] ) & ( distance <= searchLength )
+            owner, dx, dy, distance = owner[ keep ], dx[ keep ], dy[ keep ], distance[ keep ]
+            
+            # 2) angulo em [0, 2pi) e anel - o primeiro limite maior que a distancia (0 se nenhum)
+            angle = np.arctan2( dy, dx )
+            angle[ angle < 0. ] += 2.*math.pi
+            
+            angQuad = 1 + np.floor( angle / angleStep ).astype( np.int64 )
+            
+            distQuad = np.searchsorted( distStepMap, distance, side = 'right' )
+            distQuad[ distQuad == len( distStepMap ) ] = 0
+            
+            # 3) contagem - bin b na coluna b-1
+            column = angleSlices * distQuad + angQuad - 1
+            counts = np.bincount( owner * bins + column, minlength = len( batch ) * bins )
+            
+            descriptors[ batch ] = counts.reshape( len( batch ), bins )
+        
+    def finishShapeContext( self, descriptors, normalize = True ):
+        """
+        Keeps the rows with 3 neighbours or more and normalizes them, in place, once.
+        
+        @returns hasContext: the boolean mask of the rows kept.
+        """
+        # soh considero os de 3 vizinhos ou mais
+        neighCount = descriptors.sum( axis = 1, dtype = np.float64 )
+        hasContext = neighCount >= 3
+        descriptors[ ~hasContext ] = 0.
+        
+        # normalizar - uma vez, linha a linha
+        if normalize:
+            descriptors[ hasContext ] /= neighCount[ hasContext, np.newaxis ].astype( np.float32 )
+        
+        return hasContext
+        
+    def poolDescriptors( self, descriptors, width ):
+        """
+        Coarse views of dense descriptors, for prefilterPairs: the bins pooled in groups of width consecutive
+        columns (the rings, if width is the number of angular sectors) and by column modulo width (the sectors).
+        
+        @returns List with the two pooled float32 arrays.
+        """
+        bins = descriptors.shape[1]
+        columns = np.arange( bins )
+        
+        pooled = []
+        for groups in ( columns // width, columns % width ):
+            # soma dos bins de cada grupo, como um produto por uma matriz 0/1
+            onehot = np.zeros( ( bins, int( groups.max() ) + 1 if bins > 0 else 0 ), dtype = np.float32 )
+            onehot[ columns, groups ] = 1.
+            pooled.append( np.asarray( descriptors, dtype = np.float32 ) @ onehot )
+        
+        return pooled
+        
+    def prefilterPairs( self, pooledA, pooledB, positionsA, positionsB, threshold ):
+        """
+        Cheap test of the pairs which may cost less than threshold, before the exact distanceContextPairs.
+        
+        Merging bins never increases the chi-square cost ((a1+a2-b1-b2)^2/(a1+a2+b1+b2) is at most the sum of
+        the two terms), so the cost of the pooled descriptors (see poolDescriptors) is a lower bound of the exact
+        cost. A pair whose bound reaches threshold can not be under it, and is rejected; the bound is compared
+        with a small tolerance, for the float32 rounding.
+        
+        @param pooledA, pooledB: Pooled descriptors of both layers (poolDescriptors).
+        @returns Boolean mask of the pairs kept.
+        """
+        keep = np.ones( len( positionsA ), dtype = bool )
+        limit = threshold * ( 1. + self.PREFILTER_TOLERANCE ) + self.PREFILTER_TOLERANCE
+        
+        for coarseA, coarseB in zip( pooledA, pooledB ):
+            survivors = np.flatnonzero( keep )
+            bound = self.distanceContextPairs( coarseA, coarseB, positionsA[ survivors ], positionsB[ survivors ] )
+            keep[ survivors[ bound >= limit ] ] = False
+        
+        return keep
+        
+    def selectLandmarks( self, pointLayer, count ):
+        """
+        Selects landmarks among the points by spatial stratified sampling.
+        
+        The extent is split into a grid of about count cells and the point nearest to the centre of each
+        non-empty cell is a landmark; if there are fewer non-empty cells than count, the remaining landmarks
+        are the next points of the most populated cells. The choice is deterministic.
+        
+        @param pointLayer: Input point layer, or its PointSet (see PointSet.fromLayer).
+        @param count: Number of landmarks (L).
+        @returns (x, y) arrays of the landmarks.
+        """
+        points = pointLayer if isinstance( pointLayer, PointSet ) else PointSet.fromLayer( pointLayer )
+        
+        valid = points.validPositions()
+        if len( valid ) <= count:
+            return points.x[ valid ].copy(), points.y[ valid ].copy()
+        
+        # 1) grade de ~count celulas sobre o extent
+        xmin, ymin, xmax, ymax = points.extent()
+        side = max( int( math.ceil( math.sqrt( count ) ) ), 1 )
+        
+        width  = max( xmax - xmin, 1e-12 ) / side
+        height = max( ymax - ymin, 1e-12 ) / side
+        
+        px, py = points.x[ valid ], points.y[ valid ]
+        col = np.minimum( np.floor( ( px - xmin ) / width ).astype( np.int64 ), side-1 )
+        row = np.minimum( np.floor( ( py - ymin ) / height ).astype( np.int64 ), side-1 )
+        cell = col * side + row
+        
+        # 2) em cada celula, os pontos pela distancia ao centro
+        cx, cy = xmin + ( col + .5 ) * width, ymin + ( row + .5 ) * height
+        dx, dy = px - cx, py - cy
+        order = np.lexsort( ( np.arange( len( px ) ), dx*dx + dy*dy, cell ) )
+        
+        cell = cell[ order ]
+        rank = np.arange( len( cell ) ) - np.searchsorted( cell, cell, side = 'left' )
+        cellSize = np.bincount( cell, minlength = side*side )[ cell ]
+        
+        # 3) primeiro o mais central de cada celula, depois os seguintes das mais cheias
+        chosen = order[ np.lexsort( ( -cellSize, rank ) )[ :count ] ]
+        
+        return px[ chosen ], py[ chosen ]
+        
+    def calculateLandmarkContext( self, pointLayer, landmarkX, landmarkY ):
+        """
+        Calculate the geographic context of each point against a set of landmarks, as in Samal et al. [2004].
+        
+        The descriptor of a point is a log-polar histogram of the landmarks seen from it: LANDMARK_SECTORS angular
+        sectors by LANDMARK_RINGS rings of distance, doubling up to the diagonal of the landmarks (see landmarkLayout).
+        The rings come from the landmarks only, the same for both datasets, so the descriptors keep the absolute
+        scale. Each landmark weighs 1/L, split between the two nearest sectors and the two nearest rings
+        (bilinear, in angle and log-distance): the descriptor changes smoothly with the position, and close points
+        do not tie.
+        
+        The rows are laid out as the shape contexts (rings of sectors), so they compare with distanceContextBatch
+        and prefilterPairs, pooled by LANDMARK_SECTORS. The cost is about the fraction of the landmarks that change
+        of sector or ring between the two points, in [0,1]. It costs O(n.L).
+        
+        @param pointLayer: Input point layer, or its PointSet (see PointSet.fromLayer).
+        @param landmarkX, landmarkY: Coordinates of the landmarks (see selectLandmarks).
+        @returns (descriptors, hasContext): the (points x sectors.rings) float32 array and the boolean mask of the
+                 points with a context (the non-empty ones). The rows without context are zero.
+        """
+        points = pointLayer if isinstance( pointLayer, PointSet ) else PointSet.fromLayer( pointLayer )
+        
+        landmarkX = np.asarray( landmarkX, dtype = np.float64 )
+        landmarkY = np.asarray( landmarkY, dtype = np.float64 )
+        
+        sectors, rings, outer = self.landmarkLayout( landmarkX, landmarkY )
+        bins = sectors * rings
+        weight = 1. / len( landmarkX ) if len( landmarkX ) > 0 else 0.
+        
+        descriptors = np.zeros( ( len( points ), bins ), dtype = np.float32 )
+        
+        valid = points.validPositions()
+        
+        # 1) angulo e distancia aos landmarks, em lotes
+        for start in range( 0, len( valid ), self.BATCH_SIZE ):
+            batch = valid[ start:start + self.BATCH_SIZE ]
+            
+            dx = landmarkX[ np.newaxis, : ] - points.x[ batch ][ :, np.newaxis ]
+            dy = landmarkY[ np.newaxis, : ] - points.y[ batch ][ :, np.newaxis ]
+            
+            # 1.1) coordenadas continuas: setor no circulo, anel em log2 ( o ultimo eh o diagonal )
+            sector = ( np.arctan2( dy, dx ) % ( 2. * math.pi ) ) * ( sectors / ( 2. * math.pi ) )
+            ring = np.log2( np.maximum( np.hypot( dx, dy ), outer * 2.**( 1 - rings ) ) / outer ) + ( rings - 1 )
+            ring = np.minimum( ring, rings - 1 )
+            
+            s0 = np.floor( sector ).astype( np.int64 )
+            r0 = np.floor( ring ).astype( np.int64 )
+            fs, fr = sector - s0, ring - r0
+            s0 %= sectors
+            s1 = ( s0 + 1 ) % sectors
+            r1 = np.minimum( r0 + 1, rings - 1 )
+            
+            # 2) pesos bilineares nos 4 bins vizinhos, somados por ponto
+            rows = np.broadcast_to( np.arange( len( batch ) )[ :, np.newaxis ] * bins, s0.shape )
+            flat = np.concatenate( [ ( rows + r * sectors + c ).ravel() for r, c in ( ( r0, s0 ), ( r0, s1 ), ( r1, s0 ), ( r1, s1 ) ) ] )
+            mass = np.concatenate( [ w.ravel() for w in ( ( 1-fr ) * ( 1-fs ), ( 1-fr ) * fs, fr * ( 1-fs ), fr * fs ) ] )
+            
+            descriptors[ batch ] = np.bincount( flat, weights = mass * weight, minlength = len( batch ) * bins ).reshape( len( batch ), bins )
+        
+        hasContext = descriptors.any( axis = 1 )
+        
+        return descriptors, hasContext
+        
+    def landmarkLayout( self, landmarkX, landmarkY ):
+        """
+        Bins of calculateLandmarkContext: the rings double in radius up to the outer one, the diagonal of the
+        bounding box of the landmarks (1 if they all coincide).
+        
+        @returns (sectors, rings, outer radius)
+        """
+        outer = math.hypot( float( np.ptp( landmarkX ) ), float( np.ptp( landmarkY ) ) ) if len( landmarkX ) > 0 else 0.
+        
+        return self.LANDMARK_SECTORS, self.LANDMARK_RINGS, outer if outer > 0. else 1.
+        
+    def distanceContext( self, histogramA, histogramB ) -> float:
+        """
+        Calculates the normalized distance between histograms. Result in [0,1]
+        """
+        
+        # o retorno eh o custo
+        cost = 0.
+        
+        # 1) Varre A e incrementa
+        for key, countA in histogramA.items():
+            # current/compare = countA/countB
+            countB = histogramB.get( key, 0 )
+            
+            denominator = countA + countB
+            
+            # agora calcula se > 0
+            if denominator > 0:
+                cost += ( countA - countB )**2 / denominator
+        
+        # 2) Varre B, nos que nao existem em A
+        for key, countB in histogramB.items():
+            # compare eh o A, mas soh levo adiante se for 0
+            countA = histogramA.get( key, 0 )
+            
+            if countA == 0:
+                cost += countB
+        
+        # a resposta eh a metade
+        return cost/2.
+        
+    def distanceContextArray( self, descriptorA, descriptorB ) -> float:
+        """
+        Same as distanceContext, for two rows of calculateShapeContextArray. Result in [0,1]
+        """
+        return float( self.distanceContextBatch( descriptorA, descriptorB )[0] )
+        
+    def distanceContextBatch( self, descriptorsA, descriptorsB ):
+        """
+        Batched distanceContext over rows of calculateShapeContextArray, in one vectorized call.
+        
+        @param descriptorsA: one descriptor, or a block of descriptors.
+        @param descriptorsB: a block of descriptors with the same number of rows as descriptorsA, or any
+                             number of rows if descriptorsA is one descriptor (one against all).
+        @returns float64 array with one cost per row. Results in [0,1]
+        """
+        descriptorsA = np.atleast_2d( descriptorsA )
+        descriptorsB = np.atleast_2d( descriptorsB )
+        
+        total = descriptorsA + descriptorsB
+        diff  = descriptorsA - descriptorsB
+        
+        # soh os bins com algum valor entram - os demais dao 0
+        used = total > 0
+        cost = np.divide( diff * diff, total, out = np.zeros_like( total ), where = used )
+        
+        # a resposta eh a metade
+        return cost.sum( axis = 1, dtype = np.float64 ) / 2.
+        
+    def distanceContextRotationBatch( self, descriptorsA, descriptorsB, angleSlices ):
+        """
+        Rotation-invariant distanceContextBatch: the minimum cost over all cyclic shifts of the angular sectors of B.
+        
+        The first angleSlices * rings columns of a shape context are rings of angleSlices sectors (see binLayout);
+        the remaining columns do not rotate. All shifts are evaluated at once, over a (pairs x rings x shifts x sectors)
+        tensor gathered with one index array.
+        
+        @param descriptorsA, descriptorsB: see distanceContextBatch.
+        @param angleSlices: Number of angular sectors of the descriptors.
+        @returns float64 array with one cost per row. Results in [0,1]
+        """
+        descriptorsA = np.atleast_2d( descriptorsA )
+        descriptorsB = np.atleast_2d( descriptorsB )
+        descriptorsA, descriptorsB = np.broadcast_arrays( descriptorsA, descriptorsB )
+        
+        rings = descriptorsA.shape[1] // angleSlices
+        grid = rings * angleSlices
+        
+        # 1) setores em aneis; shifts[s, k] = ( k - s ) mod angleSlices
+        ringsA = descriptorsA[ :, :grid ].reshape( -1, rings, 1, angleSlices )
+        ringsB = descriptorsB[ :, :grid ].reshape( -1, rings, angleSlices )
+        
+        sectors = np.arange( angleSlices )
+        shifts = ( sectors[ np.newaxis, : ] - sectors[ :, np.newaxis ] ) % angleSlices
+        
+        rotatedB = ringsB[ :, :, shifts ] # pairs x rings x shifts x sectors
+        
+        total = ringsA + rotatedB
+        diff  = ringsA - rotatedB
+        cost = np.divide( diff * diff, total, out = np.zeros_like( total ), where = total > 0 )
+        
+        # 2) custo de cada shift, mais as colunas que nao giram
+        costs = cost.sum( axis = ( 1, 3 ), dtype = np.float64 )
+        costs += 2. * self.distanceContextBatch( descriptorsA[ :, grid: ], descriptorsB[ :, grid: ] )[ :, np.newaxis ]
+        
+        # a resposta eh a metade do melhor
+        return costs.min( axis = 1 ) / 2.
+        
+    def distanceContextPairs( self, descriptorsA, descriptorsB, positionsA, positionsB, angleSlices = None ):
+        """
+        distanceContextBatch for the pairs ( descriptorsA[ positionsA[k] ], descriptorsB[ positionsB[k] ] ).
+        
+        The pairs are evaluated in blocks of BATCH_SIZE, to bound the memory of the gathered rows.
+        
+        @param angleSlices: If given, the rotation-invariant cost (see distanceContextRotationBatch), in blocks
+                            angleSlices times smaller.
+        @returns float64 array with one cost per pair.
+        """
+        costs = np.empty( len( positionsA ), dtype = np.float64 )
+        
+        if angleSlices is None:
+            kernel, step = self.distanceContextBatch, self.BATCH_SIZE
+        else:
+            kernel = lambda a, b: self.distanceContextRotationBatch( a, b, angleSlices )
+            step = max( self.BATCH_SIZE // ( angleSlices * angleSlices ), 1 )
+        
+        for start in range( 0, len( positionsA ), step ):
+            end = start + step
+            costs[ start:end ] = kernel( descriptorsA[ positionsA[ start:end ] ], descriptorsB[ positionsB[ start:end ] ] )
+        
+        return costs
+
+
+def sharedArray( values ):
+    """
+    Copies an array to a new shared memory block.
+    
+    Return: (block, spec), the SharedMemory (to close and unlink) and the (name, shape, dtype) to attach it.
+    """
+    values = np.ascontiguousarray( values )
+    block = shared_memory.SharedMemory( create = True, size = max( values.nbytes, 1 ) )
+    
+    np.ndarray( values.shape, dtype = values.dtype, buffer = block.buf )[...] = values
+    
+    return block, ( block.name, values.shape, values.dtype.str )
+
+
+def countShapeContextTask( task ):
+    """
+    Worker of ContextMeasure.calculateShapeContextArrays: counts the rows of a range of valid points of one layer,
+    straight into the shared output array.
+    """
+    layer = task[ 'layer' ]
+    blocks = dict()
+    
+    try:
+        arrays = dict()
+        for name, ( blockName, shape, dtype ) in layer.items():
+            blocks[ name ] = shared_memory.SharedMemory( name = blockName )
+            arrays[ name ] = np.ndarray( shape, dtype = np.dtype( dtype ), buffer = blocks[ name ].buf )
+        
+        points = PointSet( arrays[ 'ids' ], arrays[ 'x' ], arrays[ 'y' ], arrays[ 'valid' ] )
+        searchLength = task[ 'searchLength' ]
+        
+        # o indice do layer todo, mas soh as linhas da faixa
+        index = GridIndex( points.x, points.y, searchLength if searchLength > 0. else 1., points.valid )
+        positions = points.validPositions()[ task[ 'start' ]:task[ 'end' ] ]
+        
+        ContextMeasure().countShapeContext( points, index, positions, arrays[ 'descriptors' ],
+                                            searchLength, task[ 'angleStep' ], task[ 'distanceStep' ] )
+        
+        del points, index, arrays
+    finally:
+        for block in blocks.values():
+            block.close()
+    
+    return task[ 'start' ], task[ 'end' ]
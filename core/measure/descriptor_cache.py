@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+import os
+import hashlib
+import numpy as np
+
+class DescriptorCache( object ):
+    """
+    This class handles a persistent cache of shape context descriptors (see ContextMeasure.calculateShapeContextArray).
+
+    Each entry is a set of .npy files in the cache directory, named by a key built from the layer source,
+    its feature count, the modification stamp of the source file and the context parameters. The descriptors
+    are loaded memory-mapped, so a cached layer costs no computation and only the rows used are read.
+    When the directory grows over maxSize bytes, the least recently used entries are removed.
+
+    Layers without a source file (memory layers, databases) have no modification stamp and are never cached.
+    """
+
+    # version of the descriptors - change it when calculateShapeContextArray changes its output
+    VERSION = 1
+
+    # files of an entry: descriptors (memory-mapped), context mask and feature ids
+    DESCRIPTORS = '.desc.npy'
+    MASK = '.mask.npy'
+    IDS = '.ids.npy'
+    SUFFIXES = ( DESCRIPTORS, MASK, IDS )
+
+    def __init__( self, cacheDir, maxSize = 1024**3 ):
+        """
+        Constructor
+
+        @param cacheDir: Directory of the cache files. It is created if needed.
+        @param maxSize: Maximum size of the cache, in bytes.
+        """
+        self.cacheDir = cacheDir
+        self.maxSize = int( maxSize )
+
+        os.makedirs( cacheDir, exist_ok = True )
+
+    @staticmethod
+    def sourceStamp( source ):
+        """
+        Modification stamp (mtime in ns, size) of the file behind a layer source, or None if there is no file.
+        """
+        path = source.split( '|' )[0] if source else ''
+
+        if not path or not os.path.isfile( path ):
+            return None
+
+        stat = os.stat( path )
+        return ( stat.st_mtime_ns, stat.st_size )
+
+    def key( self, source, featureCount, stamp, searchLength, angleStep, distanceStep, normalize = True ):
+        """Key of an entry: a hash of everything the descriptors depend on """
+        text = repr( ( self.VERSION, source, int( featureCount ), stamp,
+                       float( searchLength ), float( angleStep ), float( distanceStep ), bool( normalize ) ) )
+
+        return hashlib.sha1( text.encode( 'utf-8' ) ).hexdigest()
+
+    def paths( self, key ):
+        """Files of an entry, in the order of SUFFIXES """
+        return [ os.path.join( self.cacheDir, key + suffix ) for suffix in self.SUFFIXES ]
+
+    def load( self, key, ids ):
+        """
+        Loads an entry.
+
+        @param ids: Feature ids of the points; the entry is only valid for the same ids, in the same order.
+        @returns (descriptors, hasContext), with the descriptors memory-mapped (read only), or None.
+        """
+        paths = self.paths( key )
+
+        if not all( os.path.exists( path ) for path in paths ):
+            return None
+
+        try:
+            descriptors = np.load( paths[0], mmap_mode = 'r' )
+            hasContext  = np.load( paths[1] )
+            cachedIds   = np.load( paths[2] )
+        except ( OSError, ValueError ):
+            # entrada corrompida - descarta
+            self.remove( key )
+            return None
+
+        if not np.array_equal( cachedIds, ids ) or len( hasContext ) != len( ids ) or descriptors.shape[0] != len( ids ):
+            return None
+
+        # LRU - o mtime marca o ultimo uso
+        for path in paths:
+            os.utime( path )
+
+        return descriptors, hasContext
+
+    def store( self, key, descriptors, hasContext, ids ):
+        """Saves an entry and evicts the least recently used ones if the cache got too big """
+        paths = self.paths( key )
+
+        # escreve em temporarios e renomeia - uma leitura concorrente nunca ve um arquivo pela metade
+        for path, values in zip( paths, ( descriptors, hasContext, ids ) ):
+            temp = path + '.tmp'
+            with open( temp, 'wb' ) as output:
+                np.save( output, np.ascontiguousarray( values ) )
+            os.replace( temp, path )
+
+        self.evict( key )
+
+    def remove( self, key ):
+        """Removes the files of an entry """
+        for path in self.paths( key ):
+            try:
+                os.remove( path )
+            except OSError:
+                pass
+
+    def evict( self, keep = None ):
+        """
+        Removes the least recently used entries until the cache fits in maxSize.
+
+        @param keep: Key never removed (the entry just stored).
+        """
+        entries = dict() # key -> [ last use, size ]
+
+        for name in os.listdir( self.cacheDir ):
+            for suffix in self.SUFFIXES:
+                if name.endswith( suffix ):
+                    stat = os.stat( os.path.join( self.cacheDir, name ) )
+                    entry = entries.setdefault( name[ :-len( suffix ) ], [ 0, 0 ] )
+                    entry[0] = max( entry[0], stat.st_mtime_ns )
+                    entry[1] += stat.st_size
+                    break
+
+        total = sum( size for _, size in entries.values() )
+
+        for key, ( _, size ) in sorted( entries.items(), key = lambda item: item[1][0] ):
+            if total <= self.maxSize:
+                break
+            if key == keep:
+                continue
+
+            self.remove( key )
+            total -= size
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+import numpy as np
+
+class LineMeasure( object ):
+    """
+    This class handles distance measures between lines, over the vertex arrays of LineSets.
+
+    The measures work on batches of pairs (reference line, test line): the vertex combinations of all pairs
+    of a batch are laid out in flat arrays, so the cost is a few NumPy operations per batch instead of
+    Python loops per pair.
+    """
+
+    # Maximum number of vertex combinations per batch, to bound the memory of the flat arrays
+    BATCH_SIZE = 2**22
+
+    def __init__( self ):
+        """Constructor"""
+
+    def batches( self, countsA, countsB ):
+        """
+        Splits a list of pairs into batches of at most BATCH_SIZE vertex combinations (a larger pair is a batch alone).
+
+        @param countsA, countsB: Number of vertices of the lines of each pair.
+        @returns List of (start, end) slices of the pairs.
+        """
+        cumulative = np.cumsum( countsA * countsB )
+
+        slices = []
+        start = 0
+
+        while start < len( cumulative ):
+            done = cumulative[ start-1 ] if start > 0 else 0
+            end = max( int( np.searchsorted( cumulative, done + self.BATCH_SIZE, side = 'right' ) ), start + 1 )
+            slices.append( ( start, end ) )
+            start = end
+
+        return slices
+
+    def directedHausdorff( self, linesA, linesB, positionsA, positionsB ):
+        """
+        Directed discrete Hausdorff distance of each pair: the largest distance from a vertex of A to the nearest vertex of B.
+
+        @returns float64 array with the squared distance of each pair.
+        """
+        countsA = linesA.counts()[ positionsA ]
+        countsB = linesB.counts()[ positionsB ]
+
+        result = np.empty( len( positionsA ), dtype = np.float64 )
+
+        for start, end in self.batches( countsA, countsB ):
+            pa, pb = countsA[ start:end ], countsB[ start:end ]
+            sizes = pa * pb
+
+            # 1) combinacoes ( par, vertice de A, vertice de B ), com B variando mais rapido
+            pair = np.repeat( np.arange( end - start ), sizes )
+            local = np.arange( len( pair ) ) - np.repeat( np.cumsum( sizes ) - sizes, sizes )
+
+            va = linesA.offsets[ positionsA[ start:end ] ][ pair ] + local // pb[ pair ]
+            vb = linesB.offsets[ positionsB[ start:end ] ][ pair ] + local % pb[ pair ]
+
+            dx, dy = linesB.x[ vb ] - linesA.x[ va ], linesB.y[ vb ] - linesA.y[ va ]
+            dist2 = dx*dx + dy*dy
+
+            # 2) o mais proximo de B de cada vertice de A (blocos de pb), e o maior deles por par (blocos de pa)
+            rowSizes = np.repeat( pb, pa )
+            nearest = np.minimum.reduceat( dist2, np.cumsum( rowSizes ) - rowSizes )
+
+            result[ start:end ] = np.maximum.reduceat( nearest, np.cumsum( pa ) - pa )
+
+        return result
+
+    def hausdorffPairs( self, linesA, linesB, positionsA, positionsB ):
+        """
+        Discrete Hausdorff distance between the vertices of each pair ( linesA[ positionsA[k] ], linesB[ positionsB[k] ] ).
+
+        @param linesA, linesB: LineSets of the reference and test layers.
+        @param positionsA, positionsB: Positions of the lines of each pair; the lines must have vertices.
+        @returns float64 array with one distance per pair.
+        """
+        forward  = self.directedHausdorff( linesA, linesB, positionsA, positionsB )
+        backward = self.directedHausdorff( linesB, linesA, positionsB, positionsA )
+
+        return np.sqrt( np.maximum( forward, backward ) )
+
+    def frechetPairs( self, linesA, linesB, positionsA, positionsB, maxDistance = np.inf ):
+        """
+        Discrete Frechet distance between the vertices of each pair ( linesA[ positionsA[k] ], linesB[ positionsB[k] ] ).
+
+        Unlike Hausdorff, it respects the direction and the order of the vertices. The dynamic programming
+        (Eiter and Mannila, 1994) runs over the anti-diagonals of the coupling matrix, for all pairs of a batch
+        at once. Being a max over a path, a cell over maxDistance can not lead to a result under it, so it is
+        cut off, and a pair is abandoned as soon as two whole anti-diagonals in a row are over maxDistance. Before that,
+        the distance between the first vertices and between the last ones (both are coupled) is a lower bound
+        that discards most pairs for nothing.
+
+        @param linesA, linesB: LineSets of the reference and test layers.
+        @param positionsA, positionsB: Positions of the lines of each pair; the lines must have vertices.
+        @param maxDistance: Distances over it are returned as inf.
+        @returns float64 array with one distance per pair.
+        """
+        positionsA = np.asarray( positionsA, dtype = np.int64 )
+        positionsB = np.asarray( positionsB, dtype = np.int64 )
+        limit = maxDistance * maxDistance
+
+        result = np.full( len( positionsA ), np.inf )
+
+        # 1) cota inferior: vertices iniciais e finais
+        firstA, lastA = linesA.offsets[ positionsA ], linesA.offsets[ positionsA + 1 ] - 1
+        firstB, lastB = linesB.offsets[ positionsB ], linesB.offsets[ positionsB + 1 ] - 1
+
+        ends = np.maximum( ( linesA.x[ firstA ] - linesB.x[ firstB ] )**2 + ( linesA.y[ firstA ] - linesB.y[ firstB ] )**2,
+                           ( linesA.x[ lastA ]  - linesB.x[ lastB ] )**2  + ( linesA.y[ lastA ]  - linesB.y[ lastB ] )**2 )
+        pending = np.flatnonzero( ends <= limit )
+
+        # 2) programacao dinamica nos que sobraram, em lotes de tamanhos parecidos
+        countsA = linesA.counts()[ positionsA[ pending ] ]
+        countsB = linesB.counts()[ positionsB[ pending ] ]
+
+        order = np.lexsort( ( countsB, countsA ) )
+        pending, countsA, countsB = pending[ order ], countsA[ order ], countsB[ order ]
+
+        for start, end in self.batches( countsA, countsB ):
+            batch = pending[ start:end ]
+            result[ batch ] = self.frechetBatch( linesA, linesB, positionsA[ batch ], positionsB[ batch ], limit )
+
+        return np.sqrt( result )
+
+    def frechetBatch( self, linesA, linesB, positionsA, positionsB, limit ):
+        """
+        Squared discrete Frechet distance of a batch of pairs, or inf when it is over limit (squared).
+
+        The coupling values of anti-diagonal k are kept by row i (the column is k - i), so a cell depends
+        on rows i-1 and i of the previous anti-diagonal and row i-1 of the one before it.
+        """
+        countsA = linesA.counts()[ positionsA ]
+        countsB = linesB.counts()[ positionsB ]
+        rows, columns = int( countsA.max() ), int( countsB.max() )
+
+        # 1) vertices em matrizes ( par, vertice ), completadas com o ultimo vertice
+        row = np.minimum( np.arange( rows ), countsA[ :, None ] - 1 ) + linesA.offsets[ positionsA ][ :, None ]
+        column = np.minimum( np.arange( columns ), countsB[ :, None ] - 1 ) + linesB.offsets[ positionsB ][ :, None ]
+
+        ax, ay = linesA.x[ row ], linesA.y[ row ]
+        bx, by = linesB.x[ column ], linesB.y[ column ]
+
+        pair = np.arange( len( positionsA ) )
+        result = np.full( len( positionsA ), np.inf )
+
+        i = np.arange( rows )
+        previous = np.full( ( len( pair ), rows ), np.inf )
+        before = np.full( ( len( pair ), rows ), np.inf )
+
+        for k in range( rows + columns - 1 ):
+            j = k - i
+            inside = ( j >= 0 ) & ( j < columns )
+            jc = np.clip( j, 0, columns - 1 )
+
+            # 2) distancia de cada celula da anti-diagonal; fora das linhas do par eh inf
+            dist2 = ( ax - bx[ :, jc ] )**2 + ( ay - by[ :, jc ] )**2
+            dist2[ ~( inside & ( i < countsA[ :, None ] ) & ( j < countsB[ :, None ] ) ) ] = np.inf
+
+            if k == 0:
+                current = dist2
+            else:
+                up = np.full_like( previous, np.inf )
+                up[ :, 1: ] = previous[ :, :-1 ]
+                diagonal = np.full_like( before, np.inf )
+                diagonal[ :, 1: ] = before[ :, :-1 ]
+
+                current = np.maximum( dist2, np.minimum( np.minimum( up, previous ), diagonal ) )
+
+            # 3) corta o que passou do limite
+            current[ current > limit ] = np.inf
+
+            # 4) o par termina na celula ( na-1, nb-1 )
+            done = countsA + countsB - 2 == k
+            result[ pair[ done ] ] = current[ done, countsA[ done ] - 1 ]
+
+            # 5) abandona os pares terminados ou sem caminho abaixo do limite - um passo diagonal
+            #    pula uma anti-diagonal, entao sao duas seguidas acima do limite
+            alive = ~done & ( np.isfinite( current ).any( axis = 1 ) | np.isfinite( previous ).any( axis = 1 ) )
+
+            if not alive.any():
+                break
+
+            if not alive.all():
+                pair, countsA, countsB = pair[ alive ], countsA[ alive ], countsB[ alive ]
+                ax, ay, bx, by = ax[ alive ], ay[ alive ], bx[ alive ], by[ alive ]
+                current, previous = current[ alive ], previous[ alive ]
+
+            before, previous = previous, current
+
+        return result
+
+    def bufferInterval( self, px, py, dx, dy, qx, qy, ex, ey, distance ):
+        """
+        Part of each segment P + u*D, u in [0,1], within distance of the segment Q + v*E, v in [0,1].
+
+        The buffer of a segment is convex - two discs at the ends and the band along it - so the part is an
+        interval of u: the hull of the intervals of the three pieces.
+
+        @returns (lo, hi) arrays of u; lo > hi where the segment does not reach the buffer.
+        """
+        lo = np.full( len( px ), np.inf )
+        hi = np.full( len( px ), -np.inf )
+
+        a = dx*dx + dy*dy
+        a = np.where( a > 0, a, 1. )
+
+        # 1) os discos das pontas: | P + u*D - C |^2 <= distance^2
+        for cx, cy in ( ( qx, qy ), ( qx + ex, qy + ey ) ):
+            wx, wy = px - cx, py - cy
+            b = dx*wx + dy*wy
+            c = wx*wx + wy*wy - distance*distance
+            delta = b*b - a*c
+
+            root = np.sqrt( np.maximum( delta, 0. ) )
+            reach = delta >= 0
+
+            lo = np.where( reach, np.minimum( lo, ( -b - root ) / a ), lo )
+            hi = np.where( reach, np.maximum( hi, ( -b + root ) / a ), hi )
+
+        # 2) a faixa: ao longo de E em [0, |E|] e a menos de distance da reta
+        length = np.hypot( ex, ey )
+        ux, uy = ex / np.where( length > 0, length, 1. ), ey / np.where( length > 0, length, 1. )
+
+        bandLo, bandHi = self.linearInterval( ux*( px - qx ) + uy*( py - qy ), ux*dx + uy*dy, 0., length )
+        acrossLo, acrossHi = self.linearInterval( ux*( py - qy ) - uy*( px - qx ), ux*dy - uy*dx, -distance, distance )
+
+        bandLo, bandHi = np.maximum( bandLo, acrossLo ), np.minimum( bandHi, acrossHi )
+        band = ( bandLo <= bandHi ) & ( length > 0 )
+
+        lo = np.where( band, np.minimum( lo, bandLo ), lo )
+        hi = np.where( band, np.maximum( hi, bandHi ), hi )
+
+        return np.maximum( lo, 0. ), np.minimum( hi, 1. )
+
+    @staticmethod
+    def linearInterval( start, slope, low, high ):
+        """Interval of u with low <= start + u*slope <= high (all u, or none, when slope is 0) """
+        flat = slope == 0
+        slope = np.where( flat, 1., slope )
+
+        first, second = ( low - start ) / slope, ( high - start ) / slope
+        inside = ( start >= low ) & ( start <= high )
+
+        lo = np.where( flat, np.where( inside, -np.inf, np.inf ), np.minimum( first, second ) )
+        hi = np.where( flat, np.where( inside, np.inf, -np.inf ), np.maximum( first, second ) )
+
+        return lo, hi
+
+    @staticmethod
+    def coveredLength( groups, lo, hi ):
+        """
+        Length of the union of the intervals [lo, hi] of each group.
+
+        @param groups: Group of each interval (int64); empty intervals (lo > hi) are ignored.
+        @returns (group, length) arrays, one element per group with some interval.
+        """
+        keep = lo < hi
+        groups, lo, hi = groups[ keep ], lo[ keep ], hi[ keep ]
+
+        if len( groups ) == 0:
+            return groups, np.zeros( 0 )
+
+        order = np.lexsort( ( lo, groups ) )
+        groups, lo, hi = groups[ order ], lo[ order ], hi[ order ]
+
+        # 1) maior fim ate o intervalo anterior, no mesmo grupo (o rank do grupo separa os grupos)
+        first = np.r_[ True, groups[1:] != groups[:-1] ]
+        rank = np.cumsum( first ) - 1
+        span = max( float( hi.max() - lo.min() ), 1. ) * 2.
+
+        reached = np.maximum.accumulate( hi + rank * span ) - rank * span
+        before = np.r_[ -np.inf, reached[:-1] ]
+        before[ first ] = -np.inf
+
+        # 2) so o que passa do que ja foi coberto
+        covered = np.maximum( hi - np.maximum( lo, before ), 0. )
+
+        starts = np.flatnonzero( first )
+        return groups[ starts ], np.add.reduceat( covered, starts )
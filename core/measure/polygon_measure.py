@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+import numpy as np
+
+class PolygonMeasure( object ):
+    """
+    This class handles the cheap measures between polygons, vectorized over the arrays of PolygonSets:
+    upper bounds of the intersection over union (IoU) that discard the pairs that can not reach a minimum
+    IoU, and an optional shape test (compactness) - a heuristic, that may discard true pairs.
+
+    The exact IoU needs the geometries, see PolygonMatchingAlgorithm.
+    """
+
+    def __init__( self ):
+        """Constructor"""
+
+    def prefilterPairs( self, polygonsA, polygonsB, positionsA, positionsB, minIoU, maxCompactness = 0. ):
+        """
+        Pairs that can have an IoU of minIoU or more.
+
+        Being I the intersection area, IoU = I / ( A + B - I ) grows with I, and I is not larger than the areas
+        nor than the intersection of the bounding boxes. The centroids also can not be far: the centroid of
+        a polygon is within ( 1 - I/A ) * its diameter of the centroid of the intersection, and I >= IoU*A.
+
+        @param maxCompactness: Maximum difference of compactness (4*pi*area/perimeter^2); 0 for no test.
+        @returns Boolean array, True for the pairs to measure.
+        """
+        a, b = polygonsA, polygonsB
+        j, i = positionsA, positionsB
+
+        # 1) cota superior do IoU pela maior intersecao possivel
+        boxWidth  = np.maximum( np.minimum( a.xmax[ j ], b.xmax[ i ] ) - np.maximum( a.xmin[ j ], b.xmin[ i ] ), 0. )
+        boxHeight = np.maximum( np.minimum( a.ymax[ j ], b.ymax[ i ] ) - np.maximum( a.ymin[ j ], b.ymin[ i ] ), 0. )
+
+        intersection = np.minimum( np.minimum( a.area[ j ], b.area[ i ] ), boxWidth * boxHeight )
+        keep = intersection >= minIoU * ( a.area[ j ] + b.area[ i ] - intersection )
+
+        # 2) distancia entre os centroides, com o diametro limitado pela diagonal do bbox
+        diagonalA = np.hypot( a.xmax[ j ] - a.xmin[ j ], a.ymax[ j ] - a.ymin[ j ] )
+        diagonalB = np.hypot( b.xmax[ i ] - b.xmin[ i ], b.ymax[ i ] - b.ymin[ i ] )
+
+        keep &= np.hypot( a.cx[ j ] - b.cx[ i ], a.cy[ j ] - b.cy[ i ] ) <= ( 1. - minIoU ) * ( diagonalA + diagonalB )
+
+        # 3) forma - opcional
+        if maxCompactness > 0:
+            keep &= np.abs( a.compactness()[ j ] - b.compactness()[ i ] ) <= maxCompactness
+
+        return keep
@@ -32,23 +32,30 @@ __revision__ = '$Format:%H$'
 from PyQt5.QtCore import QCoreApplication
 from qgis.core import (QgsProcessing,
                        QgsProcessingAlgorithm,
+                       QgsProcessingException,
+                       QgsProcessingParameterDefinition,
                        QgsProcessingParameterFeatureSource,
                        QgsProcessingParameterEnum,
+                       QgsProcessingParameterBoolean,
                        QgsProcessingParameterNumber,
                        QgsProcessingParameterFileDestination,
-                       QgsVectorLayer,
-                       QgsRectangle)
-from .match_pair_manager import MatchPairManager
+                       QgsVectorLayer)
+from ...core.matching.line_set import LineSetCache
+from ...core.matching.line_matcher import LineMatcher
+from ...core.matching.pair_writer import PairWriter
 
 
 class LineMatchingAlgorithm(QgsProcessingAlgorithm):
     """
-    This algorithm performs the matching between two point datasets using
+    This algorithm performs the matching between two line datasets using
     some methods implemented.
 
     Similarity distances:
-    - Euclidean distance
-    - Context measure (see class ContextMeasure)
+    - Hausdorff distance (discrete, over the vertices; see class LineMeasure)
+    - Frechet distance (discrete, over the vertices)
+    - Segment overlap: partial matching of the segments within a buffer (m:n)
+    
+    The matching itself runs in LineMatcher, of the QGIS-free core package.
     
     Criteria:
     - Closer criteria: m:n matching case
@@ -63,7 +70,15 @@ class LineMatchingAlgorithm(QgsProcessingAlgorithm):
     TEST = 'TEST'
     METHOD = 'METHOD'
     THRESHOLD = 'THRESHOLD'
+    PREPROCESS = 'PREPROCESS'
+    TOLERANCE = 'TOLERANCE'
+    TOPOLOGY = 'TOPOLOGY'
+    MIN_OVERLAP = 'MIN_OVERLAP'
+    FORMAT = 'FORMAT'
     OUTPUT = 'OUTPUT'
+    
+    # Lines read and preprocessed, shared by all runs
+    lineCache = LineSetCache()
 
     def initAlgorithm(self, config):
         """
@@ -93,7 +108,7 @@ class LineMatchingAlgorithm(QgsProcessingAlgorithm):
             QgsProcessingParameterEnum(
                 self.METHOD,
                 self.tr('Matching method (similarity measure + case of correspondence)'),
-                options = ["TBD"],
+                options = LineMatcher.METHODS,
                 defaultValue = 0
             )
         )
@@ -108,18 +123,69 @@ class LineMatchingAlgorithm(QgsProcessingAlgorithm):
             )
         )
 
+        # Preprocessing of the vertices
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.PREPROCESS,
+                self.tr('Vertex preprocessing'),
+                options = ["None", "Douglas-Peucker simplification", "Resampling at fixed spacing"],
+                defaultValue = 0
+            )
+        )
+        
+        tolerance = QgsProcessingParameterNumber(
+            self.TOLERANCE,
+            self.tr('Simplification tolerance / resampling spacing (fraction of the threshold)'),
+            minValue=0,
+            type=QgsProcessingParameterNumber.Double,
+            defaultValue=0.1
+        )
+        tolerance.setFlags( tolerance.flags() | QgsProcessingParameterDefinition.FlagAdvanced )
+        self.addParameter( tolerance )
+
+        # Candidates from the network
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.TOPOLOGY,
+                self.tr('Topology-guided candidates (match the junctions first)'),
+                defaultValue = False
+            )
+        )
+
+        minOverlap = QgsProcessingParameterNumber(
+            self.MIN_OVERLAP,
+            self.tr('Minimum matched length fraction (segment overlap)'),
+            minValue=0,
+            maxValue=1,
+            type=QgsProcessingParameterNumber.Double,
+            defaultValue=0.5
+        )
+        minOverlap.setFlags( minOverlap.flags() | QgsProcessingParameterDefinition.FlagAdvanced )
+        self.addParameter( minOverlap )
+
         # Return
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.FORMAT,
+                self.tr('Output format'),
+                options = PairWriter.FORMATS,
+                defaultValue = PairWriter.TEXT
+            )
+        )
+        
         self.addParameter(
             QgsProcessingParameterFileDestination(
                 self.OUTPUT,
                 self.tr('Output file'),
-                defaultValue = '/dados/temp/00_pairs.txt'
+                self.tr('Text files (*.txt);;CSV files (*.csv);;GeoPackage (*.gpkg);;Parquet files (*.parquet)')
             )
         )
 
     def processAlgorithm(self, parameters, context, feedback):
         """
         Here is where the processing itself takes place.
+        
+        NOTE: the parts of a MultiLineString are taken together, as one line.
         """
     
         # 1) get input parameters
@@ -127,29 +193,30 @@ class LineMatchingAlgorithm(QgsProcessingAlgorithm):
         test      = self.parameterAsVectorLayer( parameters, self.TEST,      context )
         method    = self.parameterAsEnum(        parameters, self.METHOD,    context )
         threshold = self.parameterAsDouble(      parameters, self.THRESHOLD, context )
+        outFormat = self.parameterAsEnum(        parameters, self.FORMAT,    context )
+        preprocess = self.parameterAsEnum(       parameters, self.PREPROCESS, context )
+        tolerance = self.parameterAsDouble(      parameters, self.TOLERANCE, context )
+        topology  = self.parameterAsBool(        parameters, self.TOPOLOGY,  context )
+        minOverlap = self.parameterAsDouble(     parameters, self.MIN_OVERLAP, context )
         
         # 2) Common tests
         if reference.featureCount() < 1 or test.featureCount() < 1:
             raise QgsProcessingException( self.tr( "Empty vector layer." ), "INVALIDPARAMETERVALUE" );
         
-        # 3) Run 
-        if method == 0 or method == 1:
-            pass
-            #pairMgr = self.runEuclideanDistance( feedback, reference, test, method, threshold )
-        elif method == 2 or method == 3:
-            #pairMgr = self.runContextMeasure( feedback, reference, test, method, threshold )
-            pass
-        else:
+        # 3) Le os vertices uma unica vez - e guarda para as proximas execucoes
+        refLines  = self.lineCache.get( reference, preprocess, tolerance * threshold )
+        testLines = self.lineCache.get( test,      preprocess, tolerance * threshold )
+        
+        # 4) Run 
+        if method < 0 or method >= len( LineMatcher.METHODS ):
             raise QgsProcessingException( self.tr( "Invalid match method." ), "INVALIDPARAMETERVALUE" );
-
+        
+        pairMgr = LineMatcher().run( refLines, testLines, method, threshold, topology, minOverlap, feedback )
        
-        # 3) Salvar resposta
+        # 5) Salvar resposta
         outputFile = self.parameterAsFileOutput( parameters, self.OUTPUT, context )
         
-        filetmp = open( outputFile, 'w' )
-        filetmp.write( "# Pair manager\n" )
-        filetmp.write( pairMgr.toString() )
-        filetmp.close()
+        PairWriter.create( outFormat, outputFile ).write( pairMgr )
         
         return {self.OUTPUT: outputFile}
 
@@ -192,3 +259,17 @@ class LineMatchingAlgorithm(QgsProcessingAlgorithm):
 
     def createInstance(self):
         return LineMatchingAlgorithm()
+    
+    def shortHelpString( self ):
+        """Returns a localised short helper string for the algorithm, that appears at right."""
+        
+        return """The <b>threshold</b> is the largest distance between matched lines, in the SRS' units.<br/>
+The <i>Hausdorff</i> and <i>Frechet</i> distances are computed between the vertices of the lines: densify long segments for a finer result.<br/>
+The <i>Frechet</i> distance respects the direction of the lines: lines digitized in opposite directions do not match.<br/>
+<b>Vertex preprocessing</b> bounds the cost of lines with many vertices; the tolerance (or spacing) is a fraction of the threshold:<br/>
+- <i>Douglas-Peucker</i> keeps the vertices that shape the line, within the tolerance, and splits the long segments left at twice the tolerance: a line moves at most the tolerance and its vertices stay close enough for the measures;<br/>
+- <i>Resampling</i> puts vertices at a fixed spacing along the lines, which also densifies long segments.<br/>
+The preprocessed lines of layers saved in files are kept in memory for the next runs.<br/>
+<b>Segment overlap</b> matches lines digitized with different segmentation: the threshold is a buffer distance, and the part of each segment within the buffer of a (nearly parallel) segment of the other layer is matched. A pair of lines is kept when the matched length is at least the <b>minimum fraction</b> of one of the lines; the fractions of both go to the output (CSV, GeoPackage, Parquet) and the score is 1 - the largest of them.<br/>
+<b>Topology-guided candidates</b> suit networks (roads, rivers): the lines meet at nodes, and the junctions (nodes not of degree 2) are matched first, as mutual nearest points under the threshold. A line is then compared only to the lines that leave the match of one of its ends towards the match of the other end (or a node next to it); the lines with no pair under the threshold, this way, are searched by position.<br/>
+"""
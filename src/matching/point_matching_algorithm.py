@@ -37,12 +37,14 @@ from qgis.core import (QgsProcessing,
                        QgsProcessingParameterEnum,
                        QgsProcessingParameterNumber,
                        QgsProcessingParameterFileDestination,
-                       QgsVectorLayer,
-                       QgsRectangle,
-                       QgsWkbTypes)
-from .match_pair_manager import MatchPairManager
-from ..measure.context_measure import ContextMeasure
-import math
+                       QgsProcessingParameterFile,
+                       QgsProcessingParameterBoolean,
+                       QgsProcessingParameterDefinition,
+                       QgsVectorLayer)
+from ...core.matching.point_set import PointSet
+from ...core.matching.point_matcher import PointMatcher
+from ...core.matching.pair_writer import PairWriter
+from ...core.measure.descriptor_cache import DescriptorCache
 
 
 class PointMatchingAlgorithm(QgsProcessingAlgorithm):
@@ -53,6 +55,9 @@ class PointMatchingAlgorithm(QgsProcessingAlgorithm):
     Similarity distances:
     - Euclidean distance
     - Context measure (see class ContextMeasure)
+    - Landmark context: context against a few landmarks (Samal et al., see ContextMeasure.calculateLandmarkContext)
+    
+    The matching itself runs in PointMatcher, of the QGIS-free core package.
     
     Criteria:
     - Closer criteria: m:n matching case
@@ -66,7 +71,17 @@ class PointMatchingAlgorithm(QgsProcessingAlgorithm):
     REFERENCE = 'REFERENCE'
     TEST = 'TEST'
     METHOD = 'METHOD'
+    LANDMARKS = 'LANDMARKS'
+    LANDMARK_COUNT = 'LANDMARK_COUNT'
     THRESHOLD = 'THRESHOLD'
+    ENGINE = 'ENGINE'
+    BLOCK_SIZE = 'BLOCK_SIZE'
+    WORKERS = 'WORKERS'
+    DESCRIPTORS = 'DESCRIPTORS'
+    ROTATION_INVARIANT = 'ROTATION_INVARIANT'
+    CACHE_DIR = 'CACHE_DIR'
+    CACHE_SIZE = 'CACHE_SIZE'
+    FORMAT = 'FORMAT'
     OUTPUT = 'OUTPUT'
 
     def initAlgorithm(self, config):
@@ -97,10 +112,30 @@ class PointMatchingAlgorithm(QgsProcessingAlgorithm):
             QgsProcessingParameterEnum(
                 self.METHOD,
                 self.tr('Matching method (similarity measure + case of correspondence)'),
-                options = ["Euclidean - closer", "Euclidean - both nearest", "Context - closer", "Context - both nearest"],
+                options = PointMatcher.METHODS,
                 defaultValue = 0
             )
         )
+        
+        # Landmarks - camada ou amostra do reference
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.LANDMARKS,
+                self.tr('Landmark layer (landmark context methods)'),
+                [QgsProcessing.TypeVectorPoint],
+                optional = True
+            )
+        )
+        
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.LANDMARK_COUNT,
+                self.tr('Number of landmarks sampled from the reference layer, without a landmark layer'),
+                minValue=3,
+                type=QgsProcessingParameterNumber.Integer,
+                defaultValue=16
+            )
+        )
             
         self.addParameter(
             QgsProcessingParameterNumber(
@@ -112,11 +147,89 @@ class PointMatchingAlgorithm(QgsProcessingAlgorithm):
             )
         )
 
+        # Engine for the Euclidean distance
+        engine = QgsProcessingParameterEnum(
+            self.ENGINE,
+            self.tr('Euclidean distance engine'),
+            options = ["Grid index", "Vectorized blocks (NumPy)"],
+            defaultValue = 0
+        )
+        engine.setFlags( engine.flags() | QgsProcessingParameterDefinition.FlagAdvanced )
+        self.addParameter( engine )
+        
+        blockSize = QgsProcessingParameterNumber(
+            self.BLOCK_SIZE,
+            self.tr('Block size of the vectorized engine (points per tile side)'),
+            minValue=16,
+            type=QgsProcessingParameterNumber.Integer,
+            defaultValue=1024
+        )
+        blockSize.setFlags( blockSize.flags() | QgsProcessingParameterDefinition.FlagAdvanced )
+        self.addParameter( blockSize )
+        
+        # Storage of the shape contexts
+        descriptors = QgsProcessingParameterEnum(
+            self.DESCRIPTORS,
+            self.tr('Shape context descriptors'),
+            options = ["Histogram dictionaries", "Dense arrays (float32)"],
+            defaultValue = 0
+        )
+        descriptors.setFlags( descriptors.flags() | QgsProcessingParameterDefinition.FlagAdvanced )
+        self.addParameter( descriptors )
+        
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.ROTATION_INVARIANT,
+                self.tr('Rotation-invariant context (best rotation of the angular sectors)'),
+                defaultValue = False
+            )
+        )
+        
+        cacheDir = QgsProcessingParameterFile(
+            self.CACHE_DIR,
+            self.tr('Cache directory of the dense descriptors'),
+            behavior = QgsProcessingParameterFile.Folder,
+            optional = True
+        )
+        cacheDir.setFlags( cacheDir.flags() | QgsProcessingParameterDefinition.FlagAdvanced )
+        self.addParameter( cacheDir )
+        
+        cacheSize = QgsProcessingParameterNumber(
+            self.CACHE_SIZE,
+            self.tr('Maximum size of the descriptor cache (MB)'),
+            minValue=1,
+            type=QgsProcessingParameterNumber.Double,
+            defaultValue=1024.
+        )
+        cacheSize.setFlags( cacheSize.flags() | QgsProcessingParameterDefinition.FlagAdvanced )
+        self.addParameter( cacheSize )
+        
+        # Parallel mode
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.WORKERS,
+                self.tr('Number of worker processes (1 = serial)'),
+                minValue=1,
+                type=QgsProcessingParameterNumber.Integer,
+                defaultValue=1
+            )
+        )
+
         # Return
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.FORMAT,
+                self.tr('Output format'),
+                options = PairWriter.FORMATS,
+                defaultValue = PairWriter.TEXT
+            )
+        )
+        
         self.addParameter(
             QgsProcessingParameterFileDestination(
                 self.OUTPUT,
-                self.tr('Output file')
+                self.tr('Output file'),
+                self.tr('Text files (*.txt);;CSV files (*.csv);;GeoPackage (*.gpkg);;Parquet files (*.parquet)')
                 #,defaultValue = '/dados/temp/00_pairs.txt'
             )
         )
@@ -132,28 +245,42 @@ class PointMatchingAlgorithm(QgsProcessingAlgorithm):
         reference = self.parameterAsVectorLayer( parameters, self.REFERENCE, context )
         test      = self.parameterAsVectorLayer( parameters, self.TEST,      context )
         method    = self.parameterAsEnum(        parameters, self.METHOD,    context )
+        landmarks = self.parameterAsVectorLayer( parameters, self.LANDMARKS, context )
+        landmarkCount = self.parameterAsInt(     parameters, self.LANDMARK_COUNT, context )
         threshold = self.parameterAsDouble(      parameters, self.THRESHOLD, context )
+        engine    = self.parameterAsEnum(        parameters, self.ENGINE,    context )
+        blockSize = self.parameterAsInt(         parameters, self.BLOCK_SIZE, context )
+        workers   = self.parameterAsInt(         parameters, self.WORKERS,   context )
+        descriptors = self.parameterAsEnum(      parameters, self.DESCRIPTORS, context )
+        rotation  = self.parameterAsBool(        parameters, self.ROTATION_INVARIANT, context )
+        cacheDir  = self.parameterAsFile(        parameters, self.CACHE_DIR, context )
+        cacheSize = self.parameterAsDouble(      parameters, self.CACHE_SIZE, context )
+        outFormat = self.parameterAsEnum(        parameters, self.FORMAT,    context )
         
         # 2) Common tests
         if reference.featureCount() < 1 or test.featureCount() < 1:
             raise QgsProcessingException( self.tr( "Empty vector layer." ), "INVALIDPARAMETERVALUE" );
         
-        # 3) Run 
-        if method == 0 or method == 1:
-            pairMgr = self.runEuclideanDistance( feedback, reference, test, method, threshold )
-        elif method == 2 or method == 3:
-            pairMgr = self.runContextMeasure( feedback, reference, test, method, threshold )
-        else:
+        # 3) Le as coordenadas uma unica vez
+        refPoints  = PointSet.fromLayer( reference )
+        testPoints = PointSet.fromLayer( test )
+        
+        # 3.1) Cache dos descritores, e landmarks da camada
+        cache = DescriptorCache( cacheDir, cacheSize * 1024**2 ) if cacheDir and ( descriptors == 1 or rotation ) else None
+        
+        landmarkPoints = PointSet.fromLayer( landmarks ) if landmarks is not None else None
+        
+        # 4) Run 
+        if method < 0 or method >= len( PointMatcher.METHODS ):
             raise QgsProcessingException( self.tr( "Invalid match method." ), "INVALIDPARAMETERVALUE" );
-
+        
+        pairMgr = PointMatcher().run( refPoints, testPoints, method, threshold, engine, blockSize, workers, descriptors, cache,
+                                      landmarkPoints, landmarkCount, rotation, feedback )
        
-        # 3) Salvar resposta
+        # 5) Salvar resposta
         outputFile = self.parameterAsFileOutput( parameters, self.OUTPUT, context )
         
-        filetmp = open( outputFile, 'w' )
-        filetmp.write( "# Pair manager\n" )
-        filetmp.write( pairMgr.toString() )
-        filetmp.close()
+        PairWriter.create( outFormat, outputFile ).write( pairMgr )
         
         return {self.OUTPUT: outputFile}
         
@@ -206,200 +333,12 @@ class PointMatchingAlgorithm(QgsProcessingAlgorithm):
         return """The <b>threshold</b> parameter depends most of the matching method.<br/>
 For an <i>Euclidean</i> method, it should be a distance in the SRS' units.<br/>
 For a <i>Context</i> method, it should be between [0, 1] interval, in which 0 means high similarity.<br/>
+The <i>Landmark context</i> methods compare the angles and distances to a few <b>landmarks</b>, taken from the landmark layer or sampled over the reference layer, as log-polar histograms; their costs are much smaller than the shape context ones.<br/>
+For a <i>Landmark context</i> method, the threshold (in [0, 1]) is about the fraction of the landmarks seen in another sector (of 30 degrees) or ring of distance (doubling up to the extent of the landmarks) from the test point than from the reference point. The histograms change smoothly with the position: a displacement of 5% of the mean distance to the landmarks costs about 0.02, 10% about 0.05 and 20% about 0.15.<br/>
+The <b>engine</b> and <b>block size</b> (advanced) only apply to the <i>Euclidean</i> methods.<br/>
+The <b>shape context descriptors</b> (advanced) only apply to the <i>Context</i> methods: dense arrays are much faster to build, with float32 precision.<br/>
+The <b>rotation-invariant</b> context compares the shape contexts under the best rotation of their angular sectors, for test data rotated relative to the reference; it always uses dense arrays.<br/>
+With a <b>cache directory</b> (advanced), the dense descriptors of file layers are kept on disk and reused while the file, its feature count and the context parameters do not change.<br/>
+With more than one <b>worker</b>, the data is split in tiles matched in parallel processes; the result is the same as a serial run.<br/>
+<i>Euclidean - both nearest</i> always runs a mutual nearest neighbour join, which needs neither engine nor workers.<br/>
 """
-    
-        """Internals"""
-    
-    def runEuclideanDistance( self, feedback, reference, test, method, threshold ) -> MatchPairManager:
-        """
-        Processing the matching using Euclidean distance.
-        
-        Return: the MatchPairManager
-        """
-      
-        # 2) test parameters
-        testExtent = test.extent()
-        maxDistance = testExtent.width() if testExtent.width() > testExtent.height() else testExtent.height()
-        
-        if maxDistance < 2. * threshold:
-            raise Exception( self.tr( "Test data with a small bounding box. It should be at least twice the threshold." ), "INVALIDPARAMETERVALUE" );
-        
-        refIsMulti  = QgsWkbTypes.isMultiType( int(reference.wkbType()) )
-        testIsMulti = QgsWkbTypes.isMultiType( int(test.wkbType()) )
-        
-        # 3) Run the processing
-        ncols = reference.featureCount()
-        nrows = test.featureCount()
-        
-        distMatrix = [[ int(maxDistance) for x in range(ncols+1) ] for y in range(nrows+1) ] 
-
-        # 3.1) Compute the number of steps to display within the progress bar and
-        # get features from source
-        total = 100.0 / ncols
-        
-        # 3.2) Itera sobre os ref e procura o equivalente em test
-        for j, refFeat in enumerate( reference.getFeatures() ):
-            # running chks
-            if feedback.isCanceled():
-                break
-            
-            # Coloque o ID no lugar
-            distMatrix[0][j+1] = refFeat.id() #refFeat.id()
-            
-            refGeom = refFeat.geometry()
-            
-            # Chks habituais
-            if refGeom.isEmpty():
-                continue
-            
-            # obtem a geometria e monta o box de busca
-            refPoint = refGeom.asPoint() if not refIsMulti else refGeom.asMultiPoint()[0].asPoint()
-                       
-            refBox = QgsRectangle( refPoint.x()-threshold, refPoint.y()-threshold,
-                                   refPoint.x()+threshold, refPoint.y()+threshold )
-            
-            for i, testFeat in enumerate( test.getFeatures() ):
-                
-                # Coloque o ID no lugar - repetindo
-                distMatrix[i+1][0] = testFeat.id()  #testFeat.id()
-                
-                testGeom = testFeat.geometry()
-            
-                # Chks habituais
-                if testGeom.isEmpty():
-                    continue
-                
-                # obtem a geometria
-                testPoint = testGeom.asPoint() if not testIsMulti else testGeom.asMultiPoint()[0].asPoint()
-                            
-                # ignore o disjoint
-                if not refBox.contains( testPoint ):
-                    continue
-                
-                # agora sim, o que a gente veio fazer aqui: distance
-                distMatrix[i+1][j+1] = refPoint.distance( testPoint )            
-        
-            feedback.setProgress( int(j * total) )
-    
-        # debug
-        
-        # 4) OK, tenho tudo, faltam os pares
-        pairMgr = MatchPairManager()
-        
-        # check o criteria 
-        criteria = pairMgr.CriteriaType.ISMINIMUM if method % 2 == 0 else pairMgr.CriteriaType.BOTHMIN
-        
-        pairMgr.buildFromMatrix( distMatrix, criteria, threshold )
-        
-        return pairMgr
-        
-    
-    
-    def runContextMeasure( self, feedback, reference, test, method, threshold ) -> MatchPairManager:
-        """
-        Processing the matching using Context measure.
-        
-        Return: the MatchPairManager
-        """
-        
-        # 1) Initial calculus
-        # 1.1) Descobrir quem eh menor, que serve de param 
-        # SearchLength = Diagonal / PointCount * 20  -> distance for 20 points in Diagonal
-        boxA = reference.extent()
-        boxB = test.extent()
-        
-        searchLengthA = math.sqrt( boxA.width()**2 + boxA.height()**2 ) / reference.featureCount() * 20.
-        searchLengthB = math.sqrt( boxB.width()**2 + boxB.height()**2 ) / test.featureCount() * 20.
-        
-        # parameters for context
-        cttSearchLength = searchLengthA if searchLengthA > searchLengthB else searchLengthB
-        cttDistanceStep = cttSearchLength / 20.
-        cttAngleStep = math.pi/6.
-        
-        # outros
-        refIsMulti  = QgsWkbTypes.isMultiType( int(reference.wkbType()) )
-        testIsMulti = QgsWkbTypes.isMultiType( int(test.wkbType()) )
-        
-        # 2) Calculate the context
-        context = ContextMeasure()
-        
-        shapeContextA = context.calculateShapeContext( reference, cttSearchLength, cttAngleStep, cttDistanceStep )
-        feedback.setProgress( 10 )
-        
-        shapeContextB = context.calculateShapeContext( test,      cttSearchLength, cttAngleStep, cttDistanceStep )
-        feedback.setProgress( 20 )
-
-        # 3) Run the processing
-        ncols = reference.featureCount()
-        nrows = test.featureCount()
-        
-        distMatrix = [[ 1. for x in range(ncols+1) ] for y in range(nrows+1) ] 
-
-        # 3.1) Compute the number of steps to display within the progress bar and
-        # get features from source
-        total = 80.0 / ncols
-        
-        # 3.2) Itera sobre os ref e procura o equivalente em test
-        for j, refFeat in enumerate( reference.getFeatures() ):
-            # running chks
-            if feedback.isCanceled():
-                break
-            
-            # Coloque o ID no lugar
-            distMatrix[0][j+1] = refFeat.id()
-            
-            refGeom = refFeat.geometry()
-            refHist = shapeContextA.get( refFeat.id() )
-            
-            # Chks habituais
-            if refGeom.isEmpty() or refHist is None:
-                continue
-            
-            # obtem a geometria e monta o box de busca - baseado no cttSearchLength
-            refPoint = refGeom.asPoint() if not refIsMulti else refGeom.asMultiPoint()[0].asPoint()
-                       
-            refBox = QgsRectangle( refPoint.x()-cttSearchLength, refPoint.y()-cttSearchLength,
-                                   refPoint.x()+cttSearchLength, refPoint.y()+cttSearchLength )
-            
-            for i, testFeat in enumerate( test.getFeatures() ):
-                
-                # Coloque o ID no lugar - repetindo
-                distMatrix[i+1][0] = testFeat.id()
-                
-                testGeom = testFeat.geometry()
-                testHist = shapeContextB.get( testFeat.id() )
-            
-                # Chks habituais
-                if testGeom.isEmpty() or testHist is None:
-                    continue
-                
-                # obtem a geometria
-                testPoint = testGeom.asPoint() if not testIsMulti else testGeom.asMultiPoint()[0].asPoint()
-                            
-                # ignore o disjoint
-                if not refBox.contains( testPoint ):
-                    continue
-                
-                # agora sim, o que a gente veio fazer aqui: distance
-                distMatrix[i+1][j+1] = context.distanceContext( refHist, testHist )        
-        
-            feedback.setProgress( 20 + int(j * total) )
-        # fim for_feat
-        
-        # debug
-
-        
-        # 4) OK, tenho tudo, faltam os pares
-        pairMgr = MatchPairManager()
-        
-        # check o criteria 
-        criteria = pairMgr.CriteriaType.ISMINIMUM if method % 2 == 0 else pairMgr.CriteriaType.BOTHMIN
-        
-        pairMgr.buildFromMatrix( distMatrix, criteria, threshold )
-        
-        return pairMgr;
-        
-        
-        
-    
-    
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+from PyQt5.QtCore import QCoreApplication
+from qgis.core import (QgsProcessing,
+                       QgsProcessingAlgorithm,
+                       QgsProcessingException,
+                       QgsProcessingParameterDefinition,
+                       QgsProcessingParameterFeatureSource,
+                       QgsProcessingParameterEnum,
+                       QgsProcessingParameterNumber,
+                       QgsProcessingParameterFileDestination,
+                       QgsGeometry)
+from ...core.matching.polygon_set import PolygonSet
+from ...core.matching.polygon_matcher import PolygonMatcher
+from ...core.matching.pair_writer import PairWriter
+import numpy as np
+
+
+class PolygonMatchingAlgorithm(QgsProcessingAlgorithm):
+    """
+    This algorithm performs the matching between two polygon datasets using
+    some methods implemented.
+
+    Similarity distances:
+    - Intersection over union: the distance is 1 - IoU
+    
+    The measures go from cheap to expensive: the candidates come from an R-tree
+    of bounding boxes, then upper bounds of the IoU (see class PolygonMeasure)
+    discard most of them, and only the rest get the exact IoU.
+    
+    The matching itself runs in PolygonMatcher, of the QGIS-free core package;
+    the exact IoU uses the geometry engine of QGIS (see iouDistancePairs).
+    
+    Criteria:
+    - Closer criteria: m:n matching case
+    - Both nearest: 1:1 matching case 
+    """
+
+    # Constants used to refer to parameters and outputs. They will be
+    # used when calling the algorithm from another algorithm, or when
+    # calling from the QGIS console.
+
+    REFERENCE = 'REFERENCE'
+    TEST = 'TEST'
+    METHOD = 'METHOD'
+    THRESHOLD = 'THRESHOLD'
+    COMPACTNESS = 'COMPACTNESS'
+    FORMAT = 'FORMAT'
+    OUTPUT = 'OUTPUT'
+
+    def initAlgorithm(self, config):
+        """
+        Here we define the inputs and output of the algorithm, along
+        with some other properties.
+        """
+
+        # We add the input vector features source. It can have any kind of
+        # geometry.
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.REFERENCE,
+                self.tr('Reference layer'),
+                [QgsProcessing.TypeVectorPolygon]
+            )
+        )
+        
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.TEST,
+                self.tr('Test layer'),
+                [QgsProcessing.TypeVectorPolygon]
+            )
+        )
+            
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.METHOD,
+                self.tr('Matching method (similarity measure + case of correspondence)'),
+                options = PolygonMatcher.METHODS,
+                defaultValue = 0
+            )
+        )
+            
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.THRESHOLD,
+                self.tr('Distance threshold (1 - IoU)'),
+                minValue=0,
+                maxValue=1,
+                type=QgsProcessingParameterNumber.Double,
+                defaultValue=0.5
+            )
+        )
+        
+        compactness = QgsProcessingParameterNumber(
+            self.COMPACTNESS,
+            self.tr('Maximum difference of compactness (0 = no test)'),
+            minValue=0,
+            maxValue=1,
+            type=QgsProcessingParameterNumber.Double,
+            defaultValue=0.
+        )
+        compactness.setFlags( compactness.flags() | QgsProcessingParameterDefinition.FlagAdvanced )
+        self.addParameter( compactness )
+
+        # Return
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.FORMAT,
+                self.tr('Output format'),
+                options = PairWriter.FORMATS,
+                defaultValue = PairWriter.TEXT
+            )
+        )
+        
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                self.OUTPUT,
+                self.tr('Output file'),
+                self.tr('Text files (*.txt);;CSV files (*.csv);;GeoPackage (*.gpkg);;Parquet files (*.parquet)')
+            )
+        )
+
+    def processAlgorithm(self, parameters, context, feedback):
+        """
+        Here is where the processing itself takes place.
+        
+        NOTE: the parts of a MultiPolygon are taken together, as one polygon.
+        """
+    
+        # 1) get input parameters
+        reference   = self.parameterAsVectorLayer( parameters, self.REFERENCE,   context )
+        test        = self.parameterAsVectorLayer( parameters, self.TEST,        context )
+        method      = self.parameterAsEnum(        parameters, self.METHOD,      context )
+        threshold   = self.parameterAsDouble(      parameters, self.THRESHOLD,   context )
+        compactness = self.parameterAsDouble(      parameters, self.COMPACTNESS, context )
+        outFormat   = self.parameterAsEnum(        parameters, self.FORMAT,      context )
+        
+        # 2) Common tests
+        if reference.featureCount() < 1 or test.featureCount() < 1:
+            raise QgsProcessingException( self.tr( "Empty vector layer." ), "INVALIDPARAMETERVALUE" );
+        
+        # 3) Le as geometrias uma unica vez
+        refPolygons  = PolygonSet.fromLayer( reference )
+        testPolygons = PolygonSet.fromLayer( test )
+        
+        # 4) Run 
+        if method < 0 or method >= len( PolygonMatcher.METHODS ):
+            raise QgsProcessingException( self.tr( "Invalid match method." ), "INVALIDPARAMETERVALUE" );
+        
+        pairMgr = PolygonMatcher( self.iouDistancePairs ).run( refPolygons, testPolygons, method, threshold, compactness, feedback )
+       
+        # 5) Salvar resposta
+        outputFile = self.parameterAsFileOutput( parameters, self.OUTPUT, context )
+        
+        PairWriter.create( outFormat, outputFile ).write( pairMgr )
+        
+        return {self.OUTPUT: outputFile}
+
+    def name(self):
+        """
+        Returns the algorithm name, used for identifying the algorithm. This
+        string should be fixed for the algorithm, and must not be localised.
+        The name should be unique within each provider. Names should contain
+        lowercase alphanumeric characters only and no spaces or other
+        formatting characters.
+        """
+        return 'Matching of polygon datasets'
+
+    def displayName(self):
+        """
+        Returns the translated algorithm name, which should be used for any
+        user-visible display of the algorithm name.
+        """
+        return self.tr(self.name())
+
+    def group(self):
+        """
+        Returns the name of the group this algorithm belongs to. This string
+        should be localised.
+        """
+        return self.tr(self.groupId())
+
+    def groupId(self):
+        """
+        Returns the unique ID of the group this algorithm belongs to. This
+        string should be fixed for the algorithm, and must not be localised.
+        The group id should be unique within each provider. Group id should
+        contain lowercase alphanumeric characters only and no spaces or other
+        formatting characters.
+        """
+        return 'Algorithms for feature matching'
+
+    def tr(self, string):
+        return QCoreApplication.translate('Processing', string)
+
+    def createInstance(self):
+        return PolygonMatchingAlgorithm()
+    
+    def shortHelpString( self ):
+        """Returns a localised short helper string for the algorithm, that appears at right."""
+        
+        return """The distance between polygons is <b>1 - IoU</b>, the intersection over union of their areas: 0 for equal polygons, 1 for disjoint ones.<br/>
+The <b>threshold</b> is the largest distance between matched polygons: 0.5 keeps the pairs with an IoU over 0.5.<br/>
+The <b>compactness</b> test (4*pi*area/perimeter^2) discards pairs of too different shapes before the exact IoU. It is a heuristic: 0 turns it off.<br/>
+"""
+    
+        """Internals"""
+    
+    def iouDistancePairs( self, polygonsA, polygonsB, positionsA, positionsB ):
+        """
+        Exact 1 - IoU of each pair ( polygonsA[ positionsA[k] ], polygonsB[ positionsB[k] ] ), with the
+        geometry engine of QGIS.
+
+        The pairs of the same reference polygon should be together, so its geometry is prepared only once.
+
+        @returns float64 array with one distance per pair.
+        """
+        result = np.ones( len( positionsA ), dtype = np.float64 )
+
+        engine = None
+        current = -1
+
+        for k, ( j, i ) in enumerate( zip( positionsA.tolist(), positionsB.tolist() ) ):
+            # 1) prepara a geometria de referencia
+            if j != current:
+                current = j
+                engine = QgsGeometry.createGeometryEngine( polygonsA.geometries[ j ].constGet() )
+                engine.prepareGeometry()
+
+            other = polygonsB.geometries[ i ].constGet()
+
+            # 2) os testes preparados sao rapidos; a intersecao so quando precisa
+            if not engine.intersects( other ):
+                continue
+
+            if engine.contains( other ):
+                intersection = polygonsB.area[ i ]
+            else:
+                overlap = engine.intersection( other )
+                intersection = overlap.area() if overlap is not None else 0.
+
+            union = polygonsA.area[ j ] + polygonsB.area[ i ] - intersection
+
+            # Chks habituais: aneis degenerados, sem area - ficam com a distancia 1
+            if union <= 0.:
+                continue
+
+            result[ k ] = 1. - intersection / union
+
+        return result
@@ -33,6 +33,7 @@ __revision__ = '$Format:%H$'
 from qgis.core import QgsProcessingProvider
 from matching_box.src.matching.point_matching_algorithm import PointMatchingAlgorithm
 from matching_box.src.matching.line_matching_algorithm import LineMatchingAlgorithm
+from matching_box.src.matching.polygon_matching_algorithm import PolygonMatchingAlgorithm
 
 
 class MatchingBoxProvider(QgsProcessingProvider):
@@ -42,7 +43,8 @@ class MatchingBoxProvider(QgsProcessingProvider):
 
         # Load algorithms
         self.alglist = [PointMatchingAlgorithm(),
-                        LineMatchingAlgorithm()]
+                        LineMatchingAlgorithm(),
+                        PolygonMatchingAlgorithm()]
 
     def unload(self):
         """
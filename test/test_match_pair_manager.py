@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+import unittest
+import numpy as np
+from ..core.matching.candidate_set import CandidateSet
+from ..core.matching.match_pair_manager import MatchPairManager
+
+class MatchPairManagerTest( unittest.TestCase ):
+    """
+    buildFromArray and buildFromCandidates against the loops of buildFromMatrix over plain lists, for the
+    six criteria: same pairs, same scores, same insertion order (so the same groups and text).
+    
+    The values come from a few levels, so there are many ties (also with the threshold), and some are NaN.
+    The cells which are not candidates hold a placeholder that can never be a match: at or beyond the
+    threshold on the losing side, as the old dense matrices did (the search extent, or 1 for the contexts).
+    """
+    
+    CASES = 300
+    
+    MIN_CRITERIA = ( MatchPairManager.CriteriaType.ISMINIMUM, MatchPairManager.CriteriaType.ISUNDER,
+                     MatchPairManager.CriteriaType.BOTHMIN )
+    MAX_CRITERIA = ( MatchPairManager.CriteriaType.ISMAXIMUM, MatchPairManager.CriteriaType.ISABOVE,
+                     MatchPairManager.CriteriaType.BOTHMAX )
+    
+    def randomCase( self, rng ):
+        """Random (refIds, testIds, values, threshold, candidate mask) """
+        ncols, nrows = int( rng.integers( 1, 9 ) ), int( rng.integers( 1, 9 ) )
+        
+        refIds  = ( 100 + rng.permutation( 50 )[ :ncols ] ).tolist()
+        testIds = ( 200 + rng.permutation( 50 )[ :nrows ] ).tolist()
+        
+        # poucos niveis: empates entre si e com o threshold
+        values = rng.integers( 0, 5, size = ( nrows, ncols ) ) / 4.
+        values[ rng.random( ( nrows, ncols ) ) < .1 ] = np.nan
+        
+        threshold = float( rng.integers( 0, 5 ) ) / 4.
+        present = rng.random( ( nrows, ncols ) ) < .7
+        
+        return refIds, testIds, values, threshold, present
+    
+    def placeholder( self, rng, criteria, threshold ):
+        """A value of the missing cells that never matches under the criteria """
+        if criteria in self.MIN_CRITERIA:
+            return float( rng.choice( [ threshold, threshold + 1., 1. if threshold <= 1. else threshold, np.inf ] ) )
+        return float( rng.choice( [ threshold, threshold - 1., -np.inf ] ) )
+    
+    def listMatrix( self, refIds, testIds, values ):
+        """The matrix of buildFromMatrix: ids in the first row and column, plain Python values """
+        matrix = [ [ 0 ] + list( refIds ) ]
+        for testId, row in zip( testIds, values.tolist() ):
+            matrix.append( [ testId ] + row )
+        return matrix
+    
+    def assertSamePairs( self, expected, result ):
+        self.assertEqual( expected.toString(), result.toString() )
+        self.assertEqual( list( expected.iterPairs() ), list( result.iterPairs() ) )
+    
+    def testBuildFromArray( self ):
+        rng = np.random.default_rng( 8 )
+        
+        for case in range( self.CASES ):
+            refIds, testIds, values, threshold, _ = self.randomCase( rng )
+            
+            for criteria in MatchPairManager.CriteriaType:
+                with self.subTest( case = case, criteria = criteria ):
+                    expected = MatchPairManager()
+                    expected.buildFromMatrix( self.listMatrix( refIds, testIds, values ), criteria, threshold )
+                    
+                    result = MatchPairManager()
+                    result.buildFromArray( refIds, testIds, values, criteria, threshold )
+                    self.assertSamePairs( expected, result )
+                    
+                    # a matriz NumPy, com os ids na primeira linha e coluna
+                    matrix = np.array( self.listMatrix( refIds, testIds, values ), dtype = np.float64 )
+                    result = MatchPairManager()
+                    result.buildFromMatrix( matrix, criteria, threshold )
+                    self.assertSamePairs( expected, result )
+    
+    def testBuildFromCandidates( self ):
+        rng = np.random.default_rng( 9 )
+        
+        for case in range( self.CASES ):
+            refIds, testIds, values, threshold, present = self.randomCase( rng )
+            
+            for criteria in MatchPairManager.CriteriaType:
+                with self.subTest( case = case, criteria = criteria ):
+                    # 1) a matriz densa, com o placeholder fora dos candidatos
+                    dense = np.where( present, values, self.placeholder( rng, criteria, threshold ) )
+                    
+                    expected = MatchPairManager()
+                    expected.buildFromMatrix( self.listMatrix( refIds, testIds, dense ), criteria, threshold )
+                    
+                    # 2) os candidatos, em qualquer ordem
+                    i, j = np.nonzero( present )
+                    order = rng.permutation( len( i ) )
+                    
+                    candidates = CandidateSet( refIds, testIds )
+                    candidates.extend( j[ order ], i[ order ], values[ i[ order ], j[ order ] ] )
+                    
+                    result = MatchPairManager()
+                    result.buildFromCandidates( candidates, criteria, threshold )
+                    self.assertSamePairs( expected, result )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ MatchingBox
+                                 A QGIS plugin
+ This plugins contains a set of algorithms for matching geospatial vector datasets.
+                              -------------------
+        begin                : 2019-05-31
+        copyright            : (C) 2019 by Emerson Xavier
+        email                : emerson.xavier@eb.mil.br
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'Emerson Xavier'
+__date__ = '2019-05-31'
+__copyright__ = '(C) 2019 by Emerson Xavier'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# imports
+import unittest
+import numpy as np
+from ..core.matching.point_matcher import PointMatcher
+from ..core.matching.point_set import PointSet
+
+class TiledExecutorTest( unittest.TestCase ):
+    """
+    The tiled run over a process pool (workers > 1) against the serial run: the same pairs, scores and groups.
+    
+    The Euclidean tiles use the circle test of BlockDistanceEngine, while the serial run takes the square box
+    of the grid index (engine 0) or the blocks (engine 1); all of them keep only the pairs within the threshold.
+    Some test points repeat a coordinate, so there are ties to be broken the same way.
+    """
+    
+    @classmethod
+    def setUpClass( cls ):
+        rng = np.random.default_rng( 5 )
+        
+        n = 400
+        refX, refY = rng.uniform( 0., 1000., n ), rng.uniform( 0., 1000., n )
+        cls.refPoints = PointSet( np.arange( n ) + 1000, refX, refY )
+        
+        # test: o ref deslocado, alguns pontos repetidos (empates) e alguns vazios
+        testX = refX + rng.normal( 0., 8., n )
+        testY = refY + rng.normal( 0., 8., n )
+        twins = rng.choice( n, 40, replace = False )
+        testX[ twins[ 20: ] ], testY[ twins[ 20: ] ] = testX[ twins[ :20 ] ], testY[ twins[ :20 ] ]
+        testX[ twins[ :3 ] ] = np.nan
+        cls.testPoints = PointSet( np.arange( n ) + 5000, testX, testY )
+    
+    def assertSameRun( self, method, threshold, **kwargs ):
+        serial = PointMatcher().run( self.refPoints, self.testPoints, method, threshold, workers = 1, **kwargs )
+        tiled  = PointMatcher().run( self.refPoints, self.testPoints, method, threshold, workers = 2, **kwargs )
+        
+        self.assertGreater( serial.pairCount(), 0 )
+        self.assertEqual( serial.toString(), tiled.toString() )
+    
+    def testEuclidean( self ):
+        for method in ( 0, 1 ):
+            for engine in ( 0, 1 ):
+                with self.subTest( method = method, engine = engine ):
+                    self.assertSameRun( method, 30., engine = engine, blockSize = 64 )
+    
+    def testContext( self ):
+        for method in ( 2, 3 ):
+            for descriptors in ( 0, 1 ):
+                with self.subTest( method = method, descriptors = descriptors ):
+                    self.assertSameRun( method, .3, descriptors = descriptors )
+
+
+if __name__ == '__main__':
+    unittest.main()